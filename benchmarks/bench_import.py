@@ -0,0 +1,142 @@
+"""
+import time benchmark of every plugin entry point in setup.py, OPM loads all of them when ovos-core boots
+
+    python benchmarks/bench_import.py [--runs 5] [--output results.json] [--baseline previous.json]
+                                      [--tolerance 1.5] [--json]
+
+every entry point is loaded in a fresh interpreter, the median of --runs is reported as
+    total_ms: loading the entry point, including ovos-plugin-manager and other dependencies
+    own_ms: time spent in the modules of this package only, from python -X importtime
+
+exits with status 1 if an entry point loads a module it must not, eg. the persona definition loading
+ovos-plugin-manager, or if own_ms regressed more than --tolerance times against --baseline
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SETUP_PY = os.path.join(HERE, "..", "setup.py")
+PACKAGE = "ovos_solver_openai_persona"
+
+# modules an entry point must not load just by being imported
+FORBIDDEN = {
+    # a dict must not pay for the plugin machinery
+    "Remote Llama": ["ovos_plugin_manager", "requests", f"{PACKAGE}.engines"],
+}
+# optional or rarely used dependencies, only imported when a feature needs them
+NEVER = ["aiohttp", "tiktoken", "http.server"]
+
+# absolute slack added to the baseline, timings of a few ms are noisy
+SLACK_MS = 5
+
+# __import__ and not importlib.import_module, which hides the target module from -X importtime,
+# the garbage collector is off or a full collection lands in whichever module happens to trigger it
+LOADER = """
+import gc, json, sys, time
+gc.disable()
+start = time.perf_counter()
+__import__({module!r})
+getattr(sys.modules[{module!r}], {attr!r})
+total = time.perf_counter() - start
+print(json.dumps({{"total": total, "modules": sorted(sys.modules)}}))
+"""
+
+
+def entry_points() -> Dict[str, str]:
+    """ name: "module:attr" of every plugin entry point declared in setup.py, this process must not import them """
+    with open(SETUP_PY) as f:
+        src = f.read()
+    return dict(re.findall(r"^\w+_ENTRY_POINT = '([^=']+)=([\w.]+:\w+)'", src, re.MULTILINE))
+
+
+def load_once(target: str) -> Dict:
+    """ loads an entry point in a fresh interpreter """
+    module, attr = target.split(":")
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)  # installed packages are compiled, so is the warm up run
+    # the checkout this script belongs to comes first on sys.path, whatever the working directory
+    proc = subprocess.run([sys.executable, "-u", "-X", "importtime", "-c", LOADER.format(module=module, attr=attr)],
+                          capture_output=True, text=True, env=env, check=True, cwd=os.path.join(HERE, ".."))
+    own = 0
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        m = re.match(r"import time:\s+(\d+) \|\s+\d+ \|\s+(\S+)", line)
+        if m and m.group(2).split(".")[0] == PACKAGE:
+            own += int(m.group(1))
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {"total": result["total"] * 1000, "own": own / 1000, "modules": result["modules"]}
+
+
+def forbidden_imports(name: str, modules: List[str]) -> List[str]:
+    """ the modules loaded by an entry point that it must not load """
+    return [m for m in FORBIDDEN.get(name, []) + NEVER
+            if any(loaded == m or loaded.startswith(m + ".") for loaded in modules)]
+
+
+def bench(name: str, target: str, runs: int) -> Dict:
+    load_once(target)  # warm up, writes the bytecode cache
+    samples = [load_once(target) for _ in range(runs)]
+    modules = samples[-1]["modules"]
+    forbidden = forbidden_imports(name, modules)
+    return {"target": target,
+            "total_ms": round(statistics.median(s["total"] for s in samples), 2),
+            "own_ms": round(statistics.median(s["own"] for s in samples), 2),
+            "modules": len(modules),
+            "forbidden_imports": forbidden}
+
+
+def check(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """ returns a description of every regression """
+    failures = []
+    for name, r in results["results"].items():
+        if r["forbidden_imports"]:
+            failures.append(f"{name} imports {', '.join(r['forbidden_imports'])}")
+        before = baseline.get("results", {}).get(name)
+        if before and r["own_ms"] > before["own_ms"] * tolerance + SLACK_MS:
+            failures.append(f"{name} own import time {before['own_ms']}ms -> {r['own_ms']}ms")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per entry point")
+    parser.add_argument("--output", help="write results to this json file")
+    parser.add_argument("--baseline", help="json results of a previous run, own_ms must not regress")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="allowed own_ms ratio against the baseline")
+    parser.add_argument("--json", action="store_true", help="print machine readable results")
+    args = parser.parse_args()
+
+    targets = {name: target for name, target in entry_points().items() if ":" in target}
+    results = {"meta": {"python": platform.python_version(),
+                        "platform": platform.platform(),
+                        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                        "runs": args.runs},
+               "results": {name: bench(name, target, args.runs) for name, target in targets.items()}}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, r in results["results"].items():
+            print(f"{name:<40} total={r['total_ms']:>8}ms  own={r['own_ms']:>7}ms  modules={r['modules']}")
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    failures = check(results, baseline, args.tolerance)
+    for failure in failures:
+        print(f"REGRESSION: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
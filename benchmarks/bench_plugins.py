@@ -0,0 +1,306 @@
+"""
+end to end benchmark of every plugin entry point in setup.py against benchmarks/mock_server.py
+
+    python benchmarks/bench_plugins.py [--requests 50] [--concurrency 8] [--token-delay 5] [--first-token-delay 50]
+                                       [--tokens-per-chunk 1] [--error-rate 0.1] [--output results.json]
+                                       [--compare previous.json] [--json]
+                                       [--record traffic.jsonl.gz | --replay traffic.jsonl.gz [--replay-speed 0]]
+
+the mock server runs in a subprocess so CPU time per request only counts the plugin side,
+results are written as json so releases can be compared with --compare
+
+--record saves every response with its timing, --replay answers from such a recording instead of the
+mock server, or from traffic recorded against a real server, --replay-speed 0 skips all delays
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from typing import Callable, Dict, List
+
+import requests
+
+from ovos_solver_openai_persona.engines import OpenAIChatCompletionsSolver, OpenAICompletionsSolver
+from ovos_solver_openai_persona.version import VERSION_MAJOR, VERSION_MINOR, VERSION_BUILD, VERSION_ALPHA
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SETUP_PY = os.path.join(HERE, "..", "setup.py")
+
+LONG_DOCUMENT = "\n".join(f"Section {i}. " + "The quick brown fox jumps over the lazy dog. " * 40
+                          for i in range(60))
+
+
+def entry_points() -> Dict[str, str]:
+    """ name: "module:attr" of every plugin entry point declared in setup.py """
+    with open(SETUP_PY) as f:
+        src = f.read()
+    return dict(re.findall(r"^\w+_ENTRY_POINT = '([^=']+)=([\w.]+:\w+)'", src, re.MULTILINE))
+
+
+def load(target: str):
+    module, attr = target.split(":")
+    return getattr(import_module(module), attr)
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def summarize(latencies: List[float], errors: int, wall: float, cpu: float) -> Dict:
+    n = len(latencies) + errors
+    return {"requests": n,
+            "errors": errors,
+            "throughput_rps": round(n / wall, 2) if wall else None,
+            "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "cpu_ms_per_request": round(cpu / n * 1000, 3) if n else None}
+
+
+def measure(func: Callable[[int], object], n: int, concurrency: int) -> Dict:
+    """ calls func(i) n times from concurrency threads, an exception or a None answer counts as an error """
+
+    def timed(i):
+        start = time.perf_counter()
+        try:
+            ok = func(i) is not None
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    cpu, wall = time.process_time(), time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed, range(n)))
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    return summarize([t for t, ok in results if ok], sum(not ok for _, ok in results), wall, cpu)
+
+
+def measure_stream(stream: Callable[[int], object], n: int) -> Dict:
+    """ sequential streaming requests, measures time to first utterance and total time """
+    ttfu, totals, errors = [], [], 0
+    cpu, wall = time.process_time(), time.perf_counter()
+    for i in range(n):
+        start = time.perf_counter()
+        first = None
+        try:
+            for _ in stream(i):
+                if first is None:
+                    first = time.perf_counter() - start
+        except Exception:
+            pass
+        if first is None:
+            errors += 1
+            continue
+        ttfu.append(first)
+        totals.append(time.perf_counter() - start)
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    result = summarize(totals, errors, wall, cpu)
+    result["ttfu_p50_ms"] = round(percentile(ttfu, 0.5) * 1000, 2)
+    result["ttfu_p99_ms"] = round(percentile(ttfu, 0.99) * 1000, 2)
+    return result
+
+
+def measure_memory(solver: OpenAIChatCompletionsSolver, n: int) -> Dict:
+    """ memory held by the solver after n conversational turns, chat memory should stay bounded """
+    gc.collect()
+    tracemalloc.start()
+    solver.get_spoken_answer("warm up question")
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(n):
+        solver.get_spoken_answer(f"question number {i}, tell me more")
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {"turns": n,
+            "qa_pairs": len(solver.qa_pairs),
+            "memory_tokens": solver.sessions.tokens,
+            "growth_kb": round((after - before) / 1024, 1)}
+
+
+class MockServer:
+    def __init__(self, **settings):
+        args = [sys.executable, os.path.join(HERE, "mock_server.py"), "--port", "0"]
+        self.proc = subprocess.Popen(args, stdout=subprocess.PIPE, text=True)
+        self.api_url = json.loads(self.proc.stdout.readline())["api_url"]
+        self.configure(**settings)
+
+    def configure(self, **settings):
+        base = self.api_url.rsplit("/v1", 1)[0]
+        requests.post(f"{base}/mock/config", json=settings).raise_for_status()
+
+    def injected_errors(self) -> int:
+        base = self.api_url.rsplit("/v1", 1)[0]
+        return requests.get(f"{base}/mock/config").json()["errors"]
+
+    def close(self):
+        self.proc.terminate()
+        self.proc.wait()
+
+
+def bench_chat(solver_factory, args, server: MockServer) -> Dict:
+    solver = solver_factory({"enable_memory": False})
+    results = {
+        "answer": measure(lambda i: solver.get_spoken_answer(f"question {i}"), args.requests, args.concurrency),
+        "stream_utterances": measure_stream(lambda i: solver.stream_utterances(f"question {i}"), args.requests),
+        "batch": measure(lambda i: solver.get_spoken_answers([f"q{i}-{j}" for j in range(10)]),
+                         max(1, args.requests // 10), 1),
+        "memory": measure_memory(solver_factory({"enable_memory": True}), args.requests * 4),
+        # 4 candidates in one request, reranked for TTS, against 4 requests for the same candidates
+        "rerank_n4": measure(lambda i: solver_factory({"enable_memory": False, "n": 4, "reranker": "tts_length"})
+                             .get_spoken_answer(f"question {i}"), args.requests, args.concurrency),
+    }
+    if args.error_rate:
+        # errors counts what the caller noticed, injected_errors what the server did,
+        # a stream cut mid answer is only noticed if the plugin surfaces it
+        server.configure(error_rate=args.error_rate, error_mode="status")
+        injected = server.injected_errors()
+        results["answer_with_errors"] = measure(lambda i: solver.get_spoken_answer(f"question {i}"),
+                                                args.requests, args.concurrency)
+        results["answer_with_errors"]["injected_errors"] = server.injected_errors() - injected
+        server.configure(error_mode="stream")
+        injected = server.injected_errors()
+        results["stream_with_errors"] = measure_stream(lambda i: solver.stream_utterances(f"question {i}"),
+                                                       args.requests)
+        results["stream_with_errors"]["injected_errors"] = server.injected_errors() - injected
+        server.configure(error_rate=0, error_mode="status")
+    return results
+
+
+def bench_completions(solver_factory, args, server: MockServer) -> Dict:
+    solver = solver_factory({})
+    return {
+        "answer": measure(lambda i: solver.get_spoken_answer(f"question {i}"), args.requests, args.concurrency),
+        "batch": measure(lambda i: solver.get_spoken_answers([f"q{i}-{j}" for j in range(10)]),
+                         max(1, args.requests // 10), 1),
+    }
+
+
+def bench_transformer(factory, args, server: MockServer) -> Dict:
+    uncached = factory({"rewrite_prompt": "rewrite it like a pirate", "rewrite_cache": {"enabled": False}})
+    # rewrites slower than the budget speak the original dialog, p99 stays close to the budget
+    budgeted = factory({"rewrite_prompt": "rewrite it like a pirate", "rewrite_cache": {"enabled": False},
+                        "latency_budget": 50})
+    with tempfile.TemporaryDirectory() as tmp:
+        cached = factory({"rewrite_prompt": "rewrite it like a pirate",
+                          "rewrite_cache": {"path": os.path.join(tmp, "rewrites.db")}})
+        cached.transform("hello world", {})
+        return {
+            "transform": measure(lambda i: uncached.transform(f"dialog {i}", {})[0],
+                                 args.requests, args.concurrency),
+            "transform_budget": measure(lambda i: budgeted.transform(f"budget {i}", {})[0],
+                                        args.requests, args.concurrency),
+            # time to the first sentence of the rewrite against the whole rewrite above
+            "transform_stream": measure_stream(lambda i: uncached.stream_transform(f"stream {i}", {}), args.requests),
+            "transform_cached": measure(lambda i: cached.transform("hello world", {})[0], args.requests * 10, 1),
+        }
+
+
+def bench_summarizer(factory, args, server: MockServer) -> Dict:
+    summarizer = factory({})
+    return {
+        "tldr_short": measure(lambda i: summarizer.get_tldr(f"a short document number {i}"),
+                              args.requests, args.concurrency),
+        "tldr_stream": measure_stream(lambda i: summarizer.stream_tldr(f"a short document number {i}"), args.requests),
+        "tldr_long": measure(lambda i: summarizer.get_tldr(LONG_DOCUMENT), max(1, args.requests // 25), 1),
+    }
+
+
+def run(args) -> Dict:
+    server = MockServer(token_delay=args.token_delay / 1000,
+                        first_token_delay=args.first_token_delay / 1000,
+                        tokens_per_chunk=args.tokens_per_chunk)
+    base = {"key": "bench", "api_url": server.api_url, "system_prompt": "You are a benchmark.",
+            "response_cache": {"enabled": False}, "max_retries": 0, "max_tokens": 200}
+    if args.record:
+        base["transport"] = {"mode": "record", "path": args.record}
+    elif args.replay:
+        base["transport"] = {"mode": "replay", "path": args.replay, "speed": args.replay_speed}
+    results = {}
+    try:
+        targets = dict(entry_points())
+        targets["completions"] = "ovos_solver_openai_persona.engines:OpenAICompletionsSolver"
+        for name, target in targets.items():
+            obj = load(target)
+            if isinstance(obj, dict):  # persona definition, benchmark the solver it uses
+                cfg = {**obj.get("ovos-solver-openai-plugin", {}), **base}
+                results[name] = bench_chat(lambda extra: OpenAIChatCompletionsSolver({**cfg, **extra}), args, server)
+            elif not isinstance(obj, type):
+                continue  # console scripts
+            elif issubclass(obj, OpenAIChatCompletionsSolver):
+                results[name] = bench_chat(lambda extra: obj({**base, **extra}), args, server)
+            elif issubclass(obj, OpenAICompletionsSolver):
+                results[name] = bench_completions(lambda extra: obj({**base, **extra}), args, server)
+            elif obj.__name__ == "OpenAIDialogTransformer":
+                results[name] = bench_transformer(lambda extra: obj(config={**base, **extra}), args, server)
+            elif obj.__name__ == "OpenAISummarizer":
+                results[name] = bench_summarizer(lambda extra: obj(config={**base, **extra}), args, server)
+    finally:
+        server.close()
+    version = f"{VERSION_MAJOR}.{VERSION_MINOR}.{VERSION_BUILD}" + (f"a{VERSION_ALPHA}" if VERSION_ALPHA else "")
+    return {"meta": {"version": version,
+                     "python": platform.python_version(),
+                     "platform": platform.platform(),
+                     "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                     "settings": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "json")}},
+            "results": results}
+
+
+def compare(old: Dict, new: Dict):
+    """ prints the ratio new/old of every numeric result present in both runs """
+    print(f"comparing {old['meta']['version']} -> {new['meta']['version']}")
+    for target, scenarios in new["results"].items():
+        for scenario, metrics in scenarios.items():
+            before = old["results"].get(target, {}).get(scenario, {})
+            for metric, value in metrics.items():
+                prev = before.get(metric)
+                if isinstance(value, (int, float)) and isinstance(prev, (int, float)) and prev:
+                    print(f"  {target:<40} {scenario:<20} {metric:<20} {prev:>10} -> {value:>10}  ({value / prev:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--token-delay", type=float, default=5, help="milliseconds between streamed tokens")
+    parser.add_argument("--first-token-delay", type=float, default=50, help="milliseconds before the first token")
+    parser.add_argument("--tokens-per-chunk", type=int, default=1)
+    parser.add_argument("--error-rate", type=float, default=0.1, help="error injection scenarios, 0 to skip")
+    parser.add_argument("--output", help="write results to this json file")
+    parser.add_argument("--compare", help="json results of a previous run to compare against")
+    parser.add_argument("--json", action="store_true", help="print machine readable results")
+    parser.add_argument("--record", help="record the responses to this file")
+    parser.add_argument("--replay", help="replay the responses recorded in this file")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="replay speed, 0 for no delays")
+    args = parser.parse_args()
+    if args.record and args.replay:
+        parser.error("--record and --replay are exclusive")
+
+    results = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for target, scenarios in results["results"].items():
+            print(target)
+            for scenario, metrics in scenarios.items():
+                print(f"  {scenario:<20} " + "  ".join(f"{k}={v}" for k, v in metrics.items()))
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+measures time to first utterance of the sentence segmenter over the recorded token streams in benchmarks/streams
+
+    python benchmarks/bench_segmenter.py [--token-delay 30] [--comma-split-after 40] [--json]
+
+"legacy" is the old splitter that only split when a token ended with punctuation,
+"segmenter_comma" releases the first clause before the end of the first sentence.
+the segmentation itself is checked against tests/segmenter_corpus.json by tests/test_segmenter.py
+"""
+import argparse
+import json
+import os
+
+from ovos_solver_openai_persona.segmenter import SentenceSegmenter
+from ovos_solver_openai_persona.sse import SSEDecoder, parse_chat_chunk
+
+HERE = os.path.dirname(__file__)
+STREAMS = os.path.join(HERE, "streams")
+
+
+def load_tokens(path):
+    tokens = []
+    decoder = SSEDecoder()
+    with open(path, "rb") as f:
+        events = decoder.feed(f.read()) + decoder.flush()
+    for event in events:
+        text, done = parse_chat_chunk(event.data)
+        if text:
+            tokens.append(text)
+        if done:
+            break
+    return tokens
+
+
+def legacy(tokens):
+    """ yields (token_index, utterance) """
+    answer = ""
+    for idx, chunk in enumerate(tokens):
+        answer += chunk
+        if any(chunk.endswith(p) for p in [".", "!", "?", "\n", ":"]):
+            if len(chunk) >= 2 and chunk[-2].isdigit() and chunk[-1] == ".":
+                continue
+            if answer.strip():
+                yield idx, answer.strip()
+            answer = ""
+    if answer.strip():  # legacy dropped this
+        yield len(tokens) - 1, answer.strip()
+
+
+def segmenter(tokens, **kwargs):
+    seg = SentenceSegmenter(**kwargs)
+    for idx, chunk in enumerate(tokens):
+        for utt in seg.feed(chunk):
+            yield idx, utt
+    for utt in seg.flush():
+        yield len(tokens) - 1, utt
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--token-delay", type=float, default=30, help="simulated ms per streamed token")
+    parser.add_argument("--comma-split-after", type=int, default=40)
+    parser.add_argument("--json", action="store_true", help="print machine readable results")
+    args = parser.parse_args()
+
+    results = {"streams": {}}
+    impls = {"legacy": legacy,
+             "segmenter_lookahead": lambda t: segmenter(t, eager=False),
+             "segmenter": segmenter,
+             "segmenter_comma": lambda t: segmenter(t, comma_split_after=args.comma_split_after)}
+    for name in sorted(os.listdir(STREAMS)):
+        tokens = load_tokens(os.path.join(STREAMS, name))
+        results["streams"][name] = {}
+        for impl, func in impls.items():
+            utts = list(func(tokens))
+            first_idx = utts[0][0] if utts else len(tokens)
+            results["streams"][name][impl] = {
+                "utterances": len(utts),
+                "first_utterance_tokens": first_idx + 1,
+                "first_utterance_ms": round((first_idx + 1) * args.token_delay, 1),
+                "first_utterance": utts[0][1] if utts else None
+            }
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    else:
+        for name, res in results["streams"].items():
+            print(name)
+            for impl, r in res.items():
+                print(f"  {impl:<20} ttfu {r['first_utterance_ms']:>7.1f} ms "
+                      f"({r['first_utterance_tokens']} tokens, {r['utterances']} utterances)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+micro-benchmark for the streaming response parser, replays the recorded streams in benchmarks/streams
+
+    python benchmarks/bench_sse.py [--rounds 200] [--json]
+
+"legacy" is the old iter_lines + json.loads per line approach (patched to skip comments and [DONE], it used to crash on them)
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+from ovos_solver_openai_persona.sse import SSEDecoder, parse_chat_chunk, _parse_chat_chunk_json
+
+STREAMS = os.path.join(os.path.dirname(__file__), "streams")
+
+
+def network_chunks(raw: bytes, seed: int = 42, max_size: int = 512):
+    """ split a recorded stream at random byte offsets, like the network would """
+    rnd = random.Random(seed)
+    chunks, i = [], 0
+    while i < len(raw):
+        n = rnd.randint(1, max_size)
+        chunks.append(raw[i:i + n])
+        i += n
+    return chunks
+
+
+def iter_lines(chunks):
+    # same algorithm as requests.Response.iter_lines
+    pending = None
+    for chunk in chunks:
+        if pending is not None:
+            chunk = pending + chunk
+        lines = chunk.splitlines()
+        if lines and lines[-1] and chunk and lines[-1][-1] == chunk[-1]:
+            pending = lines.pop()
+        else:
+            pending = None
+        yield from lines
+    if pending is not None:
+        yield pending
+
+
+def legacy(chunks):
+    out = []
+    for line in iter_lines(chunks):
+        if not line:
+            continue
+        line = line.decode("utf-8")
+        if line.startswith(":") or line.endswith("[DONE]"):
+            continue
+        chunk = json.loads(line.split("data: ", 1)[-1])
+        if chunk["choices"][0].get("finish_reason"):
+            break
+        text = chunk["choices"][0]["delta"].get("content")
+        if text:
+            out.append(text)
+    return out
+
+
+def _decode(chunks, parser):
+    out = []
+    decoder = SSEDecoder()
+    for raw in chunks:
+        for event in decoder.feed(raw):
+            text, done = parser(event.data)
+            if text:
+                out.append(text)
+            if done:
+                return out
+    return out
+
+
+def sse_json(chunks):
+    return _decode(chunks, lambda data: (None, True) if data == "[DONE]" else _parse_chat_chunk_json(data))
+
+
+def sse_fast(chunks):
+    return _decode(chunks, parse_chat_chunk)
+
+
+def bench(func, chunks, rounds):
+    t = time.perf_counter()
+    for _ in range(rounds):
+        func(chunks)
+    return (time.perf_counter() - t) / rounds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="print machine readable results")
+    args = parser.parse_args()
+
+    results = {}
+    for name in sorted(os.listdir(STREAMS)):
+        with open(os.path.join(STREAMS, name), "rb") as f:
+            chunks = network_chunks(f.read())
+        expected = "".join(sse_json(chunks))
+        results[name] = {}
+        for impl in (legacy, sse_json, sse_fast):
+            assert "".join(impl(chunks)) == expected, f"{impl.__name__} output mismatch on {name}"
+            results[name][impl.__name__] = round(bench(impl, chunks, args.rounds), 2)
+
+    if args.json:
+        print(json.dumps({"unit": "us/stream", "results": results}, indent=2))
+        return
+    for name, res in results.items():
+        print(name)
+        for impl, us in res.items():
+            print(f"  {impl:<10} {us:>10.1f} us/stream  ({res['legacy'] / us:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+benchmark for map-reduce summarization of large documents, the LLM is replaced by a fake with fixed latency
+
+    python benchmarks/bench_summarizer.py [--size-kb 1024] [--latency 0.05] [--workers 1 2 4 8] [--json]
+
+reports wall time and number of LLM calls per worker count, and peak python memory for growing document sizes
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+from ovos_solver_openai_persona.summarizer import OpenAISummarizer, split_document
+
+WORDS = ("the quick brown fox jumps over a lazy dog while voice assistants "
+         "summarize long documents into short spoken answers").split()
+
+
+def make_document(size_kb: int, seed: int = 42) -> str:
+    rnd = random.Random(seed)
+    paragraphs, n = [], 0
+    while n < size_kb * 1024:
+        p = " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(30, 120))) + "."
+        paragraphs.append(p)
+        n += len(p) + 1
+    return "\n".join(paragraphs)
+
+
+class FakeLLM:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    def __call__(self, prompt, lang=None, *args, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        return "summary of a section with some facts."
+
+
+def make_summarizer(workers: int, latency: float) -> OpenAISummarizer:
+    s = OpenAISummarizer(config={"key": "bench", "api_url": "http://127.0.0.1:1", "system_prompt": "bench",
+                                 "map_workers": workers, "response_cache": {"enabled": False}})
+    s.llm.get_spoken_answer = FakeLLM(latency)
+    return s
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-kb", type=int, default=1024)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per fake LLM call")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--json", action="store_true", help="print machine readable results")
+    args = parser.parse_args()
+
+    doc = make_document(args.size_kb)
+    n_chunks = sum(1 for _ in split_document(doc))
+    throughput = {}
+    for workers in args.workers:
+        s = make_summarizer(workers, args.latency)
+        t = time.perf_counter()
+        assert s.get_tldr(doc)
+        elapsed = time.perf_counter() - t
+        throughput[workers] = {"seconds": round(elapsed, 3),
+                               "llm_calls": s.llm.get_spoken_answer.calls,
+                               "chunks_per_s": round(n_chunks / elapsed, 1)}
+
+    memory = {}
+    s = make_summarizer(max(args.workers), 0)
+    for size_kb in (args.size_kb // 4, args.size_kb, args.size_kb * 4):
+        doc = make_document(size_kb)
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        for _ in s.stream_partial_summaries(doc):
+            pass
+        peak = tracemalloc.get_traced_memory()[1] - base
+        tracemalloc.stop()
+        memory[size_kb] = round(peak / 1024, 1)
+    del doc
+
+    results = {"chunks": n_chunks, "throughput": throughput, "peak_kb_by_doc_kb": memory}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.size_kb} KB document, {n_chunks} chunks, {args.latency * 1000:.0f} ms per LLM call")
+    for workers, res in throughput.items():
+        print(f"  {workers:>2} workers  {res['seconds']:>7.2f} s  {res['chunks_per_s']:>7.1f} chunks/s  "
+              f"{res['llm_calls']} calls")
+    print("peak memory while streaming partial summaries (excluding the document itself)")
+    for size_kb, kb in memory.items():
+        print(f"  {size_kb:>6} KB document  {kb:>8.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
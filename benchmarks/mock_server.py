@@ -0,0 +1,254 @@
+"""
+local mock of an OpenAI compatible server, answers /v1/completions and /v1/chat/completions, streaming or not
+
+    python benchmarks/mock_server.py [--port 8000] [--token-delay 20] [--first-token-delay 100]
+                                     [--tokens-per-chunk 1] [--events-per-write 1] [--error-rate 0.0]
+                                     [--error-mode status|throttle|stream|disconnect] [--retry-after 1]
+                                     [--answer "..."]
+
+settings can be changed while running by POSTing a json object with any of the settings to /mock/config,
+GET /mock/config returns the current settings and request counters
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_ANSWER = ("Quantum mechanics is the branch of physics that describes how very small things behave. "
+                  "At the scale of atoms, particles act like waves and can be in many states at once. "
+                  "Dr. Feynman famously said that nobody really understands it. "
+                  "Still, it explains lasers, transistors and the colors of 3.5 billion year old rocks!")
+
+DEFAULTS = {
+    "answer": DEFAULT_ANSWER,
+    "token_delay": 0.0,  # seconds between tokens when streaming, also applied in total to non-streaming answers
+    "first_token_delay": 0.0,  # seconds before the first token, prompt processing time
+    "tokens_per_chunk": 1,  # tokens per server sent event
+    "events_per_write": 1,  # server sent events per network write
+    "error_rate": 0.0,  # probability of injecting an error into a request
+    "error_mode": "status",  # "status" answers 500, "throttle" answers 429, "stream" sends an error event mid stream, "disconnect" drops the connection mid stream
+    "retry_after": 1.0,  # seconds sent in the Retry-After header of 429 answers
+    "keep_alive_comments": False,  # send ": keep-alive" comments between events like some proxies do
+}
+
+
+def tokenize(text):
+    """ splits text into LLM like tokens, words with their leading space and punctuation """
+    return re.findall(r"\s*[\w']+|\s*[^\w\s]", text)
+
+
+class MockState:
+    def __init__(self, **settings):
+        self.settings = dict(DEFAULTS)
+        self.settings.update({k: v for k, v in settings.items() if v is not None})
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.rnd = random.Random(42)
+        self.last_prompt = []  # tokens of the previous prompt, to simulate a prefix cache
+
+    def cached_tokens(self, prompt) -> int:
+        """ tokens at the start of prompt shared with the previous prompt, like a backend prefix cache """
+        with self.lock:
+            n = 0
+            for a, b in zip(prompt, self.last_prompt):
+                if a != b:
+                    break
+                n += 1
+            self.last_prompt = prompt
+        return n
+
+    def inject_error(self) -> bool:
+        with self.lock:
+            self.requests += 1
+            if self.rnd.random() < self.settings["error_rate"]:
+                self.errors += 1
+                return True
+        return False
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: MockState = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, data, status=200, headers=None):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/mock/config":
+            self._send_json({**self.state.settings, "requests": self.state.requests, "errors": self.state.errors})
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path == "/mock/config":
+            self.state.settings.update(body)
+            self._send_json(self.state.settings)
+            return
+        if self.path.endswith("/chat/completions"):
+            chat = True
+        elif self.path.endswith("/completions"):
+            chat = False
+        else:
+            self.send_error(404)
+            return
+        settings = dict(self.state.settings)
+        error = self.state.inject_error()
+        if error and settings["error_mode"] == "throttle":
+            self._send_json({"error": {"message": "rate limit reached", "type": "requests"}}, status=429,
+                            headers={"Retry-After": str(settings["retry_after"])})
+            return
+        if error and (settings["error_mode"] == "status" or not body.get("stream")):
+            self._send_json({"error": {"message": "injected error", "type": "server_error"}}, status=500)
+            return
+        if body.get("stream"):
+            self._stream(body, settings, chat, error)
+        else:
+            self._answer(body, settings, chat)
+
+    def _usage(self, body, tokens):
+        prompt = tokenize(json.dumps(body.get("messages") or body.get("prompt") or ""))
+        return {"prompt_tokens": len(prompt), "completion_tokens": len(tokens),
+                "total_tokens": len(prompt) + len(tokens),
+                "prompt_tokens_details": {"cached_tokens": self.state.cached_tokens(prompt)}}
+
+    @staticmethod
+    def _candidate(answer, i, max_tokens):
+        """ the i-th choice of a request with n > 1, the first sentences of the answer so choices differ in length """
+        if i:
+            sentences = re.split(r"(?<=[.!?])\s+", answer)
+            answer = " ".join(sentences[:len(sentences) - i % len(sentences)])
+        tokens = tokenize(answer)
+        return tokens[:max_tokens or None], "length" if max_tokens and len(tokens) > max_tokens else "stop"
+
+    def _answer(self, body, settings, chat):
+        n = body.get("n") or 1
+        candidates = [self._candidate(settings["answer"], i, body.get("max_tokens")) for i in range(n)]
+        time.sleep(settings["first_token_delay"] + settings["token_delay"] * max(len(t) for t, _ in candidates))
+        if chat:
+            choices = [{"index": i, "message": {"role": "assistant", "content": "".join(tokens)},
+                        "finish_reason": reason} for i, (tokens, reason) in enumerate(candidates)]
+            tokens = [t for c, _ in candidates for t in c]
+        else:
+            prompts = body["prompt"] if isinstance(body.get("prompt"), list) else [body.get("prompt")]
+            # choices of prompt p are at indexes p * n to p * n + n - 1
+            choices = [{"index": p * n + i, "text": "".join(tokens), "finish_reason": reason}
+                       for p in range(len(prompts)) for i, (tokens, reason) in enumerate(candidates)]
+            tokens = [t for c, _ in candidates for t in c] * len(prompts)
+        self._send_json({"object": "chat.completion" if chat else "text_completion",
+                         "model": body.get("model"), "choices": choices, "usage": self._usage(body, tokens)})
+
+    def _stream(self, body, settings, chat, error):
+        tokens = tokenize(settings["answer"])[:body.get("max_tokens") or None]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(settings["first_token_delay"])
+        per_chunk = max(1, settings["tokens_per_chunk"])
+        pending = []
+
+        def send(event: bytes, flush=False):
+            if event:
+                pending.append(event)
+            if pending and (flush or len(pending) >= settings["events_per_write"]):
+                self._write_chunk(b"".join(pending))
+                pending.clear()
+
+        fail_at = len(tokens) // 2 if error else -1
+        for i in range(0, len(tokens), per_chunk):
+            if i >= fail_at >= 0:
+                if settings["error_mode"] == "disconnect":
+                    send(b"", flush=True)
+                    self.close_connection = True
+                    return  # no terminating chunk, the client sees a truncated body
+                send(b'data: {"error": {"message": "injected error", "type": "server_error"}}\n\n', flush=True)
+                break
+            text = "".join(tokens[i:i + per_chunk])
+            delta = {"delta": {"content": text}} if chat else {"text": text}
+            chunk = {"object": "chat.completion.chunk", "model": body.get("model"),
+                     "choices": [{"index": 0, **delta, "finish_reason": None}]}
+            send(b"data: " + json.dumps(chunk).encode() + b"\n\n")
+            if settings["keep_alive_comments"]:
+                send(b": keep-alive\n\n")
+            if settings["token_delay"]:
+                time.sleep(settings["token_delay"])
+        else:
+            final = {"object": "chat.completion.chunk", "model": body.get("model"),
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            send(b"data: " + json.dumps(final).encode() + b"\n\n")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                usage = {"object": "chat.completion.chunk", "choices": [], "usage": self._usage(body, tokens)}
+                send(b"data: " + json.dumps(usage).encode() + b"\n\n")
+            send(b"data: [DONE]\n\n")
+        send(b"", flush=True)
+        self._write_chunk(b"")  # end of chunked body
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # clients dropping connections mid stream is expected, eg. when a benchmark stops reading early
+
+
+def serve(port: int = 0, host: str = "127.0.0.1", **settings) -> MockServer:
+    """
+    Starts the mock server in a background thread, the bound port is server.server_port
+    """
+    handler = type("Handler", (MockHandler,), {"state": MockState(**settings)})
+    server = MockServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="mock OpenAI compatible server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000, help="0 picks a free port")
+    parser.add_argument("--token-delay", type=float, default=0, help="milliseconds between tokens")
+    parser.add_argument("--first-token-delay", type=float, default=0, help="milliseconds before the first token")
+    parser.add_argument("--tokens-per-chunk", type=int, default=1)
+    parser.add_argument("--events-per-write", type=int, default=1)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--error-mode", choices=["status", "throttle", "stream", "disconnect"], default="status")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="seconds in the Retry-After header of 429 answers")
+    parser.add_argument("--answer", help="text of every answer")
+    args = parser.parse_args()
+    server = serve(args.port, args.host,
+                   token_delay=args.token_delay / 1000,
+                   first_token_delay=args.first_token_delay / 1000,
+                   tokens_per_chunk=args.tokens_per_chunk,
+                   events_per_write=args.events_per_write,
+                   error_rate=args.error_rate,
+                   error_mode=args.error_mode,
+                   retry_after=args.retry_after,
+                   answer=args.answer)
+    # the first line of output is machine readable, benchmarks read the port from it
+    print(json.dumps({"api_url": f"http://{args.host}:{server.server_port}/v1"}), flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
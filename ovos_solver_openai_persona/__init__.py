@@ -1,19 +1,25 @@
-import warnings
-from ovos_solver_openai_persona.engines import OpenAIChatCompletionsSolver
-
-class OpenAIPersonaSolver(OpenAIChatCompletionsSolver):
-    def __init__(self, *args, **kwargs):
-           """
-           Initializes the solver and issues a deprecation warning.
-           
-           A DeprecationWarning is raised advising to use OpenAIChatCompletionsSolver instead.
-           """
-           warnings.warn(
-              "use OpenAIChatCompletionsSolver instead",
-              DeprecationWarning,
-              stacklevel=2,
-           )
-           super().__init__(*args, **kwargs)
+import importlib
+
+# solvers are imported on first access, loading the persona entry point
+# must not pull in ovos-plugin-manager, it happens for every plugin at boot
+_LAZY_ATTRS = {
+    "OpenAIChatCompletionsSolver": "ovos_solver_openai_persona.engines",
+    "OpenAICompletionsSolver": "ovos_solver_openai_persona.engines",
+    "OpenAIPersonaSolver": "ovos_solver_openai_persona.engines",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRS:
+        value = getattr(importlib.import_module(_LAZY_ATTRS[name]), name)
+        globals()[name] = value  # only resolved once
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_ATTRS))
+
 
 # for ovos-persona
 LLAMA_DEMO = {
@@ -29,6 +35,8 @@ LLAMA_DEMO = {
 }
 
 if __name__ == "__main__":
+    from ovos_solver_openai_persona.engines import OpenAIChatCompletionsSolver
+
     bot = OpenAIChatCompletionsSolver(LLAMA_DEMO["ovos-solver-openai-plugin"])
     #for utt in bot.stream_utterances("describe quantum mechanics in simple terms"):
     #    print(utt)
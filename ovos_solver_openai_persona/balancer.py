@@ -0,0 +1,651 @@
+import asyncio
+import itertools
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import asynccontextmanager, contextmanager
+from threading import Lock
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+from ovos_utils.log import LOG
+from requests import RequestException
+
+from ovos_solver_openai_persona.cancellation import CancellationToken, RequestCancelled
+from ovos_solver_openai_persona.connection import (abort_response, as_request_exception, balancer_retries,
+                                                   get_timeout, get_async_timeout)
+from ovos_solver_openai_persona.metrics import RequestMetrics
+from ovos_solver_openai_persona.ratelimit import (PRIORITY_INTERACTIVE, RateLimiter, estimate_request_tokens,
+                                                  get_limiter, parse_retry_after)
+from ovos_solver_openai_persona.transport import HTTP_TRANSPORT, Transport, get_transport
+
+
+class EndpointError(RequestException):
+    """ an endpoint answered with a status worth failing over for, 5xx or 429 """
+
+    def __init__(self, *args, status: Optional[int] = None, retry_after: Optional[float] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.status = status  # HTTP status of the answer
+        self.retry_after = retry_after  # seconds requested by the Retry-After header
+
+
+def is_throttled(error: Exception) -> bool:
+    """ True if the server asked to slow down, a 429 or an answer with a Retry-After header """
+    return isinstance(error, EndpointError) and (error.status == 429 or error.retry_after is not None)
+
+
+class Endpoint:
+    """
+    An OpenAI compatible server, with the health and load statistics used for routing.
+    """
+
+    def __init__(self, api_url: str, key: str, model: str, weight: float = 1.0):
+        self.api_url = api_url.rstrip("/")
+        self.key = key
+        self.model = model
+        self.weight = weight
+        self.in_flight = 0
+        self.latency: Optional[float] = None  # moving average of the time to first byte, seconds
+        self.failures = 0  # consecutive failures
+        self.open_until = 0.0  # circuit breaker, no requests are routed here before this time
+        self.limiter: Optional[RateLimiter] = None  # shared by all endpoints of the same account
+
+    def __repr__(self):
+        return f"Endpoint({self.api_url}, model={self.model})"
+
+
+class LoadBalancer:
+    """
+    Routes requests across several OpenAI compatible endpoints.
+
+    Requests go to the endpoint with the lowest expected latency (or fewest requests in flight),
+    failing over to the next best endpoint on connection errors, 5xx and 429 responses.
+    Endpoints that fail repeatedly are skipped until their circuit breaker cools down.
+    If hedge_after is set and the first byte of a response has not arrived in time, the request
+    is duplicated to a second endpoint and whichever answers first is used.
+    Requests failing on every endpoint are retried with a short backoff, or after the pause of a throttled
+    account, for at most max_retry_wait seconds in total.
+    """
+
+    def __init__(self, endpoints: List[Endpoint],
+                 routing: str = "latency",
+                 breaker_failures: int = 3,
+                 breaker_cooldown: float = 30,
+                 hedge_after: float = 0,
+                 hedge_workers: int = 32,
+                 retries: int = 0,
+                 retry_backoff: float = 0.25,
+                 max_retry_wait: float = 10,
+                 transport: Transport = HTTP_TRANSPORT):
+        """
+        Args:
+            endpoints: The servers to balance across.
+            routing: "latency" to prefer the fastest endpoint, "in_flight" to prefer the least busy one,
+                both are scaled by endpoint weight.
+            breaker_failures: Consecutive failures after which an endpoint is skipped.
+            breaker_cooldown: Seconds an endpoint is skipped for before it is tried again.
+            hedge_after: Seconds to wait for the first byte before duplicating a request, 0 to disable.
+            hedge_workers: Maximum number of hedged requests in flight across all callers.
+            retries: Times a request failing on every endpoint is tried again.
+            retry_backoff: Seconds before the first retry after connection errors and 5xx, doubled on every retry.
+            max_retry_wait: Longest total time spent retrying, including rate limit pauses, so a request
+                never hangs on a dead or throttled account even without a deadline.
+            transport: Sends the requests, eg. a ReplayTransport to answer from recorded traffic.
+        """
+        if not endpoints:
+            raise ValueError("at least one endpoint is required")
+        if routing not in ("latency", "in_flight"):
+            raise ValueError(f"unknown routing strategy: {routing}")
+        self.endpoints = endpoints
+        self.routing = routing
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+        self.hedge_after = hedge_after if len(endpoints) > 1 else 0
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.max_retry_wait = max_retry_wait
+        self.transport = transport
+        self._lock = Lock()
+        self._executor = ThreadPoolExecutor(max_workers=hedge_workers) if self.hedge_after else None
+
+    @classmethod
+    def from_config(cls, config: Dict, api_url: str, key: str, model: str) -> "LoadBalancer":
+        """
+        Creates the balancer described by the "endpoints" list of a solver config,
+        or a single endpoint balancer from api_url if there is no such list.
+
+        Endpoints default to the top level key and model if they do not set their own,
+        endpoints sharing an api_url and key share a rate limiter configured by the "rate_limit" section.
+        """
+        endpoints = [Endpoint(api_url=ep["api_url"],
+                              key=ep.get("key", key),
+                              model=ep.get("model", model),
+                              weight=ep.get("weight", 1.0))
+                     for ep in config.get("endpoints") or []]
+        if not endpoints:
+            endpoints = [Endpoint(api_url, key, model)]
+        for ep in endpoints:
+            ep.limiter = get_limiter(ep.api_url, ep.key, config)
+        rate_cfg = config.get("rate_limit") or {}
+        return cls(endpoints,
+                   routing=config.get("routing", "latency"),
+                   breaker_failures=config.get("breaker_failures", 3),
+                   breaker_cooldown=config.get("breaker_cooldown", 30),
+                   hedge_after=config.get("hedge_after", 0),
+                   hedge_workers=config.get("hedge_workers", 32),
+                   retries=balancer_retries(config),
+                   retry_backoff=rate_cfg.get("retry_backoff", 0.25),
+                   max_retry_wait=rate_cfg.get("max_retry_wait", 10),
+                   transport=get_transport(config))
+
+    # routing and health tracking
+    def _score(self, ep: Endpoint) -> Tuple[float, float]:
+        latency = ep.latency or 0.0  # endpoints without statistics are tried first
+        if self.routing == "in_flight":
+            return (ep.in_flight + 1) / ep.weight, latency
+        # queued requests add roughly one latency each
+        return latency * (ep.in_flight + 1) / ep.weight, ep.in_flight
+
+    def pick(self, exclude: List[Endpoint] = ()) -> Optional[Endpoint]:
+        """
+        Returns the best endpoint not in exclude, or None if all were excluded.
+
+        If every remaining endpoint has an open circuit breaker, the one closest to cooling down is returned.
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = [ep for ep in self.endpoints if ep not in exclude]
+            if not candidates:
+                return None
+            healthy = [ep for ep in candidates if ep.open_until <= now]
+            if not healthy:
+                return min(candidates, key=lambda ep: ep.open_until)
+            return min(healthy, key=self._score)
+
+    def _acquire(self, ep: Endpoint):
+        with self._lock:
+            ep.in_flight += 1
+
+    def _release(self, ep: Endpoint):
+        with self._lock:
+            ep.in_flight -= 1
+
+    def _record_success(self, ep: Endpoint, latency: float):
+        with self._lock:
+            ep.latency = latency if ep.latency is None else 0.7 * ep.latency + 0.3 * latency
+            ep.failures = 0
+            ep.open_until = 0.0
+        if ep.limiter is not None:
+            ep.limiter.succeeded()
+
+    def _record_failure(self, ep: Endpoint, error: Exception):
+        with self._lock:
+            ep.failures += 1
+            if ep.failures >= self.breaker_failures:
+                if ep.open_until <= time.monotonic():
+                    LOG.warning(f"{ep} failed {ep.failures} times, skipping it for {self.breaker_cooldown}s: {error}")
+                ep.open_until = time.monotonic() + self.breaker_cooldown
+        # only throttling concerns the whole account, a dead or overloaded endpoint is left to the breaker
+        if ep.limiter is not None and is_throttled(error):
+            ep.limiter.throttled(error.retry_after)
+
+    # racing requests across endpoints
+    def _attempt(self, ep: Endpoint, func: Callable[[Endpoint], Any]) -> Any:
+        self._acquire(ep)
+        start = time.monotonic()
+        try:
+            result = func(ep)
+        except RequestCancelled:
+            self._release(ep)
+            raise
+        except Exception as e:
+            self._release(ep)
+            self._record_failure(ep, e)
+            raise
+        except BaseException:
+            self._release(ep)
+            raise
+        self._record_success(ep, time.monotonic() - start)
+        return result
+
+    def _race(self, func: Callable[[Endpoint], Any],
+              cleanup: Optional[Callable[[Any], None]],
+              cancel: Optional[CancellationToken] = None) -> Tuple[Endpoint, Any]:
+        tried: List[Endpoint] = []
+        last_error: Optional[Exception] = None
+        if not self.hedge_after:
+            # no hedging, fail over sequentially in the calling thread
+            while True:
+                ep = self.pick(tried)
+                if ep is None:
+                    raise last_error or RequestException("no endpoint available")
+                tried.append(ep)
+                if cancel is not None:
+                    cancel.raise_if_cancelled()  # no point failing over past the deadline
+                try:
+                    return ep, self._attempt(ep, func)
+                except RequestCancelled:
+                    raise
+                except Exception as e:
+                    LOG.warning(f"request to {ep} failed: {e}")
+                    last_error = e
+
+        pending: Dict[Future, Endpoint] = {}
+
+        def launch() -> bool:
+            ep = self.pick(tried)
+            if ep is None:
+                return False
+            tried.append(ep)
+            pending[self._executor.submit(self._attempt, ep, func)] = ep
+            return True
+
+        def discard(ep: Endpoint, future: Future):
+            # a losing request finished after the winner was chosen, free its connection
+            if not future.cancelled() and future.exception() is None:
+                self._release(ep)
+                if cleanup is not None:
+                    cleanup(future.result())
+
+        launch()
+        hedged = False
+        hedge_at = time.monotonic() + self.hedge_after
+        winner: Optional[Tuple[Endpoint, Any]] = None
+        try:
+            while pending and winner is None:
+                timeout = None if hedged else max(0.0, hedge_at - time.monotonic())
+                if cancel is not None and cancel.deadline is not None:
+                    timeout = cancel.remaining() if timeout is None else min(timeout, cancel.remaining())
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if cancel is not None:
+                    cancel.raise_if_cancelled()
+                if not done:
+                    if not hedged and time.monotonic() >= hedge_at:
+                        hedged = True
+                        if launch():
+                            LOG.debug(f"no response after {self.hedge_after}s, hedging request to {list(pending.values())[-1]}")
+                    continue
+                for future in done:
+                    ep = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except RequestCancelled as e:
+                        last_error = e  # the token was cancelled, give up unless another endpoint already answered
+                        continue
+                    except Exception as e:
+                        LOG.warning(f"request to {ep} failed: {e}")
+                        last_error = e
+                        continue
+                    if winner is None:
+                        winner = (ep, result)
+                    else:
+                        discard(ep, future)
+                if winner is None and not pending and not isinstance(last_error, RequestCancelled):
+                    launch()  # fail over
+        finally:
+            for future, ep in pending.items():
+                future.add_done_callback(lambda f, ep=ep: discard(ep, f))
+        if winner is None:
+            raise last_error or RequestException("no endpoint available")
+        return winner
+
+    def _retry_delay(self, attempt: int, start: float) -> Optional[float]:
+        """
+        Seconds to wait before retrying a request that failed on every endpoint, None to give up.
+
+        A throttled account is waited for by the rate limiter, other failures back off exponentially.
+        """
+        if attempt >= self.retries:
+            return None
+        now = time.monotonic()
+        if all(ep.open_until > now for ep in self.endpoints):
+            return None  # every circuit breaker is open, trying again right away fails the same way
+        paused = max([ep.limiter.paused_until - now for ep in self.endpoints if ep.limiter is not None] or [0.0])
+        delay = 0.0 if paused > 0 else self.retry_backoff * 2 ** attempt
+        if now - start + max(paused, delay) > self.max_retry_wait:
+            return None
+        return delay
+
+    def _retry(self, func: Callable[[Endpoint], Any],
+               cleanup: Optional[Callable[[Any], None]],
+               cancel: Optional[CancellationToken] = None) -> Tuple[Endpoint, Any]:
+        start = time.monotonic()
+        for attempt in itertools.count():
+            try:
+                return self._race(func, cleanup, cancel)
+            except RequestCancelled:
+                raise
+            except Exception as e:
+                delay = self._retry_delay(attempt, start)
+                if delay is None:
+                    raise
+                LOG.warning(f"request failed, retry {attempt + 1}/{self.retries}: {e}")
+                if cancel is not None:
+                    if cancel.wait(delay):
+                        raise cancel.error from e
+                elif delay:
+                    time.sleep(delay)
+
+    @contextmanager
+    def request(self, func: Callable[[Endpoint], Any],
+                cleanup: Optional[Callable[[Any], None]] = None,
+                cancel: Optional[CancellationToken] = None) -> Iterator[Tuple[Endpoint, Any]]:
+        """
+        Runs func against the best endpoint, with failover and hedging.
+
+        func should return as soon as the first byte of the response has arrived and raise on failures
+        worth failing over for, only those count against the endpoint health and rate limiter.
+        The endpoint counts as busy until the context exits.
+
+        Args:
+            func: Sends a request to the given endpoint.
+            cleanup: Releases the result of func, called for losing hedged requests and on exit.
+            cancel: Optional token, no further endpoint is tried once it is cancelled.
+
+        Returns:
+            A context manager yielding (endpoint, result of func).
+        """
+        ep, result = self._retry(func, cleanup, cancel)
+        # errors raised while the caller reads the response, eg. an API error event or a cancellation,
+        # are not the endpoint failing, they must not open its circuit breaker or pause the account
+        try:
+            yield ep, result
+        finally:
+            self._release(ep)
+            if cleanup is not None:
+                cleanup(result)
+
+    async def _async_attempt(self, ep: Endpoint, func: Callable[[Endpoint], Any]) -> Any:
+        self._acquire(ep)
+        start = time.monotonic()
+        try:
+            result = await func(ep)
+        except RequestCancelled:
+            self._release(ep)
+            raise
+        except Exception as e:
+            self._release(ep)
+            self._record_failure(ep, e)
+            raise
+        except BaseException:
+            self._release(ep)
+            raise
+        self._record_success(ep, time.monotonic() - start)
+        return result
+
+    async def _async_race(self, func: Callable[[Endpoint], Any],
+                          cleanup: Optional[Callable[[Any], None]],
+                          cancel: Optional[CancellationToken] = None) -> Tuple[Endpoint, Any]:
+        tried: List[Endpoint] = []
+        last_error: Optional[Exception] = None
+        pending: Dict[asyncio.Future, Endpoint] = {}
+
+        def launch() -> bool:
+            ep = self.pick(tried)
+            if ep is None:
+                return False
+            tried.append(ep)
+            pending[asyncio.ensure_future(self._async_attempt(ep, func))] = ep
+            return True
+
+        def discard(ep: Endpoint, task: asyncio.Future):
+            if not task.done():
+                task.cancel()  # releases the endpoint in _async_attempt
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())  # it may still fail first
+            elif not task.cancelled() and task.exception() is None:
+                self._release(ep)
+                if cleanup is not None:
+                    cleanup(task.result())
+
+        launch()
+        hedged = not self.hedge_after
+        hedge_at = time.monotonic() + self.hedge_after
+        winner: Optional[Tuple[Endpoint, Any]] = None
+        try:
+            while pending and winner is None:
+                timeout = None if hedged else max(0.0, hedge_at - time.monotonic())
+                if cancel is not None and cancel.deadline is not None:
+                    timeout = cancel.remaining() if timeout is None else min(timeout, cancel.remaining())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if cancel is not None:
+                    cancel.raise_if_cancelled()
+                if not done:
+                    if not hedged and time.monotonic() >= hedge_at:
+                        hedged = True
+                        launch()
+                    continue
+                for task in done:
+                    ep = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except RequestCancelled as e:
+                        last_error = e
+                        continue
+                    except Exception as e:
+                        LOG.warning(f"request to {ep} failed: {e}")
+                        last_error = e
+                        continue
+                    if winner is None:
+                        winner = (ep, result)
+                    else:
+                        discard(ep, task)
+                if winner is None and not pending and not isinstance(last_error, RequestCancelled):
+                    launch()  # fail over
+        finally:
+            # also runs if the caller is cancelled while waiting
+            for task, ep in pending.items():
+                discard(ep, task)
+        if winner is None:
+            raise last_error or RequestException("no endpoint available")
+        return winner
+
+    async def _async_retry(self, func: Callable[[Endpoint], Any],
+                           cleanup: Optional[Callable[[Any], None]],
+                           cancel: Optional[CancellationToken] = None) -> Tuple[Endpoint, Any]:
+        start = time.monotonic()
+        for attempt in itertools.count():
+            try:
+                return await self._async_race(func, cleanup, cancel)
+            except RequestCancelled:
+                raise
+            except Exception as e:
+                delay = self._retry_delay(attempt, start)
+                if delay is None:
+                    raise
+                LOG.warning(f"request failed, retry {attempt + 1}/{self.retries}: {e}")
+                if delay:
+                    await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def async_request(self, func: Callable[[Endpoint], Any],
+                            cleanup: Optional[Callable[[Any], None]] = None,
+                            cancel: Optional[CancellationToken] = None) -> AsyncIterator[Tuple[Endpoint, Any]]:
+        """
+        Non-blocking version of request, func is a coroutine function.
+        """
+        ep, result = await self._async_retry(func, cleanup, cancel)
+        try:
+            yield ep, result
+        finally:
+            self._release(ep)
+            if cleanup is not None:
+                cleanup(result)
+
+    # HTTP helpers
+    @staticmethod
+    def _get_headers(ep: Endpoint) -> Dict[str, str]:
+        return {
+            "Content-Type": "application/json",
+            "Authorization": "Bearer " + ep.key
+        }
+
+    @staticmethod
+    def _guard(chunks: Iterator[bytes], cancel: CancellationToken) -> Iterator[bytes]:
+        """ stops reading once cancelled, raising the cancellation instead of the error caused by the aborted socket """
+        try:
+            for chunk in chunks:
+                if cancel.cancelled:
+                    break
+                yield chunk
+        except Exception as e:
+            if cancel.cancelled:
+                raise cancel.error from e
+            raise
+        if cancel.cancelled:
+            raise cancel.error  # the body may be truncated
+
+    @staticmethod
+    async def _async_convert(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """ raises the requests equivalent of aiohttp errors, like the blocking body iterator """
+        try:
+            async for chunk in chunks:
+                yield chunk
+        except Exception as e:
+            error = as_request_exception(e)
+            if error is e:
+                raise
+            raise error from e
+
+    @staticmethod
+    async def _async_guard(chunks: AsyncIterator[bytes], cancel: CancellationToken) -> AsyncIterator[bytes]:
+        try:
+            async for chunk in chunks:
+                if cancel.cancelled:
+                    break
+                yield chunk
+        except Exception as e:
+            if cancel.cancelled:
+                raise cancel.error from e
+            raise
+        if cancel.cancelled:
+            raise cancel.error
+
+    @contextmanager
+    def post(self, path: str, payload: Dict, config: Optional[Dict] = None,
+             metrics: Optional[RequestMetrics] = None,
+             cancel: Optional[CancellationToken] = None,
+             priority: int = PRIORITY_INTERACTIVE):
+        """
+        POSTs a JSON payload to the best endpoint, the "model" is replaced by the endpoint model.
+
+        Args:
+            path: The API path, eg. "/chat/completions".
+            payload: The request body.
+            config: Optional plugin config with connection settings.
+            metrics: Optional request metrics to record connection timings in.
+            cancel: Optional token, cancelling it or reaching its deadline closes the connection
+                and raises RequestCancelled/DeadlineExceeded from the body iterator.
+            priority: Rank among requests waiting for the rate limit, lower goes first.
+
+        Returns:
+            A context manager yielding (endpoint, response, iterator over the raw body chunks),
+            the response is closed on exit.
+        """
+
+        tokens = estimate_request_tokens(payload)
+
+        def send(ep: Endpoint):
+            if cancel is not None:
+                cancel.raise_if_cancelled()
+            if ep.limiter is not None:
+                ep.limiter.acquire(tokens, priority, cancel)
+            try:
+                r = self.transport.post(ep.api_url, path, {**payload, "model": ep.model}, self._get_headers(ep),
+                                        config, get_timeout(config, cancel and cancel.remaining()))
+            except RequestException as e:
+                if cancel is not None and cancel.cancelled:
+                    raise cancel.error from e
+                raise
+            if metrics is not None:
+                metrics.mark_connected(ep.api_url)
+            if ep.limiter is not None:
+                ep.limiter.update(r.headers)
+            if r.status_code >= 500 or r.status_code == 429:
+                error = r.text[:500]
+                r.close()
+                raise EndpointError(f"{ep} returned status {r.status_code}: {error}", response=r,
+                                    status=r.status_code, retry_after=parse_retry_after(r.headers))
+            chunks = r.iter_content(chunk_size=None)
+            release = r.close
+            if cancel is not None:
+                unregister = cancel.on_cancel(lambda: abort_response(r))
+                release = lambda: (unregister(), r.close())
+                chunks = self._guard(chunks, cancel)
+            try:
+                first = next(chunks, b"")  # wait for the first byte, hedging deadline applies until here
+            except BaseException:
+                release()
+                raise
+            return r, itertools.chain((first,), chunks), release
+
+        with self.request(send, cleanup=lambda res: res[2](), cancel=cancel) as (ep, (r, chunks, _)):
+            if metrics is not None:
+                metrics.mark_first_byte()
+            yield ep, r, chunks
+
+    @asynccontextmanager
+    async def async_post(self, path: str, payload: Dict, config: Optional[Dict] = None,
+                         metrics: Optional[RequestMetrics] = None,
+                         cancel: Optional[CancellationToken] = None,
+                         priority: int = PRIORITY_INTERACTIVE):
+        """
+        Non-blocking version of post, yields (endpoint, aiohttp response, async iterator over the raw body chunks).
+
+        aiohttp errors are raised as their requests equivalent, a RequestException like in post.
+        """
+
+        tokens = estimate_request_tokens(payload)
+
+        async def send(ep: Endpoint):
+            if cancel is not None:
+                cancel.raise_if_cancelled()
+            if ep.limiter is not None:
+                await ep.limiter.async_acquire(tokens, priority, cancel)
+            try:
+                r = await self.transport.async_post(ep.api_url, path, {**payload, "model": ep.model},
+                                                    self._get_headers(ep), config,
+                                                    get_async_timeout(config, cancel and cancel.remaining()))
+            except Exception as e:
+                if cancel is not None and cancel.cancelled:
+                    raise cancel.error from e
+                error = as_request_exception(e)
+                if error is e:
+                    raise
+                raise error from e
+            if metrics is not None:
+                metrics.mark_connected(ep.api_url)
+            if ep.limiter is not None:
+                ep.limiter.update(r.headers)
+            if r.status >= 500 or r.status == 429:
+                try:
+                    error = (await r.text(errors="replace"))[:500]
+                except Exception as e:  # the body was cut, the status is the error that matters
+                    error = repr(as_request_exception(e))
+                r.close()
+                raise EndpointError(f"{ep} returned status {r.status}: {error}", status=r.status,
+                                    retry_after=parse_retry_after(r.headers))
+            chunks = self._async_convert(r.content.iter_any())
+            release = r.close
+            if cancel is not None:
+                loop = asyncio.get_running_loop()
+                unregister = cancel.on_cancel(lambda: loop.call_soon_threadsafe(r.close))
+                release = lambda: (unregister(), r.close())
+                chunks = self._async_guard(chunks, cancel)
+            try:
+                first = await chunks.__anext__()
+            except StopAsyncIteration:
+                first = b""
+            except BaseException:
+                release()
+                raise
+
+            async def body():
+                yield first
+                async for chunk in chunks:
+                    yield chunk
+
+            return r, body(), release
+
+        async with self.async_request(send, cleanup=lambda res: res[2](), cancel=cancel) as (ep, (r, chunks, _)):
+            if metrics is not None:
+                metrics.mark_first_byte()
+            yield ep, r, chunks
@@ -0,0 +1,139 @@
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from typing import Callable, Deque, List, NamedTuple, Optional, Sequence, TypeVar
+
+from ovos_utils.log import LOG
+
+T = TypeVar("T")
+
+
+class BatchResult(NamedTuple):
+    index: int  # position of the item in the batch
+    answer: Optional[str]
+    error: Optional[Exception] = None  # set if this item failed, the rest of the batch is unaffected
+    latency: float = 0.0  # seconds spent on the request that produced this item
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+# called after every finished item with (number of finished items, batch size, result)
+ProgressCallback = Callable[[int, int, BatchResult], None]
+
+
+class _Progress:
+    """ thread-safe counter that forwards finished items to a progress callback """
+
+    def __init__(self, total: int, callback: Optional[ProgressCallback] = None):
+        self.total = total
+        self.callback = callback
+        self.done = 0
+        self._lock = Lock()
+
+    def __call__(self, result: BatchResult):
+        # callbacks are serialized so they see done increasing by one each time
+        with self._lock:
+            self.done += 1
+            LOG.debug(f"batch item {result.index} finished in {result.latency:.3f}s ({self.done}/{self.total})")
+            if self.callback is not None:
+                try:
+                    self.callback(self.done, self.total, result)
+                except Exception as e:
+                    LOG.error(f"batch progress callback failed: {e}")
+
+
+def run_batch(func: Callable[[T], Optional[str]], items: Sequence[T],
+              max_workers: int = 4,
+              progress: Optional[ProgressCallback] = None) -> List[BatchResult]:
+    """
+    Calls func on every item concurrently.
+
+    Args:
+        func: The function producing the answer of a single item.
+        items: The batch.
+        max_workers: Maximum number of concurrent calls.
+        progress: Optional callback reporting each finished item.
+
+    Returns:
+        One BatchResult per item, in the order of items.
+    """
+    return run_grouped_batch(lambda group: [func(item) for item in group],
+                             items, group_size=1, max_workers=max_workers, progress=progress)
+
+
+def run_grouped_batch(func: Callable[[List[T]], List[Optional[str]]], items: Sequence[T],
+                      group_size: int = 1,
+                      max_workers: int = 4,
+                      progress: Optional[ProgressCallback] = None,
+                      fallback: Optional[Callable[[T], Optional[str]]] = None) -> List[BatchResult]:
+    """
+    Calls func on consecutive groups of items concurrently, for APIs that answer several items per request.
+
+    Args:
+        func: The function producing the answers of a group of items, in order.
+        items: The batch.
+        group_size: Maximum number of items per call of func.
+        max_workers: Maximum number of concurrent calls.
+        progress: Optional callback reporting each finished item.
+        fallback: Optional function answering a single item, used to retry the items of a failed group
+            one by one so a single bad item does not fail its whole group.
+
+    Returns:
+        One BatchResult per item, in the order of items.
+    """
+    items = list(items)
+    report = _Progress(len(items), progress)
+    results: List[Optional[BatchResult]] = [None] * len(items)
+
+    def _run_single(index: int) -> BatchResult:
+        start = time.monotonic()
+        try:
+            answer = fallback(items[index])
+            error = None
+        except Exception as e:
+            answer, error = None, e
+        return BatchResult(index, answer, error, time.monotonic() - start)
+
+    def _run_group(start_index: int) -> List[BatchResult]:
+        group = items[start_index:start_index + group_size]
+        start = time.monotonic()
+        try:
+            answers = func(group)
+            if len(answers) != len(group):
+                raise ValueError(f"expected {len(group)} answers, got {len(answers)}")
+        except Exception as e:
+            if fallback is not None and len(group) > 1:
+                LOG.warning(f"batch request failed, retrying its {len(group)} items one by one: {e}")
+                out = []
+                for i in range(start_index, start_index + len(group)):
+                    out.append(_run_single(i))
+                    report(out[-1])
+                return out
+            latency = time.monotonic() - start
+            out = [BatchResult(i, None, e, latency)
+                   for i in range(start_index, start_index + len(group))]
+        else:
+            latency = time.monotonic() - start
+            out = [BatchResult(start_index + i, answer, None, latency)
+                   for i, answer in enumerate(answers)]
+        for result in out:
+            report(result)
+        return out
+
+    def _collect(future: Future):
+        for result in future.result():
+            results[result.index] = result
+
+    # submit lazily so huge batches do not queue thousands of futures at once
+    pending: Deque[Future] = deque()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        for start_index in range(0, len(items), max(1, group_size)):
+            pending.append(pool.submit(_run_group, start_index))
+            if len(pending) >= 2 * max_workers:
+                _collect(pending.popleft())
+        while pending:
+            _collect(pending.popleft())
+    return results
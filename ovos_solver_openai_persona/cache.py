@@ -0,0 +1,262 @@
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ovos_utils.log import LOG
+
+from ovos_solver_openai_persona.connection import get_timeout
+from ovos_solver_openai_persona.transport import get_transport
+
+Embedder = Callable[[str], List[float]]  # returns the embedding vector of a string
+
+# payload keys that do not change the generated answer
+_IGNORED_KEYS = {"stream", "stream_options", "user", "prompt_cache_key"}
+
+
+def _normalize(text: str) -> str:
+    # letter case is kept, it matters for names, code and dialog rewrites
+    return " ".join(text.split())
+
+
+def _normalize_payload(payload: Dict) -> Dict:
+    payload = {k: v for k, v in payload.items() if k not in _IGNORED_KEYS}
+    if "messages" in payload:
+        payload["messages"] = [{"role": m["role"], "content": _normalize(m["content"])}
+                               for m in payload["messages"]]
+    elif isinstance(payload.get("prompt"), str):
+        payload["prompt"] = _normalize(payload["prompt"])
+    return payload
+
+
+def cache_key(payload: Dict) -> str:
+    """
+    Hashes a request payload, requests differing only in whitespace or streaming share a key.
+    """
+    data = json.dumps(_normalize_payload(payload), sort_keys=True,
+                      separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _split_query(payload: Dict) -> Tuple[str, str]:
+    """
+    Splits a payload into (context key, query text) for similarity lookups,
+    only the last user message may differ between near-duplicate requests.
+    """
+    payload = dict(payload)
+    if "messages" in payload:
+        query = payload["messages"][-1]["content"]
+        payload["messages"] = payload["messages"][:-1]
+    else:
+        query = str(payload.pop("prompt", ""))
+    return cache_key(payload), query
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class OpenAIEmbedder:
+    """
+    Embeds text with the /embeddings endpoint of an OpenAI compatible server.
+
+    Requests go through the transport of the plugin config, so similarity lookups can be replayed too.
+    """
+
+    def __init__(self, api_url: str, key: str, model: str = "text-embedding-3-small",
+                 config: Optional[Dict] = None):
+        self.api_url = api_url
+        self.key = key
+        self.model = model
+        self.config = config or {}
+        self.transport = get_transport(self.config)
+
+    def __call__(self, text: str) -> List[float]:
+        r = self.transport.post(self.api_url, "/embeddings", {"model": self.model, "input": text},
+                                {"Content-Type": "application/json", "Authorization": "Bearer " + self.key},
+                                self.config, get_timeout(self.config))
+        try:
+            response = json.loads(b"".join(r.iter_content(chunk_size=None)))
+        finally:
+            r.close()
+        return response["data"][0]["embedding"]
+
+
+class ResponseCache:
+    """
+    LRU cache of LLM answers with expiration.
+
+    Entries are kept in memory and, if a path is given, in a sqlite database that survives restarts.
+    If an embedder is given, requests whose last user message is semantically similar to a cached
+    one, with everything else identical, are answered from cache too.
+    """
+
+    def __init__(self, max_entries: int = 1000,
+                 ttl: float = 3600,
+                 path: Optional[str] = None,
+                 embedder: Optional[Embedder] = None,
+                 similarity_threshold: float = 0.95,
+                 max_temperature: float = 0.2,
+                 always: bool = False):
+        """
+        Args:
+            max_entries: Maximum number of answers kept in memory.
+            ttl: Seconds an answer stays valid, 0 to never expire.
+            path: Optional sqlite file to persist answers to.
+            embedder: Optional function returning the embedding of a query, enables similarity lookups.
+            similarity_threshold: Minimum cosine similarity for a near-duplicate query to be a cache hit.
+            max_temperature: Only requests sampled at this temperature or lower are cached.
+            always: Cache requests regardless of temperature.
+        """
+        self.max_entries = max_entries
+        self.max_temperature = max_temperature
+        self.always = always
+        self.ttl = ttl
+        self.embedder = embedder
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()  # key: (answer, timestamp)
+        # context key: [(key, vector)], least recently stored context first
+        self._vectors: "OrderedDict[str, List[Tuple[str, List[float]]]]" = OrderedDict()
+        self._n_vectors = 0
+        self._lock = Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            path = os.path.expanduser(path)
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses "
+                             "(key TEXT PRIMARY KEY, answer TEXT, created REAL)")
+            self._db.commit()
+
+    @classmethod
+    def from_config(cls, config: Dict, api_url: str, key: str) -> Optional["ResponseCache"]:
+        """
+        Creates the cache described by the "response_cache" section of a solver config.
+
+        Returns:
+            None if caching is disabled, the default.
+        """
+        cfg = config.get("response_cache", {})
+        if not cfg.get("enabled", False):
+            return None
+        embedder = None
+        if cfg.get("embeddings_model"):
+            embedder = OpenAIEmbedder(api_url, key, cfg["embeddings_model"], config)
+        return cls(max_entries=cfg.get("max_entries", 1000),
+                   ttl=cfg.get("ttl", 3600),
+                   path=cfg.get("path"),
+                   embedder=embedder,
+                   similarity_threshold=cfg.get("similarity_threshold", 0.95),
+                   max_temperature=cfg.get("max_temperature", 0.2),
+                   always=cfg.get("always", False))
+
+    def should_cache(self, payload: Dict) -> bool:
+        """
+        Answers are only cached when they are (nearly) deterministic, unless caching is forced.
+        """
+        return self.always or payload.get("temperature", 1) <= self.max_temperature
+
+    def _expired(self, created: float) -> bool:
+        return bool(self.ttl) and time.time() - created > self.ttl
+
+    def lookup(self, key: str) -> Optional[str]:
+        """
+        Returns the answer stored under a precomputed key, or None on a cache miss.
+        """
+        with self._lock:
+            if key in self._entries:
+                answer, created = self._entries[key]
+                if not self._expired(created):
+                    self._entries.move_to_end(key)
+                    return answer
+                del self._entries[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT answer, created FROM responses WHERE key=?",
+                                       (key,)).fetchone()
+                if row and not self._expired(row[1]):
+                    self._remember(key, row[0], row[1])
+                    return row[0]
+        return None
+
+    def _remember(self, key: str, answer: str, created: float):
+        self._entries[key] = (answer, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, payload: Dict) -> Optional[str]:
+        """
+        Returns the cached answer for a request payload, or None on a cache miss.
+        """
+        answer = self.lookup(cache_key(payload))
+        if answer is not None or self.embedder is None:
+            return answer
+        context, query = _split_query(payload)
+        candidates = self._vectors.get(context)
+        if not candidates:
+            return None
+        try:
+            vector = self.embedder(query)
+        except Exception as e:
+            LOG.warning(f"failed to embed query for cache lookup: {e}")
+            return None
+        best_key, best_score = None, self.similarity_threshold
+        for key, other in list(candidates):
+            score = _cosine(vector, other)
+            if score >= best_score:
+                best_key, best_score = key, score
+        if best_key is not None:
+            return self.lookup(best_key)
+        return None
+
+    def store(self, key: str, answer: str):
+        """
+        Stores an answer under a precomputed key.
+        """
+        created = time.time()
+        with self._lock:
+            self._remember(key, answer, created)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)",
+                                 (key, answer, created))
+                self._db.commit()
+
+    def put(self, payload: Dict, answer: str):
+        """
+        Stores the answer of a request payload.
+        """
+        key = cache_key(payload)
+        self.store(key, answer)
+        if self.embedder is not None:
+            context, query = _split_query(payload)
+            try:
+                vector = self.embedder(query)
+            except Exception as e:
+                LOG.warning(f"failed to embed query for cache: {e}")
+                return
+            with self._lock:
+                self._vectors.setdefault(context, []).append((key, vector))
+                self._vectors.move_to_end(context)
+                self._n_vectors += 1
+                while self._n_vectors > self.max_entries:
+                    bucket = next(iter(self._vectors.values()))
+                    bucket.pop(0)
+                    self._n_vectors -= 1
+                    if not bucket:
+                        self._vectors.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._vectors.clear()
+            self._n_vectors = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
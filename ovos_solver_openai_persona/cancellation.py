@@ -0,0 +1,185 @@
+import heapq
+import itertools
+import time
+import weakref
+from threading import Condition, Event, Lock, Thread
+from typing import Callable, List, Optional, Tuple
+
+from ovos_utils.log import LOG
+from requests import RequestException
+
+
+class RequestCancelled(RequestException):
+    """ the request was cancelled by the caller """
+
+
+class DeadlineExceeded(RequestCancelled):
+    """ the request did not finish before its deadline """
+
+
+class CancellationToken:
+    """
+    Cancels in flight LLM requests, from any thread.
+
+    A token can carry a deadline, once it passes the token cancels itself. Callbacks registered
+    with on_cancel run when the token is cancelled, they are used to close the connection of
+    a streaming request so a blocked read returns immediately.
+
+    A child token is cancelled together with its parent and never outlives the parent deadline.
+    """
+
+    def __init__(self, timeout: Optional[float] = None, parent: Optional["CancellationToken"] = None):
+        """
+        Args:
+            timeout: Seconds until the token cancels itself, None or 0 for no deadline.
+            parent: Optional token whose cancellation also cancels this one.
+        """
+        self.deadline: Optional[float] = time.monotonic() + timeout if timeout else None
+        if parent is not None and parent.deadline is not None and \
+                (self.deadline is None or parent.deadline < self.deadline):
+            self.deadline = parent.deadline
+        self.parent = parent
+        self.error: Optional[RequestCancelled] = None  # why the token was cancelled
+        self._event = Event()
+        self._lock = Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self._unlink: Optional[Callable[[], None]] = None
+        self._scheduled = False
+
+    def child(self, timeout: Optional[float] = None) -> "CancellationToken":
+        """ returns a token cancelled with this one, with an optional shorter deadline """
+        return CancellationToken(timeout, parent=self)
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self._expire()
+            return True
+        if self.parent is not None and self.parent.cancelled:
+            self.cancel(self.parent.error)
+            return True
+        return False
+
+    def remaining(self) -> Optional[float]:
+        """ seconds left until the deadline, None if there is no deadline """
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def cancel(self, error: Optional[RequestCancelled] = None):
+        """
+        Cancels the token and runs its callbacks, does nothing if already cancelled.
+        """
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.error = error or RequestCancelled("request cancelled")
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+            unlink, self._unlink = self._unlink, None
+        if unlink is not None:
+            unlink()
+        for cb in callbacks:
+            try:
+                cb()
+            except Exception as e:
+                LOG.error(f"cancellation callback failed: {e}")
+
+    def _expire(self):
+        self.cancel(DeadlineExceeded("deadline exceeded"))
+
+    def raise_if_cancelled(self):
+        """
+        Raises:
+            DeadlineExceeded: If the deadline passed.
+            RequestCancelled: If the token was cancelled.
+        """
+        if self.cancelled:
+            raise self.error
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """ blocks until the token is cancelled or timeout seconds passed, returns True if cancelled """
+        remaining = self.remaining()
+        if remaining is not None and (timeout is None or remaining < timeout):
+            timeout = remaining
+        return self._event.wait(timeout) or self.cancelled
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        Registers a callback run once when the token is cancelled, immediately if it already is.
+
+        Returns:
+            A function unregistering the callback, call it once the guarded work is done.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                if self.parent is not None and self._unlink is None:
+                    self._unlink = self.parent.on_cancel(lambda: self.cancel(self.parent.error))
+                if self.deadline is not None and not self._scheduled:
+                    self._scheduled = True
+                    _WATCHDOG.schedule(self)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+            unlink = None
+            if not self._callbacks:
+                unlink, self._unlink = self._unlink, None
+        if unlink is not None:
+            unlink()
+
+
+class _Watchdog:
+    """
+    A single background thread expiring tokens at their deadline,
+    only tokens with registered callbacks are scheduled.
+    """
+
+    def __init__(self):
+        self._cond = Condition()
+        self._heap: List[Tuple[float, int, weakref.ref]] = []
+        self._ids = itertools.count()
+        self._thread: Optional[Thread] = None
+
+    def schedule(self, token: CancellationToken):
+        with self._cond:
+            heapq.heappush(self._heap, (token.deadline, next(self._ids), weakref.ref(token)))
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name="openai-deadlines", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._cond.wait(None if not self._heap else self._heap[0][0] - time.monotonic())
+                _, _, ref = heapq.heappop(self._heap)
+            token = ref()
+            if token is not None:
+                token._expire()
+
+
+_WATCHDOG = _Watchdog()
+
+
+def get_cancel_token(cancel: Optional[CancellationToken] = None,
+                     timeout: Optional[float] = None) -> Optional[CancellationToken]:
+    """
+    Combines an optional caller token with an optional deadline.
+
+    Returns:
+        None if there is neither, so requests without deadlines do not pay for them.
+    """
+    if not timeout:
+        return cancel
+    if cancel is None:
+        return CancellationToken(timeout)
+    return cancel.child(timeout)
@@ -0,0 +1,83 @@
+from typing import Callable, Dict, List, NamedTuple, Optional, Union
+
+from ovos_utils.log import LOG
+
+
+class Choice(NamedTuple):
+    index: int  # position of the choice in the response
+    text: str
+    finish_reason: Optional[str] = None  # "stop" if the model finished the answer, "length" if it was cut at max_tokens
+
+    @property
+    def truncated(self) -> bool:
+        return self.finish_reason == "length"
+
+
+class Completion(NamedTuple):
+    """ all the choices of a single request, with the token usage of the whole request """
+    choices: List[Choice]
+    usage: Dict
+    model: Optional[str] = None
+
+    @property
+    def texts(self) -> List[str]:
+        return [c.text for c in self.choices]
+
+    @classmethod
+    def from_response(cls, response: Dict) -> "Completion":
+        """ parses a completions or chat completions API response """
+        choices = []
+        for i, c in enumerate(sorted(response.get("choices", []), key=lambda c: c.get("index", 0))):
+            text = c["message"].get("content") if "message" in c else c.get("text")
+            choices.append(Choice(c.get("index", i), text or "", c.get("finish_reason")))
+        return cls(choices, response.get("usage") or {}, response.get("model"))
+
+
+# picks the spoken answer among the candidates of a query, candidates are never empty
+Reranker = Callable[[str, List[Choice]], Choice]
+
+
+def first(query: str, choices: List[Choice]) -> Choice:
+    """ the first choice, what a request with n=1 would have answered """
+    return choices[0]
+
+
+def shortest(query: str, choices: List[Choice]) -> Choice:
+    """ the shortest complete answer, answers cut at max_tokens are only picked if all of them were """
+    return min(choices, key=lambda c: (c.truncated, len(c.text)))
+
+
+def tts_length(target_chars: int = 200) -> Reranker:
+    """
+    Returns a reranker picking the complete answer closest to target_chars, long enough to answer
+    but short enough to speak, answers cut at max_tokens are only picked if all of them were.
+    """
+
+    def rerank(query: str, choices: List[Choice]) -> Choice:
+        return min(choices, key=lambda c: (c.truncated, abs(len(c.text) - target_chars)))
+
+    return rerank
+
+
+RERANKERS = {
+    "first": lambda config: first,
+    "shortest": lambda config: shortest,
+    "tts_length": lambda config: tts_length(config.get("tts_target_chars", 200)),
+}
+
+
+def get_reranker(reranker: Union[str, Reranker, None], config: Optional[Dict] = None) -> Reranker:
+    """
+    Resolves the "reranker" config option.
+
+    Args:
+        reranker: The name of a built-in reranker, see RERANKERS, or a callable.
+        config: The solver config, for the options of built-in rerankers.
+    """
+    if callable(reranker):
+        return reranker
+    if reranker not in RERANKERS:
+        if reranker is not None:
+            LOG.error(f"unknown reranker '{reranker}', valid rerankers are {list(RERANKERS)}")
+        reranker = "first"
+    return RERANKERS[reranker](config or {})
@@ -0,0 +1,191 @@
+import asyncio
+import socket
+import sys
+from threading import Lock
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+from weakref import WeakKeyDictionary
+
+if TYPE_CHECKING:
+    import requests
+
+# one pooled session per server, shared by every solver/transformer/summarizer instance
+_SESSIONS: Dict[str, "requests.Session"] = {}
+_LOCK = Lock()
+# aiohttp sessions are bound to an event loop, pooled per loop + server
+_ASYNC_SESSIONS: "WeakKeyDictionary[asyncio.AbstractEventLoop, Dict]" = WeakKeyDictionary()
+
+
+def _pool_key(api_url: str) -> str:
+    """
+    Returns the scheme and host of an api url, connections are pooled per server.
+    """
+    parts = urlsplit(api_url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_timeout(config: Optional[Dict] = None, remaining: Optional[float] = None) -> Tuple[float, float]:
+    """
+    Returns the (connect, read) timeout tuple for requests from a plugin config.
+
+    Args:
+        config: Optional plugin config with connect_timeout and read_timeout.
+        remaining: Optional seconds left until the request deadline, caps both timeouts.
+    """
+    config = config or {}
+    connect, read = config.get("connect_timeout", 5), config.get("read_timeout", 60)
+    if remaining is not None:
+        remaining = max(remaining, 0.001)
+        connect, read = min(connect, remaining), min(read, remaining)
+    return connect, read
+
+
+def balancer_retries(config: Optional[Dict] = None) -> int:
+    """
+    Returns the times the load balancer retries a request failing on every endpoint, 0 if rate limiting is disabled.
+    """
+    rate_cfg = (config or {}).get("rate_limit") or {}
+    return rate_cfg.get("retries", 2) if rate_cfg.get("enabled", True) else 0
+
+
+def get_session(api_url: str, config: Optional[Dict] = None) -> "requests.Session":
+    """
+    Returns the shared pooled session for the server hosting api_url, creating it if needed.
+
+    Connections are kept alive and reused across all plugin instances talking to the same server,
+    avoiding a new TCP + TLS handshake on every utterance.
+
+    NOTE: pool settings are read from the config of the first instance that connects to a server
+
+    Args:
+        api_url: The url that will be requested, only scheme and host are used as key.
+        config: Optional plugin config with pool settings:
+            pool_connections, pool_maxsize, max_retries, retry_backoff, keep_alive,
+            max_retries and retry_backoff only apply when the load balancer does not retry, see balancer_retries
+
+    Returns:
+        A requests.Session with a mounted connection pool.
+    """
+    key = _pool_key(api_url)
+    with _LOCK:
+        if key not in _SESSIONS:
+            _SESSIONS[key] = _create_session(config or {})
+        return _SESSIONS[key]
+
+
+def _create_session(config: Dict) -> "requests.Session":
+    # the HTTP client is only imported when the first request is made
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    if balancer_retries(config):
+        # the load balancer owns retries, retrying here too would multiply the attempts
+        retries = Retry(total=0, connect=0, read=0, raise_on_status=False)
+    else:
+        retries = Retry(total=config.get("max_retries", 3),
+                        read=0,  # do not re-send a request that already reached the server
+                        backoff_factor=config.get("retry_backoff", 0.3),
+                        status_forcelist=(502, 503, 504),
+                        allowed_methods=frozenset({"GET", "POST"}),
+                        raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=config.get("pool_connections", 4),
+                          pool_maxsize=config.get("pool_maxsize", 10),
+                          max_retries=retries)
+    s = requests.Session()
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    if not config.get("keep_alive", True):
+        s.headers["Connection"] = "close"
+    return s
+
+
+def abort_response(r: "requests.Response"):
+    """
+    Closes a streaming response from any thread, a read blocked on it returns immediately.
+
+    The connection is dropped instead of being returned to the pool since the rest of the body was not read.
+    """
+    sock = getattr(getattr(r.raw, "_connection", None), "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)  # wakes up a recv in another thread, close() alone does not
+        except OSError:
+            pass  # already closed
+    r.close()
+
+
+def close_sessions():
+    """
+    Closes all pooled sessions, releasing their connections.
+    """
+    with _LOCK:
+        for s in _SESSIONS.values():
+            s.close()
+        _SESSIONS.clear()
+
+
+def get_async_timeout(config: Optional[Dict] = None, remaining: Optional[float] = None):
+    """
+    Returns the aiohttp.ClientTimeout equivalent of get_timeout, remaining also limits the total request time.
+    """
+    import aiohttp
+    connect, read = get_timeout(config, remaining)
+    return aiohttp.ClientTimeout(total=remaining and max(remaining, 0.001), sock_connect=connect, sock_read=read)
+
+
+def as_request_exception(e: Exception) -> Exception:
+    """
+    Maps an error of the aiohttp client to its requests equivalent, so sync and async callers handle the same errors.
+
+    Returns:
+        The converted error, or e itself if it is not an aiohttp error.
+    """
+    import requests
+    aiohttp = sys.modules.get("aiohttp")  # if it was never imported it did not raise
+    if isinstance(e, asyncio.TimeoutError):
+        return requests.Timeout(str(e) or "request timed out")
+    if aiohttp is not None and isinstance(e, aiohttp.ClientError):
+        return requests.ConnectionError(str(e) or type(e).__name__)
+    return e
+
+
+def get_async_session(api_url: str, config: Optional[Dict] = None):
+    """
+    Returns the shared aiohttp session for the server hosting api_url in the running event loop.
+
+    Requires the optional "aiohttp" dependency, install with "pip install ovos-openai-plugin[async]"
+
+    Args:
+        api_url: The url that will be requested, only scheme and host are used as key.
+        config: Optional plugin config with pool settings:
+            async_pool_maxsize, keep_alive
+
+    Returns:
+        An aiohttp.ClientSession bound to the running event loop.
+    """
+    try:
+        import aiohttp
+    except ImportError as e:
+        raise ImportError("async methods require aiohttp, "
+                          "install with 'pip install ovos-openai-plugin[async]'") from e
+    config = config or {}
+    loop = asyncio.get_running_loop()
+    key = _pool_key(api_url)
+    with _LOCK:
+        sessions = _ASYNC_SESSIONS.setdefault(loop, {})
+        if key not in sessions or sessions[key].closed:
+            connector = aiohttp.TCPConnector(limit=config.get("async_pool_maxsize", 100),
+                                             force_close=not config.get("keep_alive", True))
+            sessions[key] = aiohttp.ClientSession(connector=connector)
+        return sessions[key]
+
+
+async def close_async_sessions():
+    """
+    Closes all aiohttp sessions of the running event loop, call before the loop is closed.
+    """
+    with _LOCK:
+        sessions = _ASYNC_SESSIONS.pop(asyncio.get_running_loop(), {})
+    for s in sessions.values():
+        await s.close()
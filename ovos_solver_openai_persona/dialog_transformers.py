@@ -1,39 +1,328 @@
-from typing import Tuple
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from threading import Lock
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from ovos_plugin_manager.templates.transformers import DialogTransformer
+from ovos_utils.bracket_expansion import expand_template
+from ovos_utils.log import LOG
+from ovos_utils.xdg_utils import xdg_cache_home
 
-from ovos_solver_openai_persona import OpenAIChatCompletionsSolver
+if TYPE_CHECKING:
+    from ovos_solver_openai_persona.cache import ResponseCache
+    from ovos_solver_openai_persona.engines import OpenAIChatCompletionsSolver
 
 
 class OpenAIDialogTransformer(DialogTransformer):
     def __init__(self, name="ovos-dialog-transformer-openai-plugin", priority=10, config=None):
         """
         Initializes the OpenAIDialogTransformer with a name, priority, and configuration.
-        
-        Creates an OpenAIChatCompletionsSolver using the provided API key, API URL, and a system prompt from the configuration or a default prompt if not specified.
+
+        An OpenAIChatCompletionsSolver is created on first use, with the API key, API URL, and a system prompt from the configuration or a default prompt if not specified.
+        The solver shares the pooled HTTP connections of any other plugin talking to the same server.
+        Rewrites are cached on disk, see the "rewrite_cache" config section.
+        Rewrites run in a pool of "rewrite_workers" threads, with a "latency_budget" in milliseconds
+        a rewrite that is not ready in time is finished in the background and the original dialog is spoken.
         """
         super().__init__(name, priority, config)
-        self.solver = OpenAIChatCompletionsSolver({
-            "key": self.config.get("key"),
-            'api_url': self.config.get('api_url', 'https://api.openai.com/v1'),
-            "enable_memory": False,
-            "system_prompt": self.config.get("system_prompt") or "Your task is to rewrite text as if it was spoken by a different character"
-        })
+        self.latency_budget = self.config.get("latency_budget", 0)  # ms, 0 waits for the rewrite
+        self.workers = self.config.get("rewrite_workers", 4)
+        # OPM loads every plugin at boot, the solver and cache database are only created when a dialog is transformed
+        self._solver: Optional["OpenAIChatCompletionsSolver"] = None
+        self._rewrite_cache: Optional["ResponseCache"] = None
+        self._cache_loaded = False
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pending: Dict[str, Future] = {}  # rewrites in flight, a dialog queued twice is only rewritten once
+        self._lock = Lock()
+
+    @property
+    def solver(self) -> "OpenAIChatCompletionsSolver":
+        if self._solver is None:
+            with self._lock:
+                if self._solver is None:
+                    from ovos_solver_openai_persona.engines import OpenAIChatCompletionsSolver
+                    # NOTE: the full config is passed so model and connection pool settings are honored
+                    solver = OpenAIChatCompletionsSolver({
+                        **self.config,
+                        "key": self.config.get("key"),
+                        'api_url': self.config.get('api_url', 'https://api.openai.com/v1'),
+                        "enable_memory": False,
+                        "system_prompt": self.config.get("system_prompt") or "Your task is to rewrite text as if it was spoken by a different character"
+                    })
+                    solver.metrics_label = self.__class__.__name__
+                    self._solver = solver
+        return self._solver
+
+    @property
+    def rewrite_cache(self) -> Optional["ResponseCache"]:
+        """ the on disk cache of rewrites, None if disabled """
+        if not self._cache_loaded:
+            with self._lock:
+                if not self._cache_loaded:
+                    cache_cfg = self.config.get("rewrite_cache", {})
+                    if cache_cfg.get("enabled", True):
+                        from ovos_solver_openai_persona.cache import ResponseCache
+                        path = cache_cfg.get("path") or os.path.join(xdg_cache_home(), "ovos_openai", "dialog_rewrites.db")
+                        self._rewrite_cache = ResponseCache(max_entries=cache_cfg.get("max_entries", 10000),
+                                                            ttl=cache_cfg.get("ttl", 0),
+                                                            path=path)
+                    self._cache_loaded = True
+        return self._rewrite_cache
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        """ the threads rewriting queued dialogs """
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix="openai-rewrite")
+        return self._pool
+
+    def _rewrite_key(self, prompt: str, dialog: str, lang: Optional[str] = None) -> str:
+        # the same dialog is rewritten differently in every language
+        data = json.dumps([prompt, self.solver.system_prompt, self.solver.engine, lang, dialog],
+                          ensure_ascii=False)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def rewrite(self, dialog: str, prompt: str, lang: Optional[str] = None) -> Optional[str]:
+        """
+        Rewrites a dialog string with the given prompt, using the rewrite cache if enabled.
+
+        Returns:
+            The rewritten dialog, or None if the LLM did not produce a usable answer.
+        """
+        key = None
+        if self.rewrite_cache is not None:
+            key = self._rewrite_key(prompt, dialog, lang)
+            cached = self.rewrite_cache.lookup(key)
+            if cached is not None:
+                return cached
+        rewritten = self.solver.get_spoken_answer(f"{prompt} : {dialog}", lang=lang)
+        if rewritten and key is not None:
+            self.rewrite_cache.store(key, rewritten)
+        return rewritten
+
+    def _safe_rewrite(self, dialog: str, prompt: str, lang: Optional[str] = None) -> Optional[str]:
+        try:
+            return self.rewrite(dialog, prompt, lang)
+        except Exception as e:
+            LOG.error(f"failed to rewrite '{dialog}': {e}")
+            return None
+
+    def submit(self, dialog: str, prompt: str, lang: Optional[str] = None) -> Future:
+        """
+        Queues a rewrite in the worker pool, or returns the one already in flight for the same dialog.
+
+        Returns:
+            A future of the rewritten dialog, None if the rewrite failed.
+        """
+        key = self._pending_key(dialog, prompt, lang)
+        pool = self.pool
+        with self._lock:
+            future = self._pending.get(key)
+            new = future is None
+            if new:
+                future = self._pending[key] = pool.submit(self._safe_rewrite, dialog, prompt, lang)
+        if new:
+            # runs right away if the rewrite is already done, eg. a cache hit, so not while holding the lock
+            future.add_done_callback(lambda f: self._forget(key, f))
+        return future
+
+    @staticmethod
+    def _pending_key(dialog: str, prompt: str, lang: Optional[str] = None) -> str:
+        return json.dumps([prompt, lang, dialog], ensure_ascii=False)
+
+    def _forget(self, key: str, future: Future):
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
 
     def transform(self, dialog: str, context: dict = None) -> Tuple[str, dict]:
         """
         Transforms the dialog string using a character-specific prompt if available.
-        
+
         If a prompt is provided in the context or configuration, rewrites the dialog as if spoken by a different character using the solver; otherwise, returns the original dialog unchanged.
-        
+        The original dialog is also returned if the rewrite fails, or if it takes longer than the latency budget,
+        the rewrite then keeps going in the background and fills the rewrite cache for the next time.
+
         Args:
             dialog: The dialog string to be transformed.
             context: Optional dictionary containing transformation context, such as a prompt or language.
-        
+
         Returns:
             A tuple containing the transformed (or original) dialog and the unchanged context.
         """
+        context = context or {}
         prompt = context.get("prompt") or self.config.get("rewrite_prompt")
         if not prompt:
             return dialog, context
-        return self.solver.get_spoken_answer(f"{prompt} : {dialog}", lang=context.get("lang")), context
+        future = self.submit(dialog, prompt, lang=context.get("lang"))
+        try:
+            rewritten = future.result(timeout=self.latency_budget / 1000 if self.latency_budget else None)
+        except TimeoutError:
+            LOG.debug(f"rewrite not ready after {self.latency_budget}ms, speaking the original dialog: '{dialog}'")
+            return dialog, context
+        return rewritten or dialog, context
+
+    def stream_transform(self, dialog: str, context: dict = None) -> Iterator[str]:
+        """
+        Streaming version of transform, yields the rewritten dialog sentence by sentence as the LLM generates it.
+
+        A cached rewrite, or one already queued by transform, is split into sentences and yielded right away.
+        A streamed rewrite is only cached if it was read to the end, the latency budget does not apply.
+
+        Args:
+            dialog: The dialog string to be transformed.
+            context: Optional dictionary containing transformation context, such as a prompt or language.
+
+        Returns:
+            An iterator over the sentences of the rewritten dialog, or over the original dialog
+            if there is no prompt or the rewrite failed before its first sentence.
+        """
+        context = context or {}
+        prompt = context.get("prompt") or self.config.get("rewrite_prompt")
+        if not prompt:
+            yield dialog
+            return
+        lang = context.get("lang")
+        with self._lock:
+            future = self._pending.get(self._pending_key(dialog, prompt, lang))
+        if future is not None:
+            yield from self._split(future.result() or dialog, lang)
+            return
+        key = None
+        if self.rewrite_cache is not None:
+            key = self._rewrite_key(prompt, dialog, lang)
+            cached = self.rewrite_cache.lookup(key)
+            if cached is not None:
+                yield from self._split(cached, lang)
+                return
+        spoken = []
+        try:
+            # memory is disabled in the solver, no utterance limits since a rewrite must be complete
+            for utt in self.solver.stream_utterances(f"{prompt} : {dialog}", lang=lang,
+                                                     max_utterances=0, max_chars=0):
+                spoken.append(utt)
+                yield utt
+        except Exception as e:
+            LOG.error(f"failed to rewrite '{dialog}': {e}")
+            if not spoken:
+                yield dialog
+            return
+        if not spoken:
+            yield dialog
+        elif key is not None:
+            self.rewrite_cache.store(key, " ".join(spoken))
+
+    def _split(self, text: str, lang: Optional[str] = None) -> List[str]:
+        """ splits a complete rewrite into sentences, like a streamed one """
+        segmenter = self.solver._get_segmenter(lang)
+        return segmenter.feed(text) + segmenter.flush()
+
+    def warmup(self, dialogs: Iterable[str], prompt: Optional[str] = None,
+               lang: Optional[str] = None, workers: int = 4) -> int:
+        """
+        Pre-renders rewrites for a list of dialogs concurrently, so later transforms are cache hits.
+
+        Args:
+            dialogs: The dialog strings to rewrite.
+            prompt: The rewrite prompt, defaults to "rewrite_prompt" from config.
+            lang: Optional language code, rewrites are cached per language so it must match the
+                "lang" of the transform context.
+            workers: Number of concurrent LLM requests.
+
+        Returns:
+            The number of dialogs that were rewritten, excluding those already cached.
+        """
+        prompt = prompt or self.config.get("rewrite_prompt")
+        if not prompt:
+            raise ValueError("rewrite_prompt not set")
+        if self.rewrite_cache is None:
+            raise RuntimeError("rewrite_cache is disabled, nothing to warm up")
+        todo = [d for d in dict.fromkeys(dialogs)
+                if self.rewrite_cache.lookup(self._rewrite_key(prompt, d, lang)) is None]
+
+        def _rewrite(dialog: str) -> bool:
+            try:
+                return bool(self.rewrite(dialog, prompt, lang))
+            except Exception as e:
+                LOG.error(f"failed to rewrite '{dialog}': {e}")
+                return False
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return sum(pool.map(_rewrite, todo))
+
+    def warmup_directory(self, path: str, prompt: Optional[str] = None,
+                         lang: Optional[str] = None, workers: int = 4) -> int:
+        """
+        Pre-renders rewrites for all dialog templates in .dialog files under a directory.
+
+        Templates are expanded, eg. "(hello|hi) there" gives "hello there" and "hi there",
+        templates with {variables} are skipped since their rendered text is unknown.
+
+        Returns:
+            The number of dialogs that were rewritten, excluding those already cached.
+        """
+        return self.warmup(load_dialog_templates(path), prompt=prompt, lang=lang, workers=workers)
+
+    def default_shutdown(self):
+        """ drops queued rewrites, the ones already running are finished """
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def load_dialog_templates(path: str) -> List[str]:
+    """
+    Loads and expands all dialog templates from a .dialog file or a directory of them.
+    """
+    if os.path.isdir(path):
+        files = [os.path.join(root, f) for root, _, names in os.walk(path)
+                 for f in names if f.endswith(".dialog")]
+    else:
+        files = [path]
+    dialogs = []
+    for file in sorted(files):
+        with open(file, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                for dialog in expand_template(line):
+                    if "{" in dialog:
+                        LOG.debug(f"skipping template with variables: {dialog}")
+                        continue
+                    dialogs.append(dialog)
+    return dialogs
+
+
+def warmup_cli():
+    """
+    ovos-dialog-transformer-openai-warmup [--prompt ...] [--lang ...] [--workers N] PATH [PATH ...]
+
+    Pre-renders rewrites for dialog files using the plugin configuration from mycroft.conf
+
+    Prints a single line to stdout once done, "rewrote <new> of <unique dialogs> dialogs",
+    dialogs that were already cached are not counted as rewritten. Errors go to the log.
+    """
+    parser = argparse.ArgumentParser(description="pre-render OpenAI dialog transformer rewrites")
+    parser.add_argument("paths", nargs="+", help=".dialog files or directories of skill dialogs")
+    parser.add_argument("--prompt", help="rewrite prompt, defaults to 'rewrite_prompt' from config")
+    parser.add_argument("--lang", help="language of the dialogs")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent LLM requests")
+    args = parser.parse_args()
+
+    transformer = OpenAIDialogTransformer()
+    dialogs = []
+    for path in args.paths:
+        dialogs += load_dialog_templates(path)
+    n = transformer.warmup(dialogs, prompt=args.prompt, lang=args.lang, workers=args.workers)
+    sys.stdout.write(f"rewrote {n} of {len(set(dialogs))} dialogs\n")
+
+
+if __name__ == "__main__":
+    warmup_cli()
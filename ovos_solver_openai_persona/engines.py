@@ -1,14 +1,28 @@
+import itertools
 import json
-from typing import Optional, Iterable, List, Dict
+import warnings
+from contextlib import nullcontext
+from typing import Optional, Iterable, Iterator, AsyncIterable, List, Dict, Tuple
 
-import requests
 from ovos_plugin_manager.templates.language import LanguageTranslator, LanguageDetector
 from ovos_plugin_manager.templates.solvers import ChatMessageSolver
 from ovos_plugin_manager.templates.solvers import QuestionSolver
 from ovos_utils.log import LOG
 from requests import RequestException
 
-MessageList = List[Dict[str, str]]  # for typing
+from ovos_solver_openai_persona.balancer import LoadBalancer
+from ovos_solver_openai_persona.batch import BatchResult, ProgressCallback, run_batch, run_grouped_batch
+from ovos_solver_openai_persona.cache import ResponseCache
+from ovos_solver_openai_persona.cancellation import CancellationToken, RequestCancelled, get_cancel_token
+from ovos_solver_openai_persona.choices import Completion, get_reranker
+from ovos_solver_openai_persona.memory import (ChatMemory, MessageList, SessionMemory,
+                                               DEFAULT_SESSION, get_tokenizer)
+from ovos_solver_openai_persona.metrics import RequestMetrics, record_cache_hit, setup_metrics, start_request
+from ovos_solver_openai_persona.prefetch import SpeculativePrefetcher
+from ovos_solver_openai_persona.ratelimit import PRIORITY_BATCH, PRIORITY_INTERACTIVE
+from ovos_solver_openai_persona.segmenter import SentenceSegmenter
+from ovos_solver_openai_persona.singleflight import SingleFlight, flight_key
+from ovos_solver_openai_persona.sse import SSEDecoder, SSEEvent, StreamError, StreamInterrupted, parse_chat_chunk
 
 
 class OpenAICompletionsSolver(QuestionSolver):
@@ -29,22 +43,43 @@ class OpenAICompletionsSolver(QuestionSolver):
                  detector=detector, priority=priority,
                  enable_tx=enable_tx, enable_cache=enable_cache,
                  internal_lang=internal_lang)
-        self.api_url = f"{self.config.get('api_url', 'https://api.openai.com/v1')}/completions"
+        self._base_url = self.config.get('api_url', 'https://api.openai.com/v1')
+        self.api_url = f"{self._base_url}/completions"
         self.engine = self.config.get("model", "gpt-4o-mini")
-        self.key = self.config.get("key")
-        if not self.key:
+        self.balancer = LoadBalancer.from_config(self.config, self._base_url, self.config.get("key"), self.engine)
+        if not all(ep.key for ep in self.balancer.endpoints):
             LOG.error("key not set in config")
             raise ValueError("key must be set")
+        self.key = self.config.get("key") or self.balancer.endpoints[0].key
+        self.response_cache = ResponseCache.from_config(self.config, self._base_url, self.key)
+        self.n = self.config.get("n", 1)  # candidate answers per request, the reranker picks the spoken one
+        self.reranker = get_reranker(self.config.get("reranker"), self.config)
+        self.metrics_label = self.__class__.__name__  # requests are aggregated per label in metrics
+        self.request_priority = PRIORITY_INTERACTIVE  # rank when waiting for the rate limit, lower goes first
+        setup_metrics(self.config)
+
+    def _use_cache(self, payload: Dict) -> bool:
+        return self.response_cache is not None and self.response_cache.should_cache(payload)
+
+    def _cancel_token(self, cancel: Optional[CancellationToken] = None,
+                      timeout: Optional[float] = None) -> Optional[CancellationToken]:
+        """ combines the caller token with the per call timeout, or the "request_timeout" config if not given """
+        return get_cancel_token(cancel, self.config.get("request_timeout", 0) if timeout is None else timeout)
 
     # OpenAI API integration
-    def _do_api_request(self, prompt):
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": "Bearer " + self.key
-        }
+    def _get_payload(self, prompt, n: int = 1) -> Dict:
+        """
+        Builds the request body for the completions API.
 
+        Args:
+            prompt: A prompt string, or a list of prompts to complete in a single request.
+            n: Number of completions to generate for each prompt.
+
+        Returns:
+            The JSON serializable request payload.
+        """
         # https://platform.openai.com/docs/api-reference/completions/create
-        payload = {
+        return {
             "model": self.engine,
             "prompt": prompt,
             "max_tokens": self.config.get("max_tokens", 100),
@@ -52,22 +87,94 @@ class OpenAICompletionsSolver(QuestionSolver):
             # between 0 and 2. Higher values like 0.8 will make the output more random, while lower values like 0.2 will make it more focused and deterministic.
             "top_p": self.config.get("top_p", 0.2),
             # nucleus sampling alternative to temperature, the model considers the results of the tokens with top_p probability mass. 0.1 means only tokens comprising top 10% probability mass are considered.
-            "n": 1,  # How many completions to generate for each prompt.
+            "n": n,  # How many completions to generate for each prompt.
             "frequency_penalty": self.config.get("frequency_penalty", 0),
             # Number between -2.0 and 2.0. Positive values penalize new tokens based on their existing frequency in the text so far, decreasing the model's likelihood to repeat the same line verbatim.
             "presence_penalty": self.config.get("presence_penalty", 0),
             # Number between -2.0 and 2.0. Positive values penalize new tokens based on whether they appear in the text so far, increasing the model's likelihood to talk about new topics.
             "stop": self.config.get("stop_token")
         }
-        response = requests.post(self.api_url, headers=headers, data=json.dumps(payload)).json()
+
+    def _post(self, payload: Dict, cancel: Optional[CancellationToken] = None,
+              priority: Optional[int] = None) -> Dict:
+        if cancel is None:
+            cancel = self._cancel_token()
+        if priority is None:
+            priority = self.request_priority
+        with start_request(self.metrics_label) or nullcontext() as metrics:
+            with self.balancer.post("/completions", payload, self.config, metrics,
+                                    cancel, priority) as (_, r, chunks):
+                response = json.loads(b"".join(chunks))
+            if metrics is not None:
+                metrics.set_usage(response.get("usage"))
         if "error" in response:
             raise RequestException(response["error"])
-        return response["choices"][0]["text"]
+        return response
+
+    def _do_api_request(self, prompt, cancel: Optional[CancellationToken] = None,
+                        priority: Optional[int] = None):
+        payload = self._get_payload(prompt, self.n)
+        use_cache = self._use_cache(payload)
+        if use_cache:
+            cached = self.response_cache.get(payload)
+            if cached is not None:
+                record_cache_hit(self.metrics_label)
+                return cached
+        answer = self._pick(prompt, Completion.from_response(self._post(payload, cancel, priority)))
+        if use_cache:
+            self.response_cache.put(payload, answer)
+        return answer
+
+    def _do_batch_api_request(self, prompts: List[str]) -> List[str]:
+        """
+        Completes several prompts with a single request, using the array form of "prompt".
+
+        Cached prompts are answered from cache and not sent.
+
+        Returns:
+            The completions, in the order of prompts.
+        """
+        answers: List[Optional[str]] = [None] * len(prompts)
+        todo = []  # indexes of prompts not in cache
+        for i, prompt in enumerate(prompts):
+            payload = self._get_payload(prompt, self.n)
+            if self._use_cache(payload):
+                answers[i] = self.response_cache.get(payload)
+            if answers[i] is None:
+                todo.append(i)
+        if todo:
+            response = self._post(self._get_payload([prompts[i] for i in todo], self.n), priority=PRIORITY_BATCH)
+            # the choices of the k-th prompt in the request are at indexes k * n to k * n + n - 1
+            choices = Completion.from_response(response).choices
+            if len(choices) != len(todo) * self.n:
+                raise RequestException(f"expected {len(todo) * self.n} choices, got {len(choices)}")
+            for k, i in enumerate(todo):
+                answers[i] = self._pick(prompts[i], Completion(choices[k * self.n:(k + 1) * self.n], {}))
+                payload = self._get_payload(prompts[i], self.n)
+                if self._use_cache(payload):
+                    self.response_cache.put(payload, answers[i])
+        return answers
+
+    def _pick(self, query: str, completion: Completion) -> str:
+        """ the text of the choice picked by the reranker, among the choices that are a valid answer """
+        if len(completion.choices) == 1:
+            return completion.choices[0].text
+        valid = [c for c in completion.choices if self._clean_answer(c.text) is not None]
+        return self.reranker(query, valid).text if valid else completion.choices[0].text
+
+    @staticmethod
+    def _clean_answer(response: str) -> Optional[str]:
+        answer = response.strip()
+        if not answer or not answer.strip("?") or not answer.strip("_"):
+            return None
+        return answer
 
     # officially exported Solver methods
     def get_spoken_answer(self, query: str,
                           lang: Optional[str] = None,
-                          units: Optional[str] = None) -> Optional[str]:
+                          units: Optional[str] = None,
+                          timeout: Optional[float] = None,
+                          cancel: Optional[CancellationToken] = None) -> Optional[str]:
         """
         Obtain the spoken answer for a given query.
 
@@ -75,15 +182,68 @@ class OpenAICompletionsSolver(QuestionSolver):
             query (str): The query text.
             lang (Optional[str]): Optional language code. Defaults to None.
             units (Optional[str]): Optional units for the query. Defaults to None.
+            timeout (Optional[float]): Seconds the whole request may take, defaults to "request_timeout" from config.
+            cancel (Optional[CancellationToken]): Token to cancel the request from another thread.
 
         Returns:
             str: The spoken answer as a text response.
+
+        Raises:
+            DeadlineExceeded: If the answer did not arrive in time.
+            RequestCancelled: If the token was cancelled.
         """
-        response = self._do_api_request(query)
-        answer = response.strip()
-        if not answer or not answer.strip("?") or not answer.strip("_"):
-            return None
-        return answer
+        return self._clean_answer(self._do_api_request(query, self._cancel_token(cancel, timeout)))
+
+    def get_completions(self, query: str,
+                        n: Optional[int] = None,
+                        timeout: Optional[float] = None,
+                        cancel: Optional[CancellationToken] = None) -> Completion:
+        """
+        Generates several candidate answers for a query in a single request.
+
+        The prompt tokens are only paid once, unlike sending the query n times. The response cache
+        is not used, candidates are meant to be sampled.
+
+        Args:
+            query (str): The query text.
+            n (Optional[int]): Number of candidates, defaults to "n" from config.
+            timeout (Optional[float]): Seconds the whole request may take, defaults to "request_timeout" from config.
+            cancel (Optional[CancellationToken]): Token to cancel the request from another thread.
+
+        Returns:
+            Completion: Every choice with its finish reason, and the token usage of the request.
+        """
+        payload = self._get_payload(query, n or self.n)
+        return Completion.from_response(self._post(payload, self._cancel_token(cancel, timeout)))
+
+    def get_spoken_answers(self, queries: List[str],
+                           lang: Optional[str] = None,
+                           units: Optional[str] = None,
+                           max_workers: Optional[int] = None,
+                           progress: Optional[ProgressCallback] = None) -> List[BatchResult]:
+        """
+        Obtain the spoken answers for many queries concurrently.
+
+        Queries are sent "batch_size" at a time in a single request, if such a request fails
+        its queries are retried one by one so a single bad query does not fail the others.
+
+        Args:
+            queries (List[str]): The query texts.
+            lang (Optional[str]): Optional language code. Defaults to None.
+            units (Optional[str]): Optional units for the queries. Defaults to None.
+            max_workers (Optional[int]): Maximum concurrent requests, defaults to "batch_workers" from config.
+            progress (Optional[ProgressCallback]): Called as progress(done, total, result) after every answer.
+
+        Returns:
+            List[BatchResult]: One result per query, in order, with the answer or the error and the latency.
+        """
+        return run_grouped_batch(
+            lambda group: [self._clean_answer(a) for a in self._do_batch_api_request(group)],
+            queries,
+            group_size=self.config.get("batch_size", 20),
+            max_workers=max_workers or self.config.get("batch_workers", 4),
+            progress=progress,
+            fallback=lambda query: self._clean_answer(self._do_api_request(query, priority=PRIORITY_BATCH)))
 
 
 def post_process_sentence(text: str) -> str:
@@ -92,6 +252,75 @@ def post_process_sentence(text: str) -> str:
     return text.strip()
 
 
+# the sync and async streaming paths only differ in how they iterate, the logic below is shared
+class _ChatStreamParser:
+    """ turns the raw body chunks of a streamed chat completion into text, for a single attempt """
+
+    def __init__(self, chunks: List[str], metrics: Optional[RequestMetrics] = None, stream_usage: bool = False):
+        """
+        Args:
+            chunks: Every text received so far, shared across attempts, new texts are appended.
+            metrics: Optional request metrics to record chunks and usage in.
+            stream_usage: True if the usage chunk is requested after the last text chunk.
+        """
+        self.chunks = chunks
+        self.metrics = metrics
+        self.stream_usage = stream_usage
+        self.decoder = SSEDecoder()
+        self.done = False  # the answer is finished, the body may still hold the usage chunk
+
+    def feed(self, raw: bytes) -> List[str]:
+        """ the texts completed by a raw body chunk, raises StreamError on an error event """
+        texts, self.done = OpenAIChatCompletionsSolver._parse_stream_events(self.decoder.feed(raw), self.metrics)
+        self.chunks += texts
+        return texts
+
+    def flush(self) -> List[str]:
+        """ the texts left at the end of the body """
+        texts, _ = OpenAIChatCompletionsSolver._parse_stream_events(self.decoder.flush(), self.metrics)
+        self.chunks += texts
+        return texts
+
+    @property
+    def wants_usage(self) -> bool:
+        """ True if the rest of the body should be read for the usage chunk """
+        return self.metrics is not None and self.metrics.completion_tokens is None and self.stream_usage
+
+    def feed_usage(self, raw: bytes) -> bool:
+        """ True once the usage chunk was found """
+        return OpenAIChatCompletionsSolver._record_usage(self.decoder.feed(raw), self.metrics)
+
+
+class _AnswerSplitter:
+    """ splits streamed text into utterances, stopping at the utterance limits """
+
+    def __init__(self, segmenter: SentenceSegmenter, max_utterances: int = 0, max_chars: int = 0):
+        self.segmenter = segmenter
+        self.max_utterances = max_utterances
+        self.max_chars = max_chars
+        self.answer: List[str] = []  # utterances handed to the caller
+        self.stopped = False  # a limit was reached, the rest of the stream must not be read
+
+    def _accept(self, utts: List[str]) -> Iterator[str]:
+        for utt in utts:
+            if OpenAIChatCompletionsSolver._over_limit(self.answer, utt, self.max_chars):
+                self.stopped = True
+                return
+            self.answer.append(utt)
+            yield post_process_sentence(utt)
+            if self.max_utterances and len(self.answer) >= self.max_utterances:
+                self.stopped = True
+                return
+
+    def feed(self, chunk: str) -> Iterator[str]:
+        """ the utterances completed by a chunk of text """
+        return self._accept(self.segmenter.feed(chunk))
+
+    def flush(self) -> Iterator[str]:
+        """ the last utterance, at the end of the stream """
+        return self._accept(self.segmenter.flush())
+
+
 class OpenAIChatCompletionsSolver(ChatMessageSolver):
     def __init__(self, config=None,
                  translator: Optional[LanguageTranslator] = None,
@@ -110,15 +339,32 @@ class OpenAIChatCompletionsSolver(ChatMessageSolver):
                  detector=detector, priority=priority,
                  enable_tx=enable_tx, enable_cache=enable_cache,
                  internal_lang=internal_lang)
-        self.api_url = f"{self.config.get('api_url', 'https://api.openai.com/v1')}/chat/completions"
+        self._base_url = self.config.get('api_url', 'https://api.openai.com/v1')
+        self.api_url = f"{self._base_url}/chat/completions"
         self.engine = self.config.get("model", "gpt-4o-mini")
-        self.key = self.config.get("key")
-        if not self.key:
+        self.balancer = LoadBalancer.from_config(self.config, self._base_url, self.config.get("key"), self.engine)
+        if not all(ep.key for ep in self.balancer.endpoints):
             LOG.error("key not set in config")
             raise ValueError("key must be set")
+        self.key = self.config.get("key") or self.balancer.endpoints[0].key
         self.memory = config.get("enable_memory", True)
         self.max_utts = config.get("memory_size", 3)
-        self.qa_pairs = []  # tuple of q+a
+        self.sessions = SessionMemory(max_utts=self.max_utts,
+                                      max_tokens=config.get("memory_max_tokens", 0),
+                                      evict_batch=config.get("memory_evict_batch", 1),
+                                      tokenizer=get_tokenizer(config.get("tokenizer"), self.engine),
+                                      max_sessions=config.get("max_sessions", 1000),
+                                      session_ttl=config.get("session_ttl", 0),
+                                      max_total_tokens=config.get("memory_max_total_tokens", 0))
+        self.response_cache = ResponseCache.from_config(self.config, self._base_url, self.key)
+        self.prefetcher = SpeculativePrefetcher.from_config(self.config)
+        self.n = self.config.get("n", 1)  # candidate answers per request, the reranker picks the spoken one
+        self.reranker = get_reranker(self.config.get("reranker"), self.config)
+        # concurrent identical requests, eg. from several devices, share a single upstream request
+        self.single_flight = SingleFlight() if self.config.get("single_flight", True) else None
+        self.metrics_label = self.__class__.__name__  # requests are aggregated per label in metrics
+        self.request_priority = PRIORITY_INTERACTIVE  # rank when waiting for the rate limit, lower goes first
+        setup_metrics(self.config)
         if "persona" in config:
             LOG.warning("'persona' config option is deprecated, use 'system_prompt' instead")
         if "initial_prompt" in config:
@@ -128,26 +374,35 @@ class OpenAIChatCompletionsSolver(ChatMessageSolver):
             self.system_prompt =  "You are a helpful assistant."
             LOG.error(f"system prompt not set in config! defaulting to '{self.system_prompt}'")
 
+    @property
+    def chat_memory(self) -> ChatMemory:
+        """ memory of the default session """
+        return self.sessions.get(DEFAULT_SESSION)
+
+    @property
+    def qa_pairs(self) -> List[Tuple[str, str]]:
+        """ past question/answer exchanges of the default session, oldest first """
+        return self.sessions.qa_pairs(DEFAULT_SESSION)
+
+    @qa_pairs.setter
+    def qa_pairs(self, pairs: List[Tuple[str, str]]):
+        self.sessions.clear(DEFAULT_SESSION)
+        for q, a in pairs:
+            self.sessions.append(DEFAULT_SESSION, q, a)
+
     # OpenAI API integration
-    def _do_api_request(self, messages):
+    def _get_payload(self, messages: MessageList, stream: bool = False, n: int = 1) -> Dict:
         """
-        Sends a chat completion request to the OpenAI API and returns the assistant's reply.
-        
+        Builds the request body for the chat completions API.
+
         Args:
             messages: A list of message dictionaries representing the conversation history.
-        
+            stream: Whether the response should be streamed as server sent events.
+            n: Number of completions to generate, streams always have a single one.
+
         Returns:
-            The content of the assistant's reply as a string.
-        
-        Raises:
-            RequestException: If the OpenAI API returns an error in the response.
+            The JSON serializable request payload.
         """
-        s = requests.Session()
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": "Bearer " + self.key
-        }
-
         # params docs
         # https://platform.openai.com/docs/api-reference/completions/create
         payload = {
@@ -158,110 +413,397 @@ class OpenAIChatCompletionsSolver(ChatMessageSolver):
             # between 0 and 2. Higher values like 0.8 will make the output more random, while lower values like 0.2 will make it more focused and deterministic.
             "top_p": self.config.get("top_p", 0.2),
             # nucleus sampling alternative to temperature, the model considers the results of the tokens with top_p probability mass. 0.1 means only tokens comprising top 10% probability mass are considered.
-            "n": 1,  # How many completions to generate for each prompt.
+            "n": n,  # How many completions to generate for each prompt.
             "frequency_penalty": self.config.get("frequency_penalty", 0),
             # Number between -2.0 and 2.0. Positive values penalize new tokens based on their existing frequency in the text so far, decreasing the model's likelihood to repeat the same line verbatim.
             "presence_penalty": self.config.get("presence_penalty", 0),
             # Number between -2.0 and 2.0. Positive values penalize new tokens based on whether they appear in the text so far, increasing the model's likelihood to talk about new topics.
             "stop": self.config.get("stop_token")
         }
-        response = s.post(self.api_url, headers=headers, data=json.dumps(payload)).json()
+        if self.config.get("prompt_cache_key"):
+            # routes requests sharing a long prefix, eg. the system prompt, to the same prompt cache
+            payload["prompt_cache_key"] = self.config["prompt_cache_key"]
+        if stream:
+            payload["stream"] = True
+            if self.config.get("stream_usage"):
+                payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    def _parse_response(self, response: Dict, query: str = "") -> str:
         if "error" in response:
             raise RequestException(response["error"])
-        return response["choices"][0]["message"]["content"]
+        return self._pick(query, Completion.from_response(response))
 
-    def _do_streaming_api_request(self, messages):
+    def _pick(self, query: str, completion: Completion) -> str:
+        """ the text of the choice picked by the reranker, among the choices that are a valid answer """
+        if len(completion.choices) == 1:
+            return completion.choices[0].text
+        valid = [c for c in completion.choices if self._clean_answer(c.text) is not None]
+        return self.reranker(query, valid).text if valid else completion.choices[0].text
+
+    def _use_cache(self, payload: Dict) -> bool:
+        return self.response_cache is not None and self.response_cache.should_cache(payload)
+
+    def _cancel_token(self, cancel: Optional[CancellationToken] = None,
+                      timeout: Optional[float] = None) -> Optional[CancellationToken]:
+        """ combines the caller token with the per call timeout, or the "request_timeout" config if not given """
+        return get_cancel_token(cancel, self.config.get("request_timeout", 0) if timeout is None else timeout)
+
+    @staticmethod
+    def _parse_stream_events(events: List[SSEEvent],
+                             metrics: Optional[RequestMetrics] = None) -> Tuple[List[str], bool]:
+        """
+        Extracts the content of decoded server sent events.
+
+        Returns:
+            A (texts, done) tuple, done is True once the stream is finished or errored.
+        """
+        texts = []
+        done = False
+        for event in events:
+            text, done = parse_chat_chunk(event.data)
+            if text:
+                texts.append(text)
+            if done:
+                break
+        if metrics is not None:
+            metrics.add_chunks(len(texts))
+            OpenAIChatCompletionsSolver._record_usage(events, metrics)
+        return texts, done
+
+    @staticmethod
+    def _record_usage(events: List[SSEEvent], metrics: RequestMetrics) -> bool:
+        """
+        Looks for token usage in streamed events, sent in the last chunk by servers that support it.
+        """
+        for event in events:
+            if '"usage"' in event.data:
+                try:
+                    usage = json.loads(event.data).get("usage")
+                except ValueError:
+                    continue
+                if usage:
+                    metrics.set_usage(usage)
+                    return True
+        return False
+
+    def _do_api_request(self, messages, cancel: Optional[CancellationToken] = None,
+                        priority: Optional[int] = None):
+        """
+        Sends a chat completion request to the OpenAI API and returns the assistant's reply.
+        
+        Args:
+            messages: A list of message dictionaries representing the conversation history.
+            cancel: Optional token with the request deadline, defaults to the "request_timeout" config.
+            priority: Rank when waiting for the rate limit, defaults to request_priority.
+        
+        Returns:
+            The content of the assistant's reply as a string.
+        
+        Raises:
+            RequestException: If the OpenAI API returns an error in the response.
+            DeadlineExceeded: If the answer did not arrive in time.
+        """
+        payload = self._get_payload(messages, n=self.n)
+        use_cache = self._use_cache(payload)
+        if use_cache:
+            cached = self.response_cache.get(payload)
+            if cached is not None:
+                record_cache_hit(self.metrics_label)
+                return cached
+        if cancel is None:
+            cancel = self._cancel_token()
+        if self.single_flight is not None:
+            return self.single_flight.do(flight_key(payload),
+                                         lambda: self._send_request(payload, use_cache, cancel, priority), cancel)
+        return self._send_request(payload, use_cache, cancel, priority)
+
+    @staticmethod
+    def _read_response(body: bytes, metrics: Optional[RequestMetrics] = None) -> Dict:
+        """ decodes a complete response body, raising errors inside the metrics block so they are recorded """
+        response = json.loads(body)
+        if metrics is not None:
+            metrics.set_usage(response.get("usage"))
+        if "error" in response:
+            raise RequestException(response["error"])
+        return response
+
+    def _post(self, payload: Dict, cancel: Optional[CancellationToken] = None,
+              priority: Optional[int] = None) -> Dict:
+        with start_request(self.metrics_label) or nullcontext() as metrics:
+            with self.balancer.post("/chat/completions", payload, self.config, metrics, cancel,
+                                    self.request_priority if priority is None else priority) as (_, r, chunks):
+                body = b"".join(chunks)
+            return self._read_response(body, metrics)
+
+    async def _async_post(self, payload: Dict, cancel: Optional[CancellationToken] = None,
+                          priority: Optional[int] = None) -> Dict:
+        with start_request(self.metrics_label) or nullcontext() as metrics:
+            async with self.balancer.async_post("/chat/completions", payload, self.config, metrics, cancel,
+                                                self.request_priority if priority is None else priority) as (_, r, chunks):
+                body = b"".join([c async for c in chunks])
+            return self._read_response(body, metrics)
+
+    def _send_request(self, payload: Dict, use_cache: bool,
+                      cancel: Optional[CancellationToken] = None,
+                      priority: Optional[int] = None) -> str:
+        """ sends a request to the API, the response cache and in flight requests were already checked """
+        answer = self._parse_response(self._post(payload, cancel, priority), payload["messages"][-1]["content"])
+        if use_cache:
+            self.response_cache.put(payload, answer)
+        return answer
+
+    def _do_streaming_api_request(self, messages, cancel: Optional[CancellationToken] = None):
 
         """
         Streams response content from the OpenAI chat completions API.
         
-        Sends a POST request with the provided chat messages and yields content chunks as they are received from the streaming API. Stops iteration if an error is encountered or the response is finished.
+        Sends a POST request with the provided chat messages and yields content chunks as they are received from the streaming API. Stops iteration if an error is encountered, the request is cancelled or the response is finished.
         
         Args:
             messages: A list of chat message dictionaries to send as context.
+            cancel: Optional token to stop the stream with, defaults to the "request_timeout" config.
         
         Yields:
             str: Segments of the assistant's reply as they arrive from the API.
         """
-        s = requests.Session()
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": "Bearer " + self.key
-        }
+        payload = self._get_payload(messages, stream=True)
+        use_cache = self._use_cache(payload)
+        if use_cache:
+            cached = self.response_cache.get(payload)
+            if cached is not None:
+                record_cache_hit(self.metrics_label, stream=True)
+                yield cached
+                return
+        if self.single_flight is not None:
+            # the shared request has its own deadline, the cancel token only stops this caller
+            yield from self.single_flight.stream(flight_key(payload),
+                                                 lambda token: self._send_streaming_request(payload, use_cache, token),
+                                                 cancel, self.config.get("request_timeout", 0))
+            return
+        yield from self._send_streaming_request(payload, use_cache, cancel or self._cancel_token())
 
-        # params docs
-        # https://platform.openai.com/docs/api-reference/completions/create
-        payload = {
-            "model": self.engine,
-            "messages": messages,
-            "max_tokens": self.config.get("max_tokens", 100),
-            "temperature": self.config.get("temperature", 0.5),
-            # between 0 and 2. Higher values like 0.8 will make the output more random, while lower values like 0.2 will make it more focused and deterministic.
-            "top_p": self.config.get("top_p", 0.2),
-            # nucleus sampling alternative to temperature, the model considers the results of the tokens with top_p probability mass. 0.1 means only tokens comprising top 10% probability mass are considered.
-            "n": 1,  # How many completions to generate for each prompt.
-            "frequency_penalty": self.config.get("frequency_penalty", 0),
-            # Number between -2.0 and 2.0. Positive values penalize new tokens based on their existing frequency in the text so far, decreasing the model's likelihood to repeat the same line verbatim.
-            "presence_penalty": self.config.get("presence_penalty", 0),
-            # Number between -2.0 and 2.0. Positive values penalize new tokens based on whether they appear in the text so far, increasing the model's likelihood to talk about new topics.
-            "stop": self.config.get("stop_token"),
-            "stream": True
-        }
-        for chunk in s.post(self.api_url, headers=headers,
-                            stream=True, data=json.dumps(payload)).iter_lines():
-            if chunk:
-                chunk = chunk.decode("utf-8")
-                chunk = json.loads(chunk.split("data: ", 1)[-1])
-                if "error" in chunk and "message" in chunk["error"]:
-                    LOG.error("API returned an error: " + chunk["error"]["message"])
+    def _send_streaming_request(self, payload: Dict, use_cache: bool,
+                                cancel: Optional[CancellationToken] = None) -> Iterator[str]:
+        """ streams a request from the API, the response cache and in flight requests were already checked """
+        chunks = []
+        with start_request(self.metrics_label, stream=True) or nullcontext() as metrics:
+            for attempt in itertools.count():
+                try:
+                    with self.balancer.post("/chat/completions", payload, self.config, metrics, cancel,
+                                            self.request_priority) as (_, r, body):
+                        if self._is_error_response(r.ok, r.headers.get("Content-Type", "")):
+                            self._log_error_response(r.status_code, b"".join(body), metrics)
+                            return
+                        parser = _ChatStreamParser(chunks, metrics, self.config.get("stream_usage", False))
+                        for raw in body:
+                            yield from parser.feed(raw)
+                            if parser.done:
+                                break
+                        else:
+                            yield from parser.flush()
+                        if parser.wants_usage:
+                            for raw in body:
+                                if parser.feed_usage(raw):
+                                    break
                     break
-                if chunk["choices"][0].get("finish_reason"):
+                except (RequestException, StreamError) as e:
+                    if self._should_retry_stream(e, chunks, attempt, metrics):
+                        continue
+                    if chunks:
+                        # the caller must not take the text received so far for the whole answer
+                        raise StreamInterrupted(f"stream stopped after {len(chunks)} chunks: {e}") from e
+                    return
+        if use_cache and chunks:
+            self.response_cache.put(payload, "".join(chunks))
+
+    @staticmethod
+    def _is_error_response(ok: bool, content_type: str) -> bool:
+        # errors are sent as a regular json body, not as server sent events
+        return not ok or content_type.startswith("application/json")
+
+    @staticmethod
+    def _log_error_response(status: int, body: bytes, metrics: Optional[RequestMetrics] = None):
+        LOG.error(f"API returned an error: {status} - {body.decode('utf-8', 'replace')}")
+        if metrics is not None:
+            metrics.error = f"HTTP {status}"
+
+    def _should_retry_stream(self, error: Exception, chunks: List[str], attempt: int,
+                             metrics: Optional[RequestMetrics] = None) -> bool:
+        """
+        Handles a failed streaming request, returns True if it should be tried again.
+
+        Connection and status errors were already retried by the balancer, an error event in a stream
+        that did not send any text yet is retried here, instead of giving no answer at all.
+        """
+        if isinstance(error, RequestCancelled):
+            LOG.debug(f"streaming request stopped: {error}")
+        elif not chunks and isinstance(error, StreamError) and attempt < self.balancer.retries:
+            LOG.warning(f"streaming request failed, retry {attempt + 1}/{self.balancer.retries}: {error}")
+            return True
+        else:
+            LOG.error(f"API returned an error: {error}")
+        if metrics is not None:
+            metrics.error = type(error).__name__
+        return False
+
+    async def _async_do_api_request(self, messages, cancel: Optional[CancellationToken] = None):
+        """
+        Non-blocking version of _do_api_request, runs on the current asyncio event loop.
+
+        Raises:
+            RequestException: If the OpenAI API returns an error in the response.
+        """
+        payload = self._get_payload(messages, n=self.n)
+        use_cache = self._use_cache(payload)
+        if use_cache:
+            cached = self.response_cache.get(payload)
+            if cached is not None:
+                record_cache_hit(self.metrics_label)
+                return cached
+        if cancel is None:
+            cancel = self._cancel_token()
+        answer = self._parse_response(await self._async_post(payload, cancel), messages[-1]["content"])
+        if use_cache:
+            self.response_cache.put(payload, answer)
+        return answer
+
+    async def _async_do_streaming_api_request(self, messages, cancel: Optional[CancellationToken] = None):
+        """
+        Non-blocking version of _do_streaming_api_request, runs on the current asyncio event loop.
+
+        Yields:
+            str: Segments of the assistant's reply as they arrive from the API.
+        """
+        payload = self._get_payload(messages, stream=True)
+        use_cache = self._use_cache(payload)
+        if use_cache:
+            cached = self.response_cache.get(payload)
+            if cached is not None:
+                record_cache_hit(self.metrics_label, stream=True)
+                yield cached
+                return
+        if cancel is None:
+            cancel = self._cancel_token()
+        chunks = []
+        with start_request(self.metrics_label, stream=True) or nullcontext() as metrics:
+            for attempt in itertools.count():
+                try:
+                    async with self.balancer.async_post("/chat/completions", payload, self.config, metrics, cancel,
+                                                        self.request_priority) as (_, r, body):
+                        if self._is_error_response(r.ok, r.content_type):
+                            self._log_error_response(r.status, b"".join([c async for c in body]), metrics)
+                            return
+                        parser = _ChatStreamParser(chunks, metrics, self.config.get("stream_usage", False))
+                        async for raw in body:
+                            for text in parser.feed(raw):
+                                yield text
+                            if parser.done:
+                                break
+                        else:
+                            for text in parser.flush():
+                                yield text
+                        if parser.wants_usage:
+                            async for raw in body:
+                                if parser.feed_usage(raw):
+                                    break
                     break
-                if "content" not in chunk["choices"][0]["delta"]:
-                    continue
-                text = chunk["choices"][0]["delta"]["content"]
-                if text is not None:
-                    yield text
+                except (RequestException, StreamError) as e:
+                    if self._should_retry_stream(e, chunks, attempt, metrics):
+                        continue
+                    if chunks:
+                        # the caller must not take the text received so far for the whole answer
+                        raise StreamInterrupted(f"stream stopped after {len(chunks)} chunks: {e}") from e
+                    return
+        if use_cache and chunks:
+            self.response_cache.put(payload, "".join(chunks))
 
-    def get_chat_history(self, system_prompt=None):
+    def get_chat_history(self, system_prompt=None, session_id: str = DEFAULT_SESSION):
         """
         Builds the chat history as a list of messages, starting with a system prompt.
         
         Args:
             system_prompt: Optional override for the system prompt message.
+            session_id: The conversation to retrieve the history of.
         
         Returns:
             A list of message dictionaries representing the system prompt and the most recent user-assistant exchanges.
         """
-        qa = self.qa_pairs[-1 * self.max_utts:]
         system_prompt = system_prompt or self.system_prompt or "You are a helpful assistant."
-        messages = [
-            {"role": "system", "content": system_prompt},
-        ]
-        for q, a in qa:
-            messages.append({"role": "user", "content": q})
-            messages.append({"role": "assistant", "content": a})
-        return messages
+        return self.sessions.get_chat_history(session_id, system_prompt)
 
-    def get_messages(self, utt, system_prompt=None) -> MessageList:
+    def get_messages(self, utt, system_prompt=None, session_id: str = DEFAULT_SESSION) -> MessageList:
         """
         Builds a list of chat messages including the system prompt, recent conversation history, and the current user utterance.
         
         Args:
         	utt: The current user input to be appended as the latest message.
         	system_prompt: Optional system prompt to use as the initial message.
+        	session_id: The conversation whose history is included.
         
         Returns:
         	A list of message dictionaries representing the chat context for the API.
         """
-        messages = self.get_chat_history(system_prompt)
+        messages = self.get_chat_history(system_prompt, session_id)
         messages.append({"role": "user", "content": utt})
         return messages
 
+    def _prepend_system_prompt(self, messages: MessageList) -> MessageList:
+        if messages[0]["role"] != "system":
+            messages = [{"role": "system", "content": self.system_prompt }] + messages
+        return messages
+
+    def _handle_answer(self, messages: MessageList, response: str,
+                       session_id: str = DEFAULT_SESSION) -> Optional[str]:
+        """
+        Cleans up a complete API response and stores it in memory if enabled.
+        """
+        answer = self._clean_answer(response)
+        if answer is None:
+            return None
+        if self.memory:
+            query = messages[-1]["content"]
+            self.sessions.append(session_id, query, answer)
+        return answer
+
+    @staticmethod
+    def _clean_answer(response: str) -> Optional[str]:
+        answer = post_process_sentence(response)
+        if not answer or not answer.strip("?") or not answer.strip("_"):
+            return None
+        return answer
+
+    def _get_segmenter(self, lang: Optional[str] = None) -> SentenceSegmenter:
+        """
+        Creates a sentence segmenter for a streamed answer, configured from the plugin config.
+        """
+        return SentenceSegmenter(lang=lang or self.config.get("lang"),
+                                 min_length=self.config.get("min_utterance_length", 0),
+                                 max_length=self.config.get("max_utterance_length", 0),
+                                 comma_split_after=self.config.get("comma_split_after", 0),
+                                 abbreviations=self.config.get("abbreviations"),
+                                 eager=self.config.get("eager_split", True))
+
+    def _get_limits(self, max_utterances: Optional[int] = None,
+                    max_chars: Optional[int] = None) -> Tuple[int, int]:
+        """
+        Returns the early stop limits of a streamed answer, from the arguments or the plugin config, 0 means no limit.
+        """
+        return (self.config.get("max_utterances", 0) if max_utterances is None else max_utterances,
+                self.config.get("max_chars", 0) if max_chars is None else max_chars)
+
+    @staticmethod
+    def _over_limit(answer: List[str], utt: str, max_chars: int) -> bool:
+        """ True if speaking utt would exceed max_chars, utterances are never cut and the first one is always spoken """
+        return bool(max_chars and answer and sum(len(a) for a in answer) + len(utt) > max_chars)
+
     # abstract Solver methods
     def continue_chat(self, messages: MessageList,
                       lang: Optional[str],
-                      units: Optional[str] = None) -> Optional[str]:
+                      units: Optional[str] = None,
+                      session_id: str = DEFAULT_SESSION,
+                      timeout: Optional[float] = None,
+                      cancel: Optional[CancellationToken] = None) -> Optional[str]:
         """
         Generates a chat response using the provided message history and updates memory if enabled.
 
@@ -271,74 +813,170 @@ class OpenAIChatCompletionsSolver(ChatMessageSolver):
             messages: List of chat messages with 'role' and 'content' keys.
             lang: Optional language code for the response.
             units: Optional unit system for numerical values.
+            session_id: The conversation the answer is remembered in.
+            timeout: Seconds the whole request may take, defaults to "request_timeout" from config.
+            cancel: Optional token to cancel the request from another thread.
 
         Returns:
             The generated response as a string, or None if no valid response is produced.
+
+        Raises:
+            DeadlineExceeded: If the answer did not arrive in time.
+            RequestCancelled: If the token was cancelled.
         """
-        if messages[0]["role"] != "system":
-            messages = [{"role": "system", "content": self.system_prompt }] + messages
-        response = self._do_api_request(messages)
-        answer = post_process_sentence(response)
-        if not answer or not answer.strip("?") or not answer.strip("_"):
-            return None
-        if self.memory:
-            query = messages[-1]["content"]
-            self.qa_pairs.append((query, answer))
-        return answer
+        messages = self._prepend_system_prompt(messages)
+        response = self._do_api_request(messages, self._cancel_token(cancel, timeout))
+        return self._handle_answer(messages, response, session_id)
 
     def stream_chat_utterances(self, messages: MessageList,
                                lang: Optional[str] = None,
-                               units: Optional[str] = None) -> Iterable[str]:
+                               units: Optional[str] = None,
+                               session_id: str = DEFAULT_SESSION,
+                               cancel: Optional[CancellationToken] = None,
+                               timeout: Optional[float] = None,
+                               max_utterances: Optional[int] = None,
+                               max_chars: Optional[int] = None) -> Iterable[str]:
         """
         Stream utterances for the given chat history as they become available.
 
+        The stream ends early, closing the connection so the server stops generating, when the
+        token is cancelled, the timeout passes or the utterance limits are reached.
+
         Args:
             messages: The chat messages.
             lang (Optional[str]): Optional language code. Defaults to None.
             units (Optional[str]): Optional units for the query. Defaults to None.
+            session_id (str): The conversation to use for memory. Defaults to "default".
+            cancel (Optional[CancellationToken]): Token to stop the stream from another thread, eg. when the user says "stop".
+            timeout (Optional[float]): Seconds the whole answer may take, defaults to "request_timeout" from config.
+            max_utterances (Optional[int]): Stop after this many utterances, defaults to "max_utterances" from config.
+            max_chars (Optional[int]): Stop before the utterance that would exceed this many characters,
+                defaults to "max_chars" from config.
 
         Returns:
             Iterable[str]: An iterable of utterances.
         """
-        if messages[0]["role"] != "system":
-            messages = [{"role": "system", "content": self.system_prompt }] + messages
-        answer = ""
-        query = messages[-1]["content"]
-        if self.memory:
-            self.qa_pairs.append((query, answer))
-
-        for chunk in self._do_streaming_api_request(messages):
-            answer += chunk
-            if any(chunk.endswith(p) for p in [".", "!", "?", "\n", ":"]):
-                if len(chunk) >= 2 and chunk[-2].isdigit() and chunk[-1] == ".":
-                    continue  # dont split numbers
-                if answer.strip():
-                    if self.memory:
-                        full_ans = f"{self.qa_pairs[-1][-1]}\n{answer}".strip()
-                        self.qa_pairs[-1] = (query, full_ans)
-                    yield post_process_sentence(answer)
-                answer = ""
+        messages = self._prepend_system_prompt(messages)
+        stream = self._do_streaming_api_request(messages, self._cancel_token(cancel, timeout))
+        yield from self._stream_answer(stream, messages[-1]["content"], lang, session_id,
+                                       max_utterances, max_chars)
+
+    def _stream_answer(self, stream: Iterator[str], query: str,
+                       lang: Optional[str] = None,
+                       session_id: str = DEFAULT_SESSION,
+                       max_utterances: Optional[int] = None,
+                       max_chars: Optional[int] = None) -> Iterable[str]:
+        """
+        Splits a stream of text chunks into utterances, stopping at the utterance limits.
+        """
+        splitter = self._get_splitter(lang, max_utterances, max_chars)
+        failed = False
+        try:
+            for chunk in stream:
+                yield from splitter.feed(chunk)
+                if splitter.stopped:
+                    return
+            yield from splitter.flush()
+        except StreamInterrupted as e:
+            failed = self._interrupted(e, splitter)
+        finally:
+            stream.close()  # releases the connection right away when stopping early
+            if not failed:
+                self._remember_spoken(session_id, query, splitter.answer)
+
+    def _get_splitter(self, lang: Optional[str] = None,
+                      max_utterances: Optional[int] = None,
+                      max_chars: Optional[int] = None) -> _AnswerSplitter:
+        return _AnswerSplitter(self._get_segmenter(lang), *self._get_limits(max_utterances, max_chars))
+
+    @staticmethod
+    def _interrupted(error: StreamInterrupted, splitter: _AnswerSplitter) -> bool:
+        """
+        Handles a stream that stopped partway, the unfinished sentence is dropped instead of spoken.
+
+        Returns:
+            True if the answer failed and must not be remembered, a cancelled answer keeps what was spoken.
+        """
+        if isinstance(error.__cause__, RequestCancelled):
+            return False
+        LOG.error(f"answer cut short after {len(splitter.answer)} utterances, dropping the unfinished one: {error}")
+        return True
+
+    def _remember_spoken(self, session_id: str, query: str, answer: List[str]):
+        # also runs if the caller stops listening halfway, memory keeps what was spoken
+        if self.memory and answer:
+            self.sessions.append(session_id, query, post_process_sentence(" ".join(answer)))
 
     def stream_utterances(self, query: str,
                           lang: Optional[str] = None,
-                          units: Optional[str] = None) -> Iterable[str]:
+                          units: Optional[str] = None,
+                          session_id: str = DEFAULT_SESSION,
+                          cancel: Optional[CancellationToken] = None,
+                          timeout: Optional[float] = None,
+                          max_utterances: Optional[int] = None,
+                          max_chars: Optional[int] = None) -> Iterable[str]:
         """
         Stream utterances for the given query as they become available.
 
+        If a speculative request was started with prefetch for a matching query, its answer is used.
+
         Args:
             query (str): The query text.
             lang (Optional[str]): Optional language code. Defaults to None.
             units (Optional[str]): Optional units for the query. Defaults to None.
+            session_id (str): The conversation to use for memory. Defaults to "default".
+            cancel (Optional[CancellationToken]): Token to stop the stream from another thread.
+            timeout (Optional[float]): Seconds the whole answer may take, defaults to "request_timeout" from config.
+            max_utterances (Optional[int]): Stop after this many utterances, defaults to "max_utterances" from config.
+            max_chars (Optional[int]): Stop before exceeding this many characters, defaults to "max_chars" from config.
 
         Returns:
             Iterable[str]: An iterable of utterances.
         """
-        messages = self.get_messages(query)
-        yield from self.stream_chat_utterances(messages, lang, units)
+        messages = self.get_messages(query, session_id=session_id)
+        speculation = None
+        if self.prefetcher is not None:
+            speculation = self.prefetcher.claim(session_id, query, self._prepend_system_prompt(messages))
+        if speculation is None:
+            yield from self.stream_chat_utterances(messages, lang, units, session_id,
+                                                   cancel, timeout, max_utterances, max_chars)
+            return
+        yield from self._stream_answer(speculation.stream(self._cancel_token(cancel, timeout)), query,
+                                       lang, session_id, max_utterances, max_chars)
+
+    def prefetch(self, partial: str, session_id: str = DEFAULT_SESSION) -> bool:
+        """
+        Starts answering an interim transcript while the user is still speaking.
+
+        Call it with every partial transcript of the speech recognizer, then stream_utterances with the
+        final one. If the final query matches the last partial, the answer that is already streaming is
+        used, otherwise the speculative request is cancelled and a regular one is made.
+
+        Args:
+            partial: The interim transcript.
+            session_id: The conversation, at most one speculative request runs per session.
+
+        Returns:
+            True if a speculative request for this transcript is in flight.
+        """
+        if self.prefetcher is None:
+            return False
+        messages = self._prepend_system_prompt(self.get_messages(partial, session_id=session_id))
+        return self.prefetcher.start(session_id, partial, messages, self._do_streaming_api_request)
+
+    def cancel_prefetch(self, session_id: str = DEFAULT_SESSION):
+        """
+        Cancels the speculative request of a session, eg. when the user stopped speaking without a query.
+        """
+        if self.prefetcher is not None:
+            self.prefetcher.discard(session_id)
 
     def get_spoken_answer(self, query: str,
                           lang: Optional[str] = None,
-                          units: Optional[str] = None) -> Optional[str]:
+                          units: Optional[str] = None,
+                          session_id: str = DEFAULT_SESSION,
+                          timeout: Optional[float] = None,
+                          cancel: Optional[CancellationToken] = None) -> Optional[str]:
         """
         Obtain the spoken answer for a given query.
 
@@ -346,10 +984,233 @@ class OpenAIChatCompletionsSolver(ChatMessageSolver):
             query (str): The query text.
             lang (Optional[str]): Optional language code. Defaults to None.
             units (Optional[str]): Optional units for the query. Defaults to None.
+            session_id (str): The conversation to use for memory. Defaults to "default".
+            timeout (Optional[float]): Seconds the whole request may take, defaults to "request_timeout" from config.
+            cancel (Optional[CancellationToken]): Token to cancel the request from another thread.
 
         Returns:
             str: The spoken answer as a text response.
         """
-        messages = self.get_messages(query)
+        messages = self.get_messages(query, session_id=session_id)
         # just for api compat since it's a subclass, shouldn't be directly used
-        return self.continue_chat(messages=messages, lang=lang, units=units)
+        return self.continue_chat(messages=messages, lang=lang, units=units, session_id=session_id,
+                                  timeout=timeout, cancel=cancel)
+
+    # several candidate answers per request, eg. to evaluate personas or rerank answers
+    def chat_completions(self, messages: MessageList,
+                         n: Optional[int] = None,
+                         timeout: Optional[float] = None,
+                         cancel: Optional[CancellationToken] = None) -> Completion:
+        """
+        Generates several candidate answers for a chat in a single request.
+
+        The prompt tokens are only paid once, unlike sending the chat n times. Memory is not updated
+        and the response cache is not used, candidates are meant to be sampled.
+
+        Args:
+            messages: List of chat messages, the system prompt is prepended if missing.
+            n: Number of candidates, defaults to "n" from config.
+            timeout: Seconds the whole request may take, defaults to "request_timeout" from config.
+            cancel: Optional token to cancel the request from another thread.
+
+        Returns:
+            Every choice with its finish reason, and the token usage of the request.
+        """
+        payload = self._get_payload(self._prepend_system_prompt(messages), n=n or self.n)
+        return Completion.from_response(self._post(payload, self._cancel_token(cancel, timeout)))
+
+    def get_completions(self, query: str,
+                        n: Optional[int] = None,
+                        session_id: str = DEFAULT_SESSION,
+                        timeout: Optional[float] = None,
+                        cancel: Optional[CancellationToken] = None) -> Completion:
+        """
+        Generates several candidate answers for a query in a single request, see chat_completions.
+
+        Args:
+            query (str): The query text.
+            n (Optional[int]): Number of candidates, defaults to "n" from config.
+            session_id (str): The conversation whose history is sent, it is not updated.
+            timeout (Optional[float]): Seconds the whole request may take, defaults to "request_timeout" from config.
+            cancel (Optional[CancellationToken]): Token to cancel the request from another thread.
+
+        Returns:
+            Completion: Every choice with its finish reason, and the token usage of the request.
+        """
+        return self.chat_completions(self.get_messages(query, session_id=session_id), n=n,
+                                     timeout=timeout, cancel=cancel)
+
+    # batch methods, items are independent of each other and of memory
+    def continue_chats(self, chats: List[MessageList],
+                       lang: Optional[str] = None,
+                       units: Optional[str] = None,
+                       max_workers: Optional[int] = None,
+                       progress: Optional[ProgressCallback] = None) -> List[BatchResult]:
+        """
+        Generates chat responses for many conversations concurrently.
+
+        Conversations without a system prompt get the configured one prepended. Memory is neither
+        read nor updated, and a failing conversation does not affect the others.
+
+        Args:
+            chats: One list of chat messages per conversation.
+            lang: Optional language code for the responses.
+            units: Optional unit system for numerical values.
+            max_workers: Maximum concurrent requests, defaults to "batch_workers" from config.
+            progress: Called as progress(done, total, result) after every answer.
+
+        Returns:
+            One BatchResult per conversation, in order, with the answer or the error and the latency.
+        """
+        return run_batch(
+            lambda messages: self._clean_answer(self._do_api_request(self._prepend_system_prompt(messages),
+                                                                     priority=PRIORITY_BATCH)),
+            chats,
+            max_workers=max_workers or self.config.get("batch_workers", 4),
+            progress=progress)
+
+    def get_spoken_answers(self, queries: List[str],
+                           lang: Optional[str] = None,
+                           units: Optional[str] = None,
+                           max_workers: Optional[int] = None,
+                           progress: Optional[ProgressCallback] = None) -> List[BatchResult]:
+        """
+        Obtain the spoken answers for many independent queries concurrently.
+
+        Each query is answered with only the system prompt as context, memory is neither read nor updated.
+
+        Args:
+            queries (List[str]): The query texts.
+            lang (Optional[str]): Optional language code. Defaults to None.
+            units (Optional[str]): Optional units for the queries. Defaults to None.
+            max_workers (Optional[int]): Maximum concurrent requests, defaults to "batch_workers" from config.
+            progress (Optional[ProgressCallback]): Called as progress(done, total, result) after every answer.
+
+        Returns:
+            List[BatchResult]: One result per query, in order, with the answer or the error and the latency.
+        """
+        return self.continue_chats([[{"role": "user", "content": q}] for q in queries],
+                                   lang, units, max_workers=max_workers, progress=progress)
+
+    # asyncio counterparts, a single event loop can drive many concurrent requests
+    async def async_continue_chat(self, messages: MessageList,
+                                  lang: Optional[str] = None,
+                                  units: Optional[str] = None,
+                                  session_id: str = DEFAULT_SESSION,
+                                  timeout: Optional[float] = None,
+                                  cancel: Optional[CancellationToken] = None) -> Optional[str]:
+        """
+        Non-blocking version of continue_chat.
+
+        Args:
+            messages: List of chat messages with 'role' and 'content' keys.
+            lang: Optional language code for the response.
+            units: Optional unit system for numerical values.
+            session_id: The conversation the answer is remembered in.
+            timeout: Seconds the whole request may take, defaults to "request_timeout" from config.
+            cancel: Optional token to cancel the request, cancelling the asyncio task works too.
+
+        Returns:
+            The generated response as a string, or None if no valid response is produced.
+        """
+        messages = self._prepend_system_prompt(messages)
+        response = await self._async_do_api_request(messages, self._cancel_token(cancel, timeout))
+        return self._handle_answer(messages, response, session_id)
+
+    async def async_stream_chat_utterances(self, messages: MessageList,
+                                           lang: Optional[str] = None,
+                                           units: Optional[str] = None,
+                                           session_id: str = DEFAULT_SESSION,
+                                           cancel: Optional[CancellationToken] = None,
+                                           timeout: Optional[float] = None,
+                                           max_utterances: Optional[int] = None,
+                                           max_chars: Optional[int] = None) -> AsyncIterable[str]:
+        """
+        Non-blocking version of stream_chat_utterances.
+
+        Args:
+            messages: The chat messages.
+            lang (Optional[str]): Optional language code. Defaults to None.
+            units (Optional[str]): Optional units for the query. Defaults to None.
+            session_id (str): The conversation to use for memory. Defaults to "default".
+            cancel (Optional[CancellationToken]): Token to stop the stream, cancelling the asyncio task works too.
+            timeout (Optional[float]): Seconds the whole answer may take, defaults to "request_timeout" from config.
+            max_utterances (Optional[int]): Stop after this many utterances, defaults to "max_utterances" from config.
+            max_chars (Optional[int]): Stop before exceeding this many characters, defaults to "max_chars" from config.
+
+        Returns:
+            AsyncIterable[str]: An async iterable of utterances.
+        """
+        messages = self._prepend_system_prompt(messages)
+        splitter = self._get_splitter(lang, max_utterances, max_chars)
+        stream = self._async_do_streaming_api_request(messages, self._cancel_token(cancel, timeout))
+        failed = False
+        try:
+            async for chunk in stream:
+                for utt in splitter.feed(chunk):
+                    yield utt
+                if splitter.stopped:
+                    return
+            for utt in splitter.flush():
+                yield utt
+        except StreamInterrupted as e:
+            failed = self._interrupted(e, splitter)
+        finally:
+            await stream.aclose()  # releases the connection right away when stopping early
+            if not failed:
+                self._remember_spoken(session_id, messages[-1]["content"], splitter.answer)
+
+    async def async_stream_utterances(self, query: str,
+                                      lang: Optional[str] = None,
+                                      units: Optional[str] = None,
+                                      session_id: str = DEFAULT_SESSION,
+                                      cancel: Optional[CancellationToken] = None,
+                                      timeout: Optional[float] = None,
+                                      max_utterances: Optional[int] = None,
+                                      max_chars: Optional[int] = None) -> AsyncIterable[str]:
+        """
+        Non-blocking version of stream_utterances.
+        """
+        messages = self.get_messages(query, session_id=session_id)
+        async for utt in self.async_stream_chat_utterances(messages, lang, units, session_id,
+                                                           cancel, timeout, max_utterances, max_chars):
+            yield utt
+
+    async def async_get_spoken_answer(self, query: str,
+                                      lang: Optional[str] = None,
+                                      units: Optional[str] = None,
+                                      session_id: str = DEFAULT_SESSION,
+                                      timeout: Optional[float] = None,
+                                      cancel: Optional[CancellationToken] = None) -> Optional[str]:
+        """
+        Non-blocking version of get_spoken_answer.
+
+        Args:
+            query (str): The query text.
+            lang (Optional[str]): Optional language code. Defaults to None.
+            units (Optional[str]): Optional units for the query. Defaults to None.
+            session_id (str): The conversation to use for memory. Defaults to "default".
+            timeout (Optional[float]): Seconds the whole request may take, defaults to "request_timeout" from config.
+            cancel (Optional[CancellationToken]): Token to cancel the request.
+
+        Returns:
+            str: The spoken answer as a text response.
+        """
+        messages = self.get_messages(query, session_id=session_id)
+        return await self.async_continue_chat(messages=messages, lang=lang, units=units, session_id=session_id,
+                                              timeout=timeout, cancel=cancel)
+
+
+class OpenAIPersonaSolver(OpenAIChatCompletionsSolver):
+    def __init__(self, *args, **kwargs):
+           """
+           Initializes the solver and issues a deprecation warning.
+           
+           A DeprecationWarning is raised advising to use OpenAIChatCompletionsSolver instead.
+           """
+           warnings.warn(
+              "use OpenAIChatCompletionsSolver instead",
+              DeprecationWarning,
+              stacklevel=2,
+           )
+           super().__init__(*args, **kwargs)
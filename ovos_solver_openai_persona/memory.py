@@ -0,0 +1,276 @@
+import time
+from collections import OrderedDict, deque
+from importlib.util import find_spec
+from threading import RLock
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from ovos_utils.log import LOG
+
+MessageList = List[Dict[str, str]]  # for typing
+Tokenizer = Callable[[str], int]  # returns the number of tokens in a string
+
+DEFAULT_SESSION = "default"
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token count heuristic, OpenAI models average ~4 characters per token in english.
+    """
+    return len(text) // 4 + 1
+
+
+def get_tokenizer(name: Optional[str] = None, model: Optional[str] = None) -> Tokenizer:
+    """
+    Returns a token counting function.
+
+    Args:
+        name: "tiktoken" to count tokens exactly with the optional tiktoken package,
+            anything else uses the estimate_tokens heuristic.
+        model: The model name, used to select the tiktoken encoding.
+    """
+    if name == "tiktoken":
+        if find_spec("tiktoken") is not None:
+            return _TiktokenCounter(model or "gpt-4o-mini")
+        LOG.warning("tiktoken not installed, falling back to token count estimation")
+    return estimate_tokens
+
+
+class _TiktokenCounter:
+    """ counts tokens with tiktoken, the encoding is only loaded when the first text is counted """
+
+    def __init__(self, model: str):
+        self.model = model
+        self._enc = None
+
+    def __call__(self, text: str) -> int:
+        if self._enc is None:
+            import tiktoken
+            try:
+                self._enc = tiktoken.encoding_for_model(self.model)
+            except KeyError:  # not an OpenAI model
+                self._enc = tiktoken.get_encoding("o200k_base")
+        return len(self._enc.encode(text))
+
+
+class ChatMemory:
+    """
+    Bounded store of past question/answer exchanges.
+
+    Holds at most max_utts exchanges and, if max_tokens is set, at most that many tokens,
+    the oldest exchanges are evicted first. The rendered chat history is cached, new exchanges are
+    appended to it and it is only rendered again after an eviction.
+
+    History only grows at the end until something is evicted, so consecutive requests share their
+    prompt prefix and hit backend prompt caches. Evicting several exchanges at once keeps that
+    prefix unchanged for more turns, at the cost of a shorter history right after an eviction.
+    """
+
+    def __init__(self, max_utts: int = 3,
+                 max_tokens: int = 0,
+                 tokenizer: Optional[Tokenizer] = None,
+                 evict_batch: int = 1):
+        """
+        Args:
+            max_utts: Maximum number of question/answer exchanges to keep.
+            max_tokens: Maximum number of tokens to keep across all exchanges, 0 to disable.
+            tokenizer: Function returning the number of tokens in a string, defaults to estimate_tokens.
+            evict_batch: Number of oldest exchanges evicted at once when memory is full.
+        """
+        self.max_tokens = max_tokens
+        self.tokenizer = tokenizer or estimate_tokens
+        self.evict_batch = max(1, evict_batch)
+        self._pairs: deque = deque(maxlen=max(0, max_utts))  # (query, answer, tokens)
+        self._tokens = 0
+        self._history: Optional[Tuple[str, MessageList]] = None  # (system_prompt, messages)
+
+    @property
+    def max_utts(self) -> int:
+        return self._pairs.maxlen
+
+    @property
+    def tokens(self) -> int:
+        """ number of tokens currently held in memory """
+        return self._tokens
+
+    def __len__(self) -> int:
+        return len(self._pairs)
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        return ((q, a) for q, a, _ in self._pairs)
+
+    def append(self, query: str, answer: str):
+        """
+        Stores a question/answer exchange, evicting the oldest ones if over the size or token budget.
+        """
+        if not self._pairs.maxlen:
+            return
+        tokens = self.tokenizer(query) + self.tokenizer(answer)
+        if len(self._pairs) == self._pairs.maxlen:
+            self._evict(self.evict_batch)
+        self._pairs.append((query, answer, tokens))
+        self._tokens += tokens
+        if self.max_tokens and self._tokens > self.max_tokens:
+            self._evict(self.evict_batch)
+            while self._pairs and self._tokens > self.max_tokens:
+                self._tokens -= self._pairs.popleft()[2]
+                self._history = None
+        if self._history is not None:
+            self._history[1].append({"role": "user", "content": query})
+            self._history[1].append({"role": "assistant", "content": answer})
+
+    def _evict(self, n: int):
+        for _ in range(min(n, len(self._pairs))):
+            self._tokens -= self._pairs.popleft()[2]
+            self._history = None
+
+    def clear(self):
+        self._pairs.clear()
+        self._tokens = 0
+        self._history = None
+
+    def get_chat_history(self, system_prompt: str) -> MessageList:
+        """
+        Renders the system prompt and stored exchanges as a list of chat messages.
+
+        The system prompt always comes first and exchanges are in the order they happened,
+        the same memory always renders to the same messages.
+
+        NOTE: every call copies every message, O(history). Solvers translate messages in place
+        (ovos-plugin-manager auto_translate), so a shared message would leak into later requests.
+        Only the rendering is cached, it is not rebuilt on every turn.
+
+        Returns:
+            A new list of new messages, safe for the caller to modify.
+        """
+        if self._history is None or self._history[0] != system_prompt:
+            messages = [{"role": "system", "content": system_prompt}]
+            for q, a, _ in self._pairs:
+                messages.append({"role": "user", "content": q})
+                messages.append({"role": "assistant", "content": a})
+            self._history = (system_prompt, messages)
+        # copies, a caller translating messages in place must not change the prefix of the next request
+        return [dict(m) for m in self._history[1]]
+
+
+class SessionMemory:
+    """
+    Thread-safe collection of ChatMemory objects keyed by session id.
+
+    Lets a single solver serve many concurrent conversations without their histories mixing.
+    Idle sessions expire after session_ttl seconds, the least recently used sessions are
+    evicted when there are more than max_sessions or more than max_total_tokens in memory.
+    """
+
+    def __init__(self, max_utts: int = 3,
+                 max_tokens: int = 0,
+                 tokenizer: Optional[Tokenizer] = None,
+                 max_sessions: int = 1000,
+                 session_ttl: float = 0,
+                 max_total_tokens: int = 0,
+                 evict_batch: int = 1):
+        """
+        Args:
+            max_utts: Maximum number of question/answer exchanges to keep per session.
+            max_tokens: Maximum number of tokens to keep per session, 0 to disable.
+            tokenizer: Function returning the number of tokens in a string, defaults to estimate_tokens.
+            max_sessions: Maximum number of sessions to keep, 0 to disable.
+            session_ttl: Seconds after which an idle session is forgotten, 0 to disable.
+            max_total_tokens: Maximum number of tokens to keep across all sessions, 0 to disable.
+            evict_batch: Number of oldest exchanges evicted at once when a session is full.
+        """
+        self.max_utts = max_utts
+        self.max_tokens = max_tokens
+        self.tokenizer = tokenizer or estimate_tokens
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.max_total_tokens = max_total_tokens
+        self.evict_batch = evict_batch
+        self._sessions: "OrderedDict[str, Tuple[ChatMemory, float]]" = OrderedDict()  # LRU first
+        self._tokens = 0
+        self._lock = RLock()
+
+    @property
+    def tokens(self) -> int:
+        """ number of tokens currently held across all sessions """
+        return self._tokens
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def _get(self, session_id: str, create: bool = True) -> Optional[ChatMemory]:
+        now = time.monotonic()
+        if self.session_ttl:
+            # sessions are ordered by last access, expired ones are at the front
+            while self._sessions:
+                sid, (mem, last_used) = next(iter(self._sessions.items()))
+                if now - last_used < self.session_ttl:
+                    break
+                self._evict(sid)
+        if session_id in self._sessions:
+            mem = self._sessions.pop(session_id)[0]
+        elif create:
+            mem = ChatMemory(self.max_utts, self.max_tokens, self.tokenizer, self.evict_batch)
+        else:
+            return None
+        self._sessions[session_id] = (mem, now)
+        return mem
+
+    def _evict(self, session_id: str):
+        mem, _ = self._sessions.pop(session_id)
+        self._tokens -= mem.tokens
+
+    def get(self, session_id: str = DEFAULT_SESSION) -> ChatMemory:
+        """
+        Returns the memory of a session, creating it if needed.
+
+        NOTE: the returned object is not thread-safe, prefer the SessionMemory methods
+        """
+        with self._lock:
+            return self._get(session_id)
+
+    def append(self, session_id: str, query: str, answer: str):
+        """
+        Stores a question/answer exchange in a session, evicting idle sessions if over budget.
+        """
+        with self._lock:
+            mem = self._get(session_id)
+            before = mem.tokens
+            mem.append(query, answer)
+            self._tokens += mem.tokens - before
+            while self.max_sessions and len(self._sessions) > self.max_sessions:
+                self._evict(next(iter(self._sessions)))
+            while self.max_total_tokens and self._tokens > self.max_total_tokens \
+                    and len(self._sessions) > 1:
+                self._evict(next(iter(self._sessions)))
+
+    def qa_pairs(self, session_id: str = DEFAULT_SESSION) -> List[Tuple[str, str]]:
+        """
+        Returns the stored question/answer exchanges of a session, oldest first, without creating it.
+        """
+        with self._lock:
+            mem = self._get(session_id, create=False)
+            return [] if mem is None else list(mem)
+
+    def get_chat_history(self, session_id: str, system_prompt: str) -> MessageList:
+        """
+        Renders the system prompt and stored exchanges of a session as a list of chat messages.
+        """
+        with self._lock:
+            mem = self._get(session_id, create=False)
+            if mem is None:
+                return [{"role": "system", "content": system_prompt}]
+            return mem.get_chat_history(system_prompt)
+
+    def clear(self, session_id: Optional[str] = None):
+        """
+        Forgets a session, or all sessions if session_id is None.
+        """
+        with self._lock:
+            if session_id is None:
+                self._sessions.clear()
+                self._tokens = 0
+            elif session_id in self._sessions:
+                self._evict(session_id)
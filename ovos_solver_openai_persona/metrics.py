@@ -0,0 +1,325 @@
+import json
+import time
+from bisect import bisect_left
+from threading import Lock, Thread
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Tuple
+
+from ovos_utils.log import LOG
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # seconds
+RATE_BUCKETS = (1, 5, 10, 20, 35, 50, 75, 100, 200, 500, 1000)  # tokens per second
+
+
+class RequestMetrics:
+    """
+    Timings and token counts of a single LLM request, filled in while the request runs.
+
+    All times are seconds since the request started, None if that point was never reached.
+    """
+    __slots__ = ("solver", "endpoint", "stream", "start", "connect", "first_byte", "first_token",
+                 "duration", "chunks", "prompt_tokens", "completion_tokens", "cached_tokens",
+                 "cache_hit", "error")
+
+    def __init__(self, solver: str, stream: bool = False):
+        self.solver = solver  # label of the plugin that made the request, eg. the solver class name
+        self.endpoint: Optional[str] = None
+        self.stream = stream
+        self.start = time.monotonic()
+        self.connect: Optional[float] = None  # response headers received
+        self.first_byte: Optional[float] = None
+        self.first_token: Optional[float] = None  # first text chunk, streaming only
+        self.duration: Optional[float] = None
+        self.chunks = 0  # streamed text chunks, about one token each
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self.cached_tokens: Optional[int] = None
+        self.cache_hit = False  # answered from the response cache, no request was sent
+        self.error: Optional[str] = None
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        """ generation speed, excluding the time to first token """
+        tokens = self.completion_tokens if self.completion_tokens is not None else self.chunks
+        start = self.first_token if self.first_token is not None else self.first_byte
+        if not tokens or self.duration is None or start is None or self.duration <= start:
+            return None
+        return tokens / (self.duration - start)
+
+    def mark_connected(self, endpoint: str):
+        if self.connect is None:
+            self.connect = time.monotonic() - self.start
+            self.endpoint = endpoint
+
+    def mark_first_byte(self):
+        if self.first_byte is None:
+            self.first_byte = time.monotonic() - self.start
+
+    def add_chunks(self, n: int):
+        if n:
+            if self.first_token is None:
+                self.first_token = time.monotonic() - self.start
+            self.chunks += n
+
+    def set_usage(self, usage: Optional[Dict]):
+        if not usage:
+            return
+        self.prompt_tokens = usage.get("prompt_tokens")
+        self.completion_tokens = usage.get("completion_tokens")
+        details = usage.get("prompt_tokens_details") or {}
+        # prompt tokens served from the backend prefix cache, DeepSeek reports them as prompt_cache_hit_tokens
+        self.cached_tokens = details.get("cached_tokens", usage.get("prompt_cache_hit_tokens"))
+
+    def finish(self, error: Optional[BaseException] = None):
+        """ records the end of the request and hands the metrics to all registered hooks """
+        if self.duration is not None:
+            return
+        self.duration = time.monotonic() - self.start
+        if error is not None:
+            self.error = type(error).__name__
+        emit(self)
+
+    def __enter__(self) -> "RequestMetrics":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # a consumer that stops reading a stream early is not an error
+        self.finish(None if exc_type is GeneratorExit else exc)
+
+    def as_dict(self) -> Dict:
+        data = {k: getattr(self, k) for k in self.__slots__ if k != "start"}
+        data["tokens_per_second"] = self.tokens_per_second
+        return data
+
+
+MetricsHook = Callable[[RequestMetrics], None]
+_HOOKS: List[MetricsHook] = []
+
+
+def add_metrics_hook(hook: MetricsHook):
+    """
+    Registers a function called with the RequestMetrics of every finished LLM request.
+    """
+    if hook not in _HOOKS:
+        _HOOKS.append(hook)
+
+
+def remove_metrics_hook(hook: MetricsHook):
+    if hook in _HOOKS:
+        _HOOKS.remove(hook)
+
+
+def start_request(solver: str, stream: bool = False) -> Optional[RequestMetrics]:
+    """
+    Starts tracking a request.
+
+    Returns:
+        None if no hook is registered, so instrumentation costs a single check when metrics are disabled.
+    """
+    if not _HOOKS:
+        return None
+    return RequestMetrics(solver, stream)
+
+
+def record_cache_hit(solver: str, stream: bool = False):
+    """ records a request answered from the response cache """
+    if _HOOKS:
+        m = RequestMetrics(solver, stream)
+        m.cache_hit = True
+        m.finish()
+
+
+def log_metrics(m: RequestMetrics):
+    """ metrics hook writing a one line summary of every request to the debug log """
+    def ms(t: Optional[float]) -> str:
+        return "-" if t is None else f"{t * 1000:.0f}ms"
+
+    tps = m.tokens_per_second
+    LOG.debug(f"{m.solver} {'stream ' if m.stream else ''}request to {m.endpoint or 'cache'}: "
+              f"connect={ms(m.connect)} first_token={ms(m.first_token if m.stream else m.first_byte)} "
+              f"duration={ms(m.duration)} tokens={m.prompt_tokens}+{m.completion_tokens or m.chunks} "
+              f"{'' if m.cached_tokens is None else f'cached={m.cached_tokens} '}"
+              f"{'' if tps is None else f'{tps:.1f} tokens/s '}error={m.error}")
+
+
+def emit(metrics: RequestMetrics):
+    for hook in list(_HOOKS):
+        try:
+            hook(metrics)
+        except Exception as e:
+            LOG.error(f"metrics hook failed: {e}")
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed buckets, same semantics as a Prometheus histogram.
+    """
+
+    def __init__(self, buckets: Iterable[float]):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """ upper bound of the bucket holding the q quantile, None if empty """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def as_dict(self) -> Dict:
+        return {"count": self.count,
+                "sum": round(self.sum, 6),
+                "p50": self.quantile(0.5),
+                "p90": self.quantile(0.9),
+                "p99": self.quantile(0.99),
+                "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts))}
+
+
+class MetricsRegistry:
+    """
+    Metrics hook aggregating requests into histograms and counters per solver.
+    """
+    HISTOGRAMS = {"connect_seconds": ("connect", LATENCY_BUCKETS),
+                  "first_byte_seconds": ("first_byte", LATENCY_BUCKETS),
+                  "first_token_seconds": ("first_token", LATENCY_BUCKETS),
+                  "duration_seconds": ("duration", LATENCY_BUCKETS),
+                  "tokens_per_second": ("tokens_per_second", RATE_BUCKETS)}
+
+    def __init__(self):
+        self._lock = Lock()
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._counters: Dict[Tuple[str, str], float] = {}
+
+    def __call__(self, m: RequestMetrics):
+        with self._lock:
+            for name, (attr, buckets) in self.HISTOGRAMS.items():
+                value = getattr(m, attr)
+                if value is not None and not m.cache_hit:  # cache hits would hide real latencies
+                    key = (m.solver, name)
+                    if key not in self._histograms:
+                        self._histograms[key] = Histogram(buckets)
+                    self._histograms[key].observe(value)
+            self._inc(m.solver, "requests_total")
+            if m.error:
+                self._inc(m.solver, "errors_total")
+            if m.cache_hit:
+                self._inc(m.solver, "cache_hits_total")
+            for name in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+                value = getattr(m, name)
+                if value:
+                    self._inc(m.solver, name + "_total", value)
+
+    def _inc(self, solver: str, name: str, value: float = 1):
+        key = (solver, name)
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def to_json(self) -> Dict:
+        """
+        Returns all metrics as {solver: {metric: value or histogram summary}}.
+        """
+        data: Dict[str, Dict] = {}
+        with self._lock:
+            for (solver, name), value in sorted(self._counters.items()):
+                data.setdefault(solver, {})[name] = value
+            for (solver, name), hist in sorted(self._histograms.items()):
+                data.setdefault(solver, {})[name] = hist.as_dict()
+        return data
+
+    def to_prometheus(self, prefix: str = "ovos_openai") -> str:
+        """
+        Returns all metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            for name in sorted({n for _, n in self._counters}):
+                lines.append(f"# TYPE {prefix}_{name} counter")
+                for (solver, n), value in sorted(self._counters.items()):
+                    if n == name:
+                        lines.append(f'{prefix}_{name}{{solver="{solver}"}} {value}')
+            for name in sorted({n for _, n in self._histograms}):
+                lines.append(f"# TYPE {prefix}_{name} histogram")
+                for (solver, n), hist in sorted(self._histograms.items()):
+                    if n != name:
+                        continue
+                    total = 0
+                    for bound, count in zip([str(b) for b in hist.buckets] + ["+Inf"], hist.counts):
+                        total += count
+                        lines.append(f'{prefix}_{name}_bucket{{solver="{solver}",le="{bound}"}} {total}')
+                    lines.append(f'{prefix}_{name}_sum{{solver="{solver}"}} {hist.sum}')
+                    lines.append(f'{prefix}_{name}_count{{solver="{solver}"}} {hist.count}')
+        return "\n".join(lines) + "\n"
+
+
+# default registry, enabled by the "metrics" config option
+METRICS = MetricsRegistry()
+_SERVERS: Dict[int, "ThreadingHTTPServer"] = {}
+
+
+def serve_metrics(port: int, registry: MetricsRegistry = METRICS, host: str = "127.0.0.1") -> "ThreadingHTTPServer":
+    """
+    Exposes a registry over HTTP in a background thread, /metrics in Prometheus format and /metrics.json as JSON.
+    """
+    if port in _SERVERS:
+        return _SERVERS[port]
+    # only imported when the exporter is enabled, it is slow to import on small devices
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, ctype = registry.to_prometheus().encode(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, ctype = json.dumps(registry.to_json()).encode(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    _SERVERS[port] = server
+    LOG.info(f"serving LLM metrics on http://{host}:{server.server_port}/metrics")
+    return server
+
+
+def setup_metrics(config: Dict):
+    """
+    Enables the default registry and exporter from the "metrics" section of a plugin config.
+    """
+    cfg = config.get("metrics") or {}
+    if not cfg.get("enabled", False):
+        return
+    add_metrics_hook(METRICS)
+    if cfg.get("log"):
+        add_metrics_hook(log_metrics)
+    if cfg.get("port"):
+        try:
+            serve_metrics(cfg["port"], host=cfg.get("host", "127.0.0.1"))
+        except OSError as e:
+            LOG.error(f"failed to start metrics exporter on port {cfg['port']}: {e}")
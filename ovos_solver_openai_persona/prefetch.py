@@ -0,0 +1,249 @@
+import re
+import time
+from difflib import SequenceMatcher
+from threading import Condition, Lock, Thread
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from ovos_utils.log import LOG
+
+from ovos_solver_openai_persona.cancellation import CancellationToken
+from ovos_solver_openai_persona.memory import MessageList
+
+# starts a streaming request for the given messages, stopped by the given token
+StreamFactory = Callable[[MessageList, CancellationToken], Iterable[str]]
+
+DEFAULT_FILLERS = ("um", "uh", "uhm", "er", "erm", "hmm")
+
+
+def normalize_transcript(text: str, fillers: Iterable[str] = DEFAULT_FILLERS) -> List[str]:
+    """ lowercase words of a transcript without punctuation and filler words """
+    fillers = set(fillers)
+    return [w for w in re.findall(r"[\w']+", text.lower()) if w not in fillers]
+
+
+class PrefetchStats:
+    """ counters of speculative requests, a hit is an answer that was already streaming when the query was final """
+
+    def __init__(self):
+        self.started = 0
+        self.hits = 0
+        self.misses = 0  # the final query did not match, or the speculation failed
+        self.discarded = 0  # replaced by a newer transcript before the query was final, or never claimed
+        self.saved_ms = 0.0  # total head start of the hits
+        self._lock = Lock()
+
+    def inc(self, name: str, value: float = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    @property
+    def hit_rate(self) -> Optional[float]:
+        claimed = self.hits + self.misses
+        return self.hits / claimed if claimed else None
+
+    def as_dict(self) -> Dict:
+        return {"started": self.started, "hits": self.hits, "misses": self.misses,
+                "discarded": self.discarded, "hit_rate": self.hit_rate,
+                "saved_ms": round(self.saved_ms, 1)}
+
+
+class Speculation:
+    """
+    A streaming request started from a partial transcript.
+
+    Chunks are read in a background thread and buffered, so the request keeps going while the
+    user is still speaking and a promoted speculation replays everything received so far.
+    """
+
+    def __init__(self, query: str, messages: MessageList, stream_factory: StreamFactory):
+        self.query = query
+        self.messages = messages
+        self.token = CancellationToken()
+        self.created = time.monotonic()
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[Exception] = None  # why the request stopped early
+        self._cond = Condition()
+        self._thread = Thread(target=self._run, args=(stream_factory,), name="openai-prefetch", daemon=True)
+        self._thread.start()
+
+    def _run(self, stream_factory: StreamFactory):
+        stream = stream_factory(self.messages, self.token)
+        try:
+            for chunk in stream:
+                with self._cond:
+                    self.chunks.append(chunk)
+                    self._cond.notify_all()
+        except Exception as e:
+            LOG.error(f"speculative request failed: {e}")
+            self.error = e
+        finally:
+            stream.close()
+            with self._cond:
+                self.done = True
+                self._cond.notify_all()
+
+    @property
+    def failed(self) -> bool:
+        """ the request ended without any text, eg. an API error """
+        with self._cond:
+            return self.done and not self.chunks
+
+    def cancel(self):
+        self.token.cancel()
+
+    def stream(self, cancel: Optional[CancellationToken] = None) -> Iterator[str]:
+        """
+        Yields the buffered chunks, then the rest of the answer as it arrives, then the error if the request failed.
+
+        Args:
+            cancel: Optional token of the caller, cancelling it stops the request.
+        """
+        unregister = cancel.on_cancel(lambda: self.token.cancel(cancel.error)) if cancel is not None else None
+        i = 0
+        try:
+            while True:
+                with self._cond:
+                    while i >= len(self.chunks) and not self.done:
+                        self._cond.wait()
+                    if i >= len(self.chunks):
+                        if self.error is not None:
+                            raise self.error
+                        return
+                    new, i = self.chunks[i:], len(self.chunks)
+                yield from new
+        finally:
+            if unregister is not None:
+                unregister()
+            if not self.done:
+                self.token.cancel()  # the caller stopped listening, close the connection
+
+
+class SpeculativePrefetcher:
+    """
+    Starts answering while the user is still speaking.
+
+    Interim transcripts of the speech recognizer start a streaming request, at most one per session.
+    When the final transcript arrives the request is promoted if the query matches and the chat
+    history did not change since it started, otherwise it is cancelled and a regular request is made.
+    """
+
+    def __init__(self, similarity: float = 1.0, min_words: int = 2,
+                 fillers: Iterable[str] = DEFAULT_FILLERS,
+                 ttl: float = 30, max_entries: int = 100):
+        """
+        Args:
+            similarity: Minimum ratio of matching words for a transcript to match the speculative one,
+                1.0 only ignores case, punctuation and filler words.
+            min_words: Interim transcripts shorter than this do not start a request.
+            fillers: Words ignored when comparing transcripts.
+            ttl: Seconds a speculation waits to be claimed, sessions that never send the final
+                transcript would otherwise keep their buffered answer forever. 0 never expires.
+            max_entries: Maximum sessions with a speculation, the oldest one is dropped first. 0 for no limit.
+        """
+        self.similarity = similarity
+        self.min_words = min_words
+        self.fillers = tuple(fillers)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = PrefetchStats()
+        self._speculations: Dict[str, Speculation] = {}
+        self._lock = Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict) -> Optional["SpeculativePrefetcher"]:
+        """
+        Creates the prefetcher described by the "prefetch" section of a solver config.
+
+        Returns:
+            None if prefetching is disabled.
+        """
+        cfg = config.get("prefetch", {})
+        if not cfg.get("enabled", True):
+            return None
+        return cls(similarity=cfg.get("similarity", 1.0),
+                   min_words=cfg.get("min_words", 2),
+                   fillers=cfg.get("fillers", DEFAULT_FILLERS),
+                   ttl=cfg.get("ttl", 30),
+                   max_entries=cfg.get("max_entries", 100))
+
+    def _expired(self, speculation: Speculation) -> bool:
+        return bool(self.ttl) and time.monotonic() - speculation.created > self.ttl
+
+    def _prune(self) -> List[Speculation]:
+        """ removes expired speculations and the oldest ones over max_entries, the lock must be held """
+        expired = [sid for sid, s in self._speculations.items() if self._expired(s)]
+        dropped = [self._speculations.pop(sid) for sid in expired]
+        # dicts keep insertion order and start() reinserts a replaced session, the first entry is the oldest
+        while self.max_entries and len(self._speculations) > self.max_entries:
+            dropped.append(self._speculations.pop(next(iter(self._speculations))))
+        return dropped
+
+    def matches(self, a: str, b: str) -> bool:
+        """ True if two transcripts ask the same thing """
+        a, b = normalize_transcript(a, self.fillers), normalize_transcript(b, self.fillers)
+        if a == b:
+            return True
+        return self.similarity < 1 and SequenceMatcher(None, a, b).ratio() >= self.similarity
+
+    def start(self, session_id: str, partial: str, messages: MessageList,
+              stream_factory: StreamFactory) -> bool:
+        """
+        Starts a speculative request for an interim transcript, replacing the previous one of the session.
+
+        Returns:
+            True if a request for this transcript is in flight.
+        """
+        if len(normalize_transcript(partial, self.fillers)) < self.min_words:
+            return False
+        with self._lock:
+            dropped = self._prune()
+            current = self._speculations.get(session_id)
+            if current is not None and self.matches(current.query, partial) and not current.failed:
+                speculation = None  # the recognizer repeated itself, keep the request going
+            else:
+                self._speculations.pop(session_id, None)
+                speculation = self._speculations[session_id] = Speculation(partial, messages, stream_factory)
+                if current is not None:
+                    dropped.append(current)
+                dropped += self._prune()
+        for old in dropped:
+            old.cancel()
+            self.stats.inc("discarded")
+        if speculation is not None:
+            self.stats.inc("started")
+        return True
+
+    def discard(self, session_id: str):
+        """ cancels the speculative request of a session, eg. when listening was aborted """
+        with self._lock:
+            current = self._speculations.pop(session_id, None)
+        if current is not None:
+            current.cancel()
+            self.stats.inc("discarded")
+
+    def claim(self, session_id: str, query: str, messages: MessageList) -> Optional[Speculation]:
+        """
+        Takes the speculative request of a session for the final query.
+
+        Args:
+            session_id: The conversation.
+            query: The final transcript.
+            messages: The messages a regular request would send, the history must be unchanged.
+
+        Returns:
+            The promoted speculation, or None if there was none or it did not match, it is then cancelled.
+        """
+        with self._lock:
+            current = self._speculations.pop(session_id, None)
+        if current is None:
+            return None
+        if not self._expired(current) and current.messages[:-1] == messages[:-1] and self.matches(current.query, query) and not current.failed:
+            self.stats.inc("hits")
+            self.stats.inc("saved_ms", (time.monotonic() - current.created) * 1000)
+            LOG.debug(f"speculative request promoted: '{current.query}' -> '{query}'")
+            return current
+        current.cancel()
+        self.stats.inc("misses")
+        LOG.debug(f"speculative request cancelled: '{current.query}' -> '{query}'")
+        return None
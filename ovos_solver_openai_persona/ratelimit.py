@@ -0,0 +1,315 @@
+import asyncio
+import heapq
+import itertools
+import random
+import re
+import time
+from email.utils import parsedate_to_datetime
+from threading import Condition, Lock
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from ovos_utils.log import LOG
+
+from ovos_solver_openai_persona.cancellation import CancellationToken, DeadlineExceeded
+from ovos_solver_openai_persona.memory import estimate_tokens
+
+# request priorities, lower goes first when requests queue up for the rate limit
+PRIORITY_INTERACTIVE = 0  # a user is waiting for the answer
+PRIORITY_BATCH = 5
+PRIORITY_BACKGROUND = 10  # summaries, cache warm up
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Parses the reset durations of the x-ratelimit-reset-* headers, eg. "1s", "6m0s", "20ms", into seconds.
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION.findall(value)
+    if not parts:
+        return None
+    return sum(float(n) * _UNITS[unit] for n, unit in parts)
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """
+    Returns the seconds to wait from the retry-after-ms or Retry-After headers, None if absent.
+    """
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_request_tokens(payload: Dict) -> int:
+    """
+    Tokens a request counts against a tokens per minute limit, the prompt plus the maximum completion.
+    """
+    prompt = payload.get("messages") or payload.get("prompt") or ""
+    if isinstance(prompt, str):
+        text, prompts = prompt, 1
+    elif payload.get("messages"):
+        text, prompts = " ".join(str(m.get("content") or "") for m in prompt), 1
+    else:  # array of completion prompts
+        text, prompts = " ".join(prompt), len(prompt)
+    return estimate_tokens(text) + (payload.get("max_tokens") or 0) * (payload.get("n") or 1) * prompts
+
+
+class TokenBucket:
+    """
+    Allows up to per_minute units per minute, refilled continuously, 0 means unlimited.
+    """
+
+    def __init__(self, per_minute: float = 0):
+        self.configured = bool(per_minute)  # headers can not raise a configured limit
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60  # units per second
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if self.capacity:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """ seconds until amount units are available """
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)  # a request larger than the bucket waits for a full bucket
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount: float):
+        if self.capacity:
+            self.level -= min(amount, self.capacity)
+
+    def sync(self, limit: Optional[float], remaining: Optional[float], reset: Optional[float], now: float):
+        """
+        Aligns the bucket with the limits reported by the server.
+
+        Args:
+            limit: Units allowed per minute, replaces the capacity unless the bucket was configured.
+            remaining: Units left right now.
+            reset: Seconds until the server bucket is full again.
+        """
+        self._refill(now)
+        if self.configured:
+            # the configured limit is a cap, eg. a share of the account limit, only trust a lower level
+            if remaining is not None:
+                self.level = min(self.level, float(remaining))
+            return
+        if limit:
+            self.capacity = float(limit)
+            self.rate = self.capacity / 60
+        if remaining is not None and self.capacity:
+            self.level = min(self.capacity, float(remaining))
+            if reset:
+                # refill at least as fast as the server does
+                self.rate = max(self.rate, (self.capacity - self.level) / reset)
+
+
+class RateLimiter:
+    """
+    Client side rate limit for one API account, shared by every plugin in the process.
+
+    Requests wait for a requests per minute and a tokens per minute bucket, both learned from the
+    x-ratelimit-* response headers unless configured. Waiting requests are served by priority,
+    so interactive chat goes before background summarization. Throttling (429 or a Retry-After header)
+    pauses all requests to the account, for Retry-After if sent or with exponential backoff and jitter.
+    Connection errors and plain server errors are the endpoint failing, not the account, they are
+    handled by the circuit breaker of the load balancer.
+    """
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 backoff_base: float = 0.5, backoff_max: float = 30):
+        """
+        Args:
+            requests_per_minute: Request limit, 0 to learn it from the response headers.
+            tokens_per_minute: Token limit, 0 to learn it from the response headers.
+            backoff_base: Pause after the first failure, doubled on every consecutive failure.
+            backoff_max: Longest pause without a Retry-After header.
+        """
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failures = 0  # consecutive failures
+        self.paused_until = 0.0
+        self._cond = Condition()
+        self._waiters: List[Tuple[int, int]] = []  # heap of (priority, arrival)
+        self._arrivals = itertools.count()
+
+    def _delay(self, tokens: int) -> float:
+        now = time.monotonic()
+        return max(self.paused_until - now, self.requests.delay(1, now), self.tokens.delay(tokens, now))
+
+    def _take(self, tokens: int):
+        self.requests.take(1)
+        self.tokens.take(tokens)
+
+    def _leave(self, entry: Tuple[int, int]):
+        with self._cond:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+            self._cond.notify_all()
+
+    @staticmethod
+    def _check_deadline(cancel: Optional[CancellationToken], delay: float):
+        if cancel is None:
+            return
+        cancel.raise_if_cancelled()
+        remaining = cancel.remaining()
+        if remaining is not None and delay > remaining:
+            # fail now instead of waiting for a slot the deadline does not leave time to use
+            raise DeadlineExceeded(f"rate limited for {delay:.1f}s, past the request deadline")
+
+    def acquire(self, tokens: int = 0, priority: int = PRIORITY_INTERACTIVE,
+                cancel: Optional[CancellationToken] = None):
+        """
+        Blocks until a request of the given size may be sent.
+
+        Raises:
+            DeadlineExceeded: If the wait would last past the deadline of the cancel token.
+            RequestCancelled: If the cancel token is cancelled while waiting.
+        """
+        with self._cond:
+            if not self._waiters and self._delay(tokens) <= 0:
+                self._take(tokens)
+                return
+            entry = (priority, next(self._arrivals))
+            heapq.heappush(self._waiters, entry)
+        unregister = cancel.on_cancel(self.wake) if cancel is not None else None
+        try:
+            with self._cond:
+                while True:
+                    head = self._waiters[0] == entry
+                    delay = self._delay(tokens) if head else 0.0
+                    self._check_deadline(cancel, delay)
+                    if head and delay <= 0:
+                        self._take(tokens)
+                        return
+                    # the head wakes up when its slot is free, the others when the head leaves
+                    self._cond.wait(delay if head else None)
+        finally:
+            self._leave(entry)
+            if unregister is not None:
+                unregister()
+
+    async def async_acquire(self, tokens: int = 0, priority: int = PRIORITY_INTERACTIVE,
+                            cancel: Optional[CancellationToken] = None):
+        """
+        Non-blocking version of acquire.
+        """
+        with self._cond:
+            if not self._waiters and self._delay(tokens) <= 0:
+                self._take(tokens)
+                return
+            entry = (priority, next(self._arrivals))
+            heapq.heappush(self._waiters, entry)
+        try:
+            while True:
+                with self._cond:
+                    head = self._waiters[0] == entry
+                    delay = self._delay(tokens) if head else 0.0
+                    self._check_deadline(cancel, delay)
+                    if head and delay <= 0:
+                        self._take(tokens)
+                        return
+                await asyncio.sleep(min(delay, 1.0) if head else 0.05)
+        finally:
+            self._leave(entry)
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def update(self, headers: Mapping[str, str]):
+        """
+        Learns the account limits from the x-ratelimit-* headers of a response.
+        """
+        if "x-ratelimit-limit-requests" not in headers and "x-ratelimit-remaining-tokens" not in headers:
+            return
+
+        def num(name: str) -> Optional[float]:
+            try:
+                return float(headers[name]) if name in headers else None
+            except ValueError:
+                return None
+
+        with self._cond:
+            now = time.monotonic()
+            for kind, bucket in (("requests", self.requests), ("tokens", self.tokens)):
+                bucket.sync(num(f"x-ratelimit-limit-{kind}"), num(f"x-ratelimit-remaining-{kind}"),
+                            parse_duration(headers.get(f"x-ratelimit-reset-{kind}")), now)
+            self._cond.notify_all()
+
+    def throttled(self, retry_after: Optional[float] = None):
+        """
+        Pauses all requests after a 429, or any answer with a Retry-After header.
+
+        Args:
+            retry_after: Seconds requested by the server, otherwise exponential backoff with jitter is used.
+        """
+        with self._cond:
+            self.failures += 1
+            if retry_after is None:
+                retry_after = min(self.backoff_max, self.backoff_base * 2 ** (self.failures - 1))
+                retry_after *= random.uniform(0.5, 1.0)  # so clients throttled together do not retry together
+            until = time.monotonic() + retry_after
+            if until > self.paused_until:
+                LOG.debug(f"rate limited, pausing requests for {retry_after:.2f}s")
+                self.paused_until = until
+            self._cond.notify_all()
+
+    def succeeded(self):
+        if self.failures:
+            with self._cond:
+                self.failures = 0
+
+
+_LIMITERS: Dict[Tuple[str, str], RateLimiter] = {}
+_LOCK = Lock()
+
+
+def get_limiter(api_url: str, key: str, config: Optional[Dict] = None) -> Optional[RateLimiter]:
+    """
+    Returns the rate limiter shared by all requests to api_url with key, creating it if needed.
+
+    NOTE: limits are read from the config of the first plugin that uses an account
+
+    Args:
+        api_url: The endpoint url.
+        key: The API key, limits are per account.
+        config: Optional plugin config with a "rate_limit" section:
+            enabled, requests_per_minute, tokens_per_minute, backoff_base, backoff_max
+
+    Returns:
+        The RateLimiter, or None if rate limiting is disabled.
+    """
+    cfg = (config or {}).get("rate_limit") or {}
+    if not cfg.get("enabled", True):
+        return None
+    with _LOCK:
+        limiter_key = (api_url.rstrip("/"), key)
+        if limiter_key not in _LIMITERS:
+            _LIMITERS[limiter_key] = RateLimiter(requests_per_minute=cfg.get("requests_per_minute", 0),
+                                                 tokens_per_minute=cfg.get("tokens_per_minute", 0),
+                                                 backoff_base=cfg.get("backoff_base", 0.5),
+                                                 backoff_max=cfg.get("backoff_max", 30))
+        return _LIMITERS[limiter_key]
@@ -0,0 +1,224 @@
+from typing import Dict, Iterable, List, Optional
+
+# words that end with a period but do not end a sentence, compared lowercase without the final "."
+ABBREVIATIONS: Dict[str, set] = {
+    "en": {"mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "e.g", "i.e", "approx",
+           "no", "fig", "inc", "ltd", "co", "mt", "jan", "feb", "mar", "apr", "jun", "jul",
+           "aug", "sep", "sept", "oct", "nov", "dec", "a.m", "p.m", "u.s", "u.k"},
+    "pt": {"sr", "sra", "dr", "dra", "prof", "profa", "eng", "p.ex", "ex", "av", "n.º", "nº", "pág"},
+    "es": {"sr", "sra", "srta", "dr", "dra", "prof", "ej", "p.ej", "av", "núm", "pág", "ud", "uds"},
+    "fr": {"m", "mme", "mlle", "dr", "pr", "p.ex", "av", "env", "cf", "st", "ste"},
+    "de": {"hr", "fr", "dr", "prof", "z.b", "bzw", "ca", "usw", "nr", "str", "d.h", "u.a"},
+    "it": {"sig", "sig.ra", "dott", "prof", "ing", "avv", "es", "ecc", "pag"},
+    "nl": {"dhr", "mevr", "dr", "prof", "bijv", "bv", "o.a", "nr", "d.w.z"},
+}
+
+# words starting a clause, the first utterance may be split before them, compared lowercase
+CLAUSE_WORDS: Dict[str, set] = {
+    "en": {"that", "which", "who", "whose", "where", "when", "while", "because", "although", "though",
+           "but", "so", "if", "unless", "since", "whereas"},
+    "pt": {"que", "porque", "quando", "onde", "mas", "embora", "enquanto", "se"},
+    "es": {"que", "porque", "cuando", "donde", "pero", "aunque", "mientras", "si"},
+    "fr": {"qui", "que", "parce", "quand", "où", "mais", "bien", "lorsque", "si"},
+    "de": {"dass", "weil", "wenn", "aber", "obwohl", "während", "denn", "sondern"},
+    "it": {"che", "perché", "quando", "dove", "ma", "sebbene", "mentre", "se"},
+    "nl": {"dat", "omdat", "wanneer", "maar", "hoewel", "terwijl", "als"},
+}
+
+TERMINATORS = ".!?…:"
+CLAUSE_MARKS = ",;"
+CLOSERS = "\"')]}»”’"
+
+
+class SentenceSegmenter:
+    """
+    Stateful segmenter that splits a stream of LLM tokens into speakable utterances.
+
+    Sentence boundaries are detected anywhere inside a chunk, closing quotes and brackets
+    stay with their sentence, decimals, times, list numbers and abbreviations are not split.
+    Ambiguous boundaries at the end of a chunk are only confirmed once the next chunk is seen,
+    or when the stream is flushed.
+    """
+
+    def __init__(self, lang: Optional[str] = None,
+                 min_length: int = 0,
+                 max_length: int = 0,
+                 comma_split_after: int = 0,
+                 abbreviations: Optional[Iterable[str]] = None,
+                 eager: bool = True):
+        """
+        Args:
+            lang: Language code used to select the abbreviation list.
+            min_length: Utterances shorter than this are merged with the next sentence.
+            max_length: Utterances are force split at a word boundary past this length, 0 to disable.
+            comma_split_after: Split the first utterance at a clause boundary once it is this long, 0 to disable.
+                After the first comma or semicolon, or before the first word starting a clause, eg. "that" or "because".
+                This lets TTS start speaking sooner on long answers.
+            abbreviations: Extra abbreviations to not split on, in addition to the language defaults.
+            eager: Split as soon as a chunk ends with an unambiguous terminator instead of waiting
+                for the next chunk, saves one token of latency per utterance.
+        """
+        self.min_length = min_length
+        self.max_length = max_length
+        self.comma_split_after = comma_split_after
+        self.eager = eager
+        lang = (lang or "en").split("-")[0].lower()
+        self.abbreviations = set(ABBREVIATIONS.get(lang, ABBREVIATIONS["en"]))
+        self.abbreviations.update(a.lower().rstrip(".") for a in abbreviations or [])
+        self.clause_words = CLAUSE_WORDS.get(lang, CLAUSE_WORDS["en"])
+        self._buffer = ""
+        self._pos = 0  # index of the next character to inspect in the buffer
+        self._emitted = 0
+        self._strip_leading = False
+
+    def feed(self, chunk: str) -> List[str]:
+        """
+        Adds a chunk of streamed text.
+
+        Returns:
+            The utterances completed by this chunk, possibly empty.
+        """
+        self._buffer += chunk
+        if self._strip_leading:
+            self._drop_late_closers()
+        utterances = []
+        while True:
+            end = self._find_boundary()
+            if end is None:
+                break
+            utt = self._buffer[:end].strip()
+            self._buffer = self._buffer[end:].lstrip()
+            if self._strip_leading and self._buffer:
+                self._drop_late_closers()
+            self._pos = 0
+            if utt:
+                utterances.append(utt)
+                self._emitted += 1
+        return utterances
+
+    def flush(self) -> List[str]:
+        """
+        Signals the end of the stream, returns whatever text is left as a final utterance.
+        """
+        utt = self._buffer.strip()
+        self._buffer = ""
+        self._pos = 0
+        self._strip_leading = False
+        if not utt:
+            return []
+        self._emitted += 1
+        return [utt]
+
+    def _find_boundary(self) -> Optional[int]:
+        """
+        Scans the buffer for the end of the next utterance.
+
+        Returns:
+            The index where the utterance ends, or None if more text is needed.
+        """
+        buf = self._buffer
+        n = len(buf)
+        i = self._pos
+        while i < n:
+            c = buf[i]
+            if c == "\n":
+                if len(buf[:i].strip()) >= self.min_length or not buf[:i].strip():
+                    return i + 1
+            elif c in TERMINATORS:
+                # include any closing quotes/brackets and repeated punctuation, "?!" "..." ')."
+                j = i + 1
+                while j < n and (buf[j] in CLOSERS or buf[j] in TERMINATORS):
+                    j += 1
+                if j == n:
+                    if not self.eager or self._may_continue(buf, i) or not buf[:i].strip() \
+                            or len(buf[:j].strip()) < self.min_length:
+                        # can't tell yet, the next chunk might be "14" of "3.14"
+                        self._pos = i
+                        return None
+                    # don't wait for the next token, a closing quote arriving late is dropped
+                    self._strip_leading = True
+                    return j
+                if buf[j].isspace() and self._is_sentence_end(buf, i) \
+                        and len(buf[:j].strip()) >= self.min_length:
+                    return j
+                if self.max_length and i >= self.max_length:
+                    # too long, split at the last word boundary or after the punctuation, "a.b.c.d"
+                    cut = buf.rfind(" ", 0, i)
+                    return cut + 1 if cut > 0 else j
+                i = j
+                continue
+            elif self.comma_split_after and not self._emitted and i >= self.comma_split_after:
+                if c in CLAUSE_MARKS:
+                    if i + 1 == n:
+                        self._pos = i
+                        return None
+                    if buf[i + 1].isspace():
+                        return i + 1
+                elif c == " ":
+                    split = self._clause_starts(buf, i + 1)
+                    if split is None:
+                        self._pos = i  # the next word is not complete yet
+                        return None
+                    if split:
+                        return i + 1
+            if self.max_length and i >= self.max_length:
+                # no sentence boundary in sight, split at the last word boundary
+                cut = buf.rfind(" ", 0, i + 1)
+                if cut > 0:
+                    return cut + 1
+            i += 1
+        self._pos = n
+        return None
+
+    def _drop_late_closers(self):
+        """
+        Drops the closing quotes and punctuation that arrive right after an eager split, they belong
+        to the utterance already returned. Text after a whitespace starts the next utterance and is kept.
+        """
+        end = 0
+        while end < len(self._buffer) and self._buffer[end] in CLOSERS + TERMINATORS:
+            end += 1
+        self._buffer = self._buffer[end:]
+        self._strip_leading = not self._buffer
+
+    def _clause_starts(self, buf: str, start: int) -> Optional[bool]:
+        """
+        Checks if the word at buf[start] starts a clause, None if the word may not be complete yet.
+        """
+        end = start
+        while end < len(buf) and buf[end].isalpha():
+            end += 1
+        if end == len(buf):
+            return None
+        return end > start and buf[start:end].lower() in self.clause_words
+
+    def _may_continue(self, buf: str, i: int) -> bool:
+        """
+        Checks if a terminator at the end of the buffer might not end the sentence,
+        depending on what the next chunk brings.
+        """
+        if i and buf[i - 1].isdigit():
+            return True  # "3." -> "3.14", "10:" -> "10:30"
+        if i > 1 and buf[i - 1].isalpha() and not buf[i - 2].isalnum():
+            return True  # single letter, "e." -> "e.g."
+        return not self._is_sentence_end(buf, i)
+
+    def _is_sentence_end(self, buf: str, i: int) -> bool:
+        """
+        Checks if the terminator at buf[i] ends a sentence, looking at the word before it.
+        """
+        if buf[i] != ".":
+            return True
+        start = max(buf.rfind(" ", 0, i), buf.rfind("\n", 0, i)) + 1
+        word = buf[start:i].lstrip("\"'([{«“‘")
+        if not word:
+            return True
+        if word.lower() in self.abbreviations:
+            return False
+        if len(word) == 1 and word.isupper() and word != "I":
+            return False  # initials, "J. R. R. Tolkien"
+        if word.isdigit():
+            # numbered list item "1. Preheat the oven" vs "born in 1990. Then"
+            line_start = buf.rfind("\n", 0, start) + 1
+            return bool(buf[line_start:start].strip())
+        return True
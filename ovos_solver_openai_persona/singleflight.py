@@ -0,0 +1,229 @@
+import json
+from threading import Condition, Lock
+from typing import Callable, Dict, Iterator, List, Optional, TypeVar
+
+from ovos_utils.log import LOG
+
+from ovos_solver_openai_persona.cancellation import CancellationToken, RequestCancelled
+
+T = TypeVar("T")
+
+_END = object()
+
+
+def flight_key(payload: Dict) -> str:
+    """ requests are only collapsed if their payloads are identical, including sampling parameters """
+    return json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+class _Call:
+    """ a blocking request in flight, its result is handed to every caller waiting for it """
+
+    def __init__(self):
+        self.cond = Condition()
+        self.done = False
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+    def wake(self):
+        with self.cond:
+            self.cond.notify_all()
+
+
+class SharedStream:
+    """
+    A streaming request read by several consumers, each one gets every chunk from the start.
+
+    There is no background thread, whichever consumer runs out of buffered chunks reads the next one
+    from the source. The request is cancelled when the last consumer leaves before the end.
+    """
+
+    def __init__(self, source: Iterator[str], token: CancellationToken):
+        """
+        Args:
+            source: The chunks of the upstream request.
+            token: Cancels the upstream request.
+        """
+        self.source = source
+        self.token = token
+        self.chunks: List[str] = []
+        self.consumers = 0
+        self.done = False
+        self.error: Optional[Exception] = None  # why the source stopped early, raised to every consumer
+        self.closed = False  # finished or abandoned, no new consumers can join
+        self._reading = False
+        self._cond = Condition()
+
+    def join(self) -> bool:
+        """ registers a consumer, False if the stream is closed """
+        with self._cond:
+            if self.closed:
+                return False
+            self.consumers += 1
+            return True
+
+    def _on_cancel(self):
+        with self._cond:
+            if self.consumers == 1:
+                # nobody else is listening, stop the upstream request right away
+                self.token.cancel()
+            self._cond.notify_all()
+
+    def read(self, cancel: Optional[CancellationToken] = None) -> Iterator[str]:
+        """
+        Yields all chunks of the stream, the consumer must have joined first.
+
+        If the source fails, every consumer gets the chunks received so far and then its error.
+
+        Args:
+            cancel: Optional token of this consumer, cancelling it only stops the others' request
+                if no one else is listening.
+        """
+        unregister = cancel.on_cancel(self._on_cancel) if cancel is not None else None
+        i = 0
+        try:
+            while True:
+                with self._cond:
+                    while i >= len(self.chunks) and not self.done and self._reading:
+                        if cancel is not None and cancel.cancelled:
+                            return
+                        self._cond.wait()
+                    if cancel is not None and cancel.cancelled:
+                        return
+                    new = self.chunks[i:]
+                    i = len(self.chunks)
+                    if not new:
+                        if self.done:
+                            if self.error is not None:
+                                raise self.error
+                            return
+                        self._reading = True  # our turn to read from the source
+                if new:
+                    yield from new
+                    continue
+                error = None
+                try:
+                    chunk = next(self.source, _END)
+                except Exception as e:
+                    LOG.error(f"shared streaming request failed: {e}")
+                    chunk, error = _END, e
+                with self._cond:
+                    self._reading = False
+                    if chunk is _END:
+                        self.error = error
+                        self.done = self.closed = True
+                    else:
+                        self.chunks.append(chunk)
+                    self._cond.notify_all()
+        finally:
+            if unregister is not None:
+                unregister()
+            self._leave()
+
+    def _leave(self):
+        with self._cond:
+            self.consumers -= 1
+            abandon = not self.consumers and not self.done
+            if abandon:
+                self.closed = True
+        if abandon:
+            self.token.cancel()
+            self.source.close()  # nobody is reading it, the last consumer just left
+
+
+class SingleFlight:
+    """
+    Collapses concurrent identical requests into a single upstream request.
+
+    Several devices behind one persona server often ask for the same dialog rewrite or summary
+    at once, only the first caller sends the request and the others wait for its answer.
+    Streamed answers are fanned out chunk by chunk to every caller.
+    """
+
+    def __init__(self):
+        self.requests = 0  # upstream requests sent
+        self.shared = 0  # callers served by a request someone else sent
+        self._lock = Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, SharedStream] = {}
+
+    def do(self, key: str, func: Callable[[], T], cancel: Optional[CancellationToken] = None) -> T:
+        """
+        Calls func, or waits for the result of an identical call already in flight.
+
+        If the first caller is cancelled, the callers waiting for it make the request again.
+
+        Args:
+            key: Identifies identical calls, see flight_key.
+            func: Makes the request.
+            cancel: Optional token of this caller.
+
+        Raises:
+            RequestCancelled: If the token was cancelled while waiting.
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                    self.requests += 1
+                else:
+                    self.shared += 1
+            if leader:
+                try:
+                    call.result = func()
+                    return call.result
+                except BaseException as e:
+                    call.error = e
+                    raise
+                finally:
+                    with self._lock:
+                        del self._calls[key]
+                    with call.cond:
+                        call.done = True
+                        call.cond.notify_all()
+
+            unregister = cancel.on_cancel(call.wake) if cancel is not None else None
+            try:
+                with call.cond:
+                    while not call.done:
+                        if cancel is not None:
+                            cancel.raise_if_cancelled()
+                        call.cond.wait()
+            finally:
+                if unregister is not None:
+                    unregister()
+            if isinstance(call.error, RequestCancelled):
+                continue  # the deadline of the first caller is not ours
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+    def stream(self, key: str, func: Callable[[CancellationToken], Iterator[str]],
+               cancel: Optional[CancellationToken] = None,
+               timeout: Optional[float] = None) -> Iterator[str]:
+        """
+        Streams the chunks of func, or of an identical streaming call already in flight.
+
+        Args:
+            key: Identifies identical calls, see flight_key.
+            func: Starts the streaming request, stopped by the given token.
+            cancel: Optional token of this caller.
+            timeout: Seconds the upstream request may take, it is shared so caller deadlines do not apply.
+        """
+        with self._lock:
+            shared = self._streams.get(key)
+            if shared is None or not shared.join():
+                token = CancellationToken(timeout)
+                shared = self._streams[key] = SharedStream(func(token), token)
+                shared.join()
+                self.requests += 1
+            else:
+                self.shared += 1
+        try:
+            yield from shared.read(cancel)
+        finally:
+            with self._lock:
+                if shared.closed and self._streams.get(key) is shared:
+                    del self._streams[key]
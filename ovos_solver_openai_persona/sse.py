@@ -0,0 +1,167 @@
+import codecs
+import json
+from json.decoder import scanstring
+from typing import List, NamedTuple, Optional, Tuple
+
+DONE = "[DONE]"
+
+
+class StreamError(RuntimeError):
+    """ the API reported an error in the middle of a stream """
+
+
+class StreamInterrupted(RuntimeError):
+    """ a stream stopped before the answer was finished, after some of its text was received """
+
+
+class SSEEvent(NamedTuple):
+    data: str
+    event: str = "message"
+    id: Optional[str] = None
+    retry: Optional[int] = None
+
+
+class SSEDecoder:
+    """
+    Decodes a Server-Sent-Events stream fed as raw byte chunks.
+
+    spec: https://html.spec.whatwg.org/multipage/server-sent-events.html#event-stream-interpretation
+
+    Chunk boundaries may fall anywhere, including in the middle of a multi-byte
+    UTF-8 character, a line or an event, partial input is buffered until complete.
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._buffer = ""
+        self._data: List[str] = []
+        self._event = ""
+        self._id: Optional[str] = None
+        self._retry: Optional[int] = None
+
+    @property
+    def last_event_id(self) -> Optional[str]:
+        return self._id
+
+    def feed(self, chunk: bytes) -> List[SSEEvent]:
+        """
+        Decodes a chunk of bytes from the stream.
+
+        Args:
+            chunk: Raw bytes as received from the network.
+
+        Returns:
+            List of the events completed by this chunk, possibly empty.
+        """
+        buf = self._buffer + self._decoder.decode(chunk)
+        if "\n" not in buf and "\r" not in buf:
+            self._buffer = buf
+            return []
+        held = ""
+        if "\r" in buf:
+            if buf[-1] == "\r":  # might be the first half of a \r\n
+                buf, held = buf[:-1], "\r"
+            buf = buf.replace("\r\n", "\n")
+            if "\r" in buf:
+                buf = buf.replace("\r", "\n")
+        lines = buf.split("\n")
+        self._buffer = lines.pop() + held
+        events = []
+        data = self._data
+        for line in lines:
+            if line.startswith("data:"):  # hot path
+                data.append(line[6:] if line[5:6] == " " else line[5:])
+            elif not line:
+                if data:
+                    events.append(SSEEvent("\n".join(data), self._event or "message",
+                                           self._id, self._retry))
+                    data = self._data = []
+                self._event = ""
+            else:
+                self._process_line(line, events)
+                data = self._data
+        return events
+
+    def flush(self) -> List[SSEEvent]:
+        """
+        Signals the end of the stream, returns any event left without a trailing blank line.
+        """
+        events = []
+        buf = self._buffer + self._decoder.decode(b"", final=True)
+        self._buffer = ""
+        if buf:
+            for line in buf.replace("\r\n", "\n").replace("\r", "\n").split("\n"):
+                self._process_line(line, events)
+        self._process_line("", events)
+        return events
+
+    def _process_line(self, line: str, events: List[SSEEvent]):
+        if not line:  # blank line, dispatch the event
+            if self._data:
+                events.append(SSEEvent(data="\n".join(self._data),
+                                       event=self._event or "message",
+                                       id=self._id, retry=self._retry))
+            self._data = []
+            self._event = ""
+            return
+        if line[0] == ":":  # comment / keep-alive
+            return
+        field, _, value = line.partition(":")
+        if value[:1] == " ":
+            value = value[1:]
+        if field == "data":
+            self._data.append(value)
+        elif field == "event":
+            self._event = value
+        elif field == "id":
+            if "\0" not in value:
+                self._id = value
+        elif field == "retry":
+            if value.isdigit():
+                self._retry = int(value)
+        # unknown fields are ignored
+
+
+def parse_chat_chunk(data: str) -> Tuple[Optional[str], bool]:
+    """
+    Extracts the delta content from the data of a streamed chat completion event.
+
+    Regular content chunks are handled without a full JSON parse, anything else
+    (errors, finish reasons, multiple choices...) falls back to json.loads
+
+    Args:
+        data: The data field of a SSEEvent.
+
+    Returns:
+        A (text, done) tuple, text is None if the chunk carries no content.
+
+    Raises:
+        StreamError: If the chunk reports an API error.
+    """
+    if data == DONE:
+        return None, True
+    idx = data.find('"content":"')
+    if idx != -1:
+        idx += 11
+    else:
+        idx = data.find('"content": "')
+        if idx != -1:
+            idx += 12
+    # a single choice with plain text content and no error or finish reason
+    if idx != -1 and data.find('"content"', idx) == -1 and '"error"' not in data \
+            and ('"finish_reason":null' in data or '"finish_reason": null' in data):
+        return scanstring(data, idx)[0], False
+    return _parse_chat_chunk_json(data)
+
+
+def _parse_chat_chunk_json(data: str) -> Tuple[Optional[str], bool]:
+    chunk = json.loads(data)
+    if "error" in chunk:
+        err = chunk["error"]
+        raise StreamError(err.get("message", err) if isinstance(err, dict) else err)
+    if not chunk.get("choices"):  # eg. usage report
+        return None, False
+    choice = chunk["choices"][0]
+    # some backends send the last piece of content together with the finish reason
+    text = (choice.get("delta") or {}).get("content")
+    return text, bool(choice.get("finish_reason"))
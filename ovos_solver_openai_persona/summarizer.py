@@ -1,16 +1,98 @@
-from ovos_solver_openai_persona.engines import OpenAIChatCompletionsSolver
-from ovos_plugin_manager.templates.solvers import TldrSolver
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from typing import Deque, Dict, Iterator, List, Optional
+
 from ovos_plugin_manager.templates.language import LanguageTranslator, LanguageDetector
-from typing import Dict, Optional
+from ovos_plugin_manager.templates.solvers import TldrSolver
+from ovos_utils.log import LOG
+
+from ovos_solver_openai_persona.cancellation import CancellationToken
+from ovos_solver_openai_persona.engines import OpenAIChatCompletionsSolver
+from ovos_solver_openai_persona.memory import Tokenizer, estimate_tokens, get_tokenizer
+from ovos_solver_openai_persona.ratelimit import PRIORITY_BACKGROUND
+
+
+def _iter_units(text: str, max_tokens: int, tokenizer: Tokenizer) -> Iterator[str]:
+    """
+    Yields the paragraphs of a text, paragraphs longer than max_tokens are split at word boundaries.
+    """
+    window = max(1, max_tokens * 3)  # characters, most tokenizers average 3-4 characters per token
+    start = 0
+    n = len(text)
+    while start < n:
+        end = text.find("\n", start)
+        if end == -1:
+            end = n
+        pos = start
+        start = end + 1
+        # slicing a window at a time avoids copying huge single line documents
+        while pos < end:
+            cut = min(end, pos + window)
+            if cut < end:
+                space = text.rfind(" ", pos, cut)
+                if space > pos:
+                    cut = space
+            unit = text[pos:cut].strip()
+            while cut - pos > 1 and tokenizer(unit) > max_tokens:
+                cut = pos + (cut - pos) // 2
+                unit = text[pos:cut].strip()
+            pos = cut
+            if unit:
+                yield unit
+
+
+def split_document(text: str, max_tokens: int = 3000, overlap: int = 200,
+                   tokenizer: Optional[Tokenizer] = None) -> Iterator[str]:
+    """
+    Lazily splits a document into chunks of at most max_tokens, breaking at paragraph boundaries when possible.
+
+    :param text: The document to split.
+    :param max_tokens: Maximum number of tokens per chunk.
+    :param overlap: Number of tokens from the end of a chunk repeated at the start of the next one,
+        so context is not lost at chunk boundaries.
+    :param tokenizer: Function returning the number of tokens in a string, defaults to estimate_tokens.
+    :return: An iterator over the chunks, in document order.
+    """
+    tokenizer = tokenizer or estimate_tokens
+    overlap = min(overlap, max_tokens // 2)
+    chunk: Deque = deque()  # (unit, tokens)
+    tokens = 0
+    fresh = False  # chunk holds text not yet yielded
+    for unit in _iter_units(text, max_tokens, tokenizer):
+        t = tokenizer(unit)
+        if fresh and tokens + t > max_tokens:
+            yield "\n".join(u for u, _ in chunk)
+            # keep the trailing units that fit in the overlap budget
+            while chunk and (tokens > overlap or tokens + t > max_tokens):
+                tokens -= chunk.popleft()[1]
+        chunk.append((unit, t))
+        tokens += t
+        fresh = True
+    if fresh:
+        yield "\n".join(u for u, _ in chunk)
 
 
 class OpenAISummarizer(TldrSolver):
     TEMPLATE = """Your task is to summarize the text into a suitable format.
-Answer in plaintext with no formatting, 2 paragraphs long at most. 
+Answer in plaintext with no formatting, 2 paragraphs long at most.
 Focus on the most important information.
 ---------------------
 {content}
 """
+    MAP_TEMPLATE = """Your task is to summarize a section of a larger document.
+Answer in plaintext with no formatting, one paragraph long at most.
+Keep names, numbers and facts that may matter for the whole document.
+---------------------
+{content}
+"""
+    REDUCE_TEMPLATE = """Your task is to merge summaries of consecutive sections of a document into a single summary.
+Answer in plaintext with no formatting, one paragraph long at most.
+Focus on the most important information.
+---------------------
+{content}
+"""
+
     def __init__(self, config: Optional[Dict] = None,
                  translator: Optional[LanguageTranslator] = None,
                  detector: Optional[LanguageDetector] = None,
@@ -22,20 +104,164 @@ Focus on the most important information.
                          detector=detector, priority=priority,
                          enable_tx=enable_tx, enable_cache=enable_cache,
                          internal_lang=internal_lang)
-        self.llm = OpenAIChatCompletionsSolver(config=config, translator=translator,
-                                               detector=detector, priority=priority,
-                                               enable_tx=enable_tx, enable_cache=enable_cache,
-                                               internal_lang=internal_lang)
+        # the solver is created on first use, OPM loads every plugin at boot
+        self._llm: Optional[OpenAIChatCompletionsSolver] = None
+        self._llm_kwargs = dict(translator=translator, detector=detector, priority=priority,
+                                enable_tx=enable_tx, enable_cache=enable_cache, internal_lang=internal_lang)
+        self._tokenizer = None
+        self._lock = Lock()
         self.prompt_template = self.config.get("prompt_template") or self.TEMPLATE
+        self.map_template = self.config.get("map_template") or self.MAP_TEMPLATE
+        self.reduce_template = self.config.get("reduce_template") or self.REDUCE_TEMPLATE
+        self.chunk_tokens = self.config.get("chunk_tokens", 3000)
+        self.chunk_overlap = self.config.get("chunk_overlap", 200)
+        self.map_workers = max(1, self.config.get("map_workers", 4))
+        self.reduce_fan_in = max(2, self.config.get("reduce_fan_in", 8))
+
+    @property
+    def llm(self) -> OpenAIChatCompletionsSolver:
+        """
+        The chat solver used to summarize, created on first use.
+        """
+        if self._llm is None:
+            with self._lock:
+                if self._llm is None:
+                    # NOTE: memory is disabled, chunks are summarized concurrently and must not see each other
+                    llm = OpenAIChatCompletionsSolver(config={**self.config, "enable_memory": False},
+                                                      **self._llm_kwargs)
+                    llm.metrics_label = self.__class__.__name__
+                    llm.request_priority = PRIORITY_BACKGROUND  # chat goes first when rate limited
+                    self._llm = llm
+        return self._llm
+
+    @property
+    def tokenizer(self) -> Tokenizer:
+        if self._tokenizer is None:
+            self._tokenizer = get_tokenizer(self.config.get("tokenizer"), self.config.get("model", "gpt-4o-mini"))
+        return self._tokenizer
+
+    def _summarize(self, template: str, content: str, lang: Optional[str] = None) -> Optional[str]:
+        try:
+            return self.llm.get_spoken_answer(template.format(content=content), lang)
+        except Exception as e:
+            LOG.error(f"failed to summarize chunk: {e}")
+            return None
+
+    def _stream_partial_summaries(self, document: str, lang: Optional[str],
+                                  pool: ThreadPoolExecutor) -> Iterator[str]:
+        # at most 2 chunks per worker are in flight, so memory does not grow with the document size
+        pending: Deque[Future] = deque()
+        for chunk in split_document(document, self.chunk_tokens, self.chunk_overlap, self.tokenizer):
+            pending.append(pool.submit(self._summarize, self.map_template, chunk, lang))
+            while len(pending) >= 2 * self.map_workers or (pending and pending[0].done()):
+                summary = pending.popleft().result()
+                if summary:
+                    yield summary
+        while pending:
+            summary = pending.popleft().result()
+            if summary:
+                yield summary
+
+    def stream_partial_summaries(self, document: str, lang: Optional[str] = None) -> Iterator[str]:
+        """
+        Summarize each chunk of a long document, yielding the chunk summaries in document order as they complete.
+
+        Chunks are summarized concurrently by up to "map_workers" threads.
+
+        :param document: The text of the document to summarize.
+        :param lang: Optional language code.
+        :return: An iterator over the partial summaries.
+        """
+        with ThreadPoolExecutor(max_workers=self.map_workers) as pool:
+            yield from self._stream_partial_summaries(document, lang, pool)
+
+    def _group(self, summaries: List[str]) -> List[List[str]]:
+        """ packs consecutive summaries into groups that fit a single reduce prompt """
+        groups: List[List[str]] = []
+        group: List[str] = []
+        tokens = 0
+        for summary in summaries:
+            t = self.tokenizer(summary)
+            if len(group) >= 2 and (tokens + t > self.chunk_tokens or len(group) >= self.reduce_fan_in):
+                groups.append(group)
+                group, tokens = [], 0
+            group.append(summary)
+            tokens += t
+        if group:
+            groups.append(group)
+        return groups
 
+    def _merge(self, summaries: List[str], lang: Optional[str],
+               pool: ThreadPoolExecutor) -> Optional[str]:
+        """ merges partial summaries level by level until they fit the final prompt, returns its content """
+        groups = self._group(summaries)
+        while len(groups) > 1:
+            merged = pool.map(lambda g: self._summarize(self.reduce_template, "\n\n".join(g), lang), groups)
+            summaries = [s for s in merged if s]
+            if not summaries:
+                return None
+            groups = self._group(summaries)
+        return "\n\n".join(groups[0])
+
+    def _reduce(self, summaries: List[str], lang: Optional[str],
+                pool: ThreadPoolExecutor) -> Optional[str]:
+        content = self._merge(summaries, lang, pool)
+        if content is None:
+            return None
+        return self._summarize(self.prompt_template, content, lang)
+
+    def _fits(self, document: str) -> bool:
+        # cheap length check first, tokenizing a multi-megabyte document is slow
+        return len(document) <= self.chunk_tokens * 4 and self.tokenizer(document) <= self.chunk_tokens
 
     def get_tldr(self, document: str, lang: Optional[str] = None) -> str:
         """
         Summarize the provided document.
 
+        Documents longer than "chunk_tokens" are split into overlapping chunks that are summarized
+        in parallel, the partial summaries are then merged hierarchically into the final summary.
+
         :param document: The text of the document to summarize, assured to be in the default language.
         :param lang: Optional language code.
         :return: A summary of the provided document.
         """
-        prompt = self.prompt_template.format(content=document)
-        return self.llm.get_spoken_answer(prompt, lang)
+        if self._fits(document):
+            prompt = self.prompt_template.format(content=document)
+            return self.llm.get_spoken_answer(prompt, lang)
+        with ThreadPoolExecutor(max_workers=self.map_workers) as pool:
+            summaries = list(self._stream_partial_summaries(document, lang, pool))
+            if not summaries:
+                LOG.error("failed to summarize any chunk of the document")
+                return None
+            return self._reduce(summaries, lang, pool)
+
+    def stream_tldr(self, document: str, lang: Optional[str] = None,
+                    cancel: Optional[CancellationToken] = None,
+                    timeout: Optional[float] = None) -> Iterator[str]:
+        """
+        Summarize the provided document, yielding the summary sentence by sentence as it is generated.
+
+        Long documents are split and merged as in get_tldr, only the final summary is streamed,
+        so it can be read aloud as soon as its first sentence arrives.
+
+        :param document: The text of the document to summarize, assured to be in the default language.
+        :param lang: Optional language code.
+        :param cancel: Optional token to stop the summary from another thread.
+        :param timeout: Seconds the final summary may take, defaults to "request_timeout" from config.
+        :return: An iterator over the sentences of the summary, empty if no chunk could be summarized.
+        """
+        if self._fits(document):
+            content = document
+        else:
+            with ThreadPoolExecutor(max_workers=self.map_workers) as pool:
+                summaries = list(self._stream_partial_summaries(document, lang, pool))
+                if not summaries:
+                    LOG.error("failed to summarize any chunk of the document")
+                    return
+                content = self._merge(summaries, lang, pool)
+            if content is None:
+                LOG.error("failed to merge the partial summaries of the document")
+                return
+        # memory is disabled in the llm, the summary does not leak into later prompts
+        yield from self.llm.stream_utterances(self.prompt_template.format(content=content), lang,
+                                              cancel=cancel, timeout=timeout)
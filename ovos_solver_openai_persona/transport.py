@@ -0,0 +1,456 @@
+import abc
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from threading import Event, Lock
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+from ovos_utils.log import LOG
+from requests import ReadTimeout
+
+from ovos_solver_openai_persona.connection import get_async_session, get_session
+
+# payload keys that do not change the response, requests differing only in these replay the same recording
+_IGNORED_KEYS = {"user", "prompt_cache_key"}
+# response headers kept in recordings, the ones the plugin reads
+_RECORDED_HEADERS = ("content-type", "retry-after", "retry-after-ms")
+# streaming clients stop reading at the event that finishes the answer
+_FINAL_EVENT = re.compile(rb'"finish_reason":\s*"|data: \[DONE\]')
+
+
+def exchange_key(path: str, payload: Dict) -> str:
+    """ identifies a request in recordings, the server it was sent to does not matter """
+    data = json.dumps([path, {k: v for k, v in payload.items() if k not in _IGNORED_KEYS}],
+                      sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()[:32]
+
+
+class Headers(dict):
+    """ response headers, names are case insensitive like in requests and aiohttp """
+
+    def __init__(self, headers: Dict[str, str]):
+        super().__init__((k.lower(), v) for k, v in headers.items())
+
+    def __getitem__(self, name: str) -> str:
+        return super().__getitem__(name.lower())
+
+    def __contains__(self, name) -> bool:
+        return super().__contains__(name.lower())
+
+    def get(self, name: str, default=None):
+        return super().get(name.lower(), default)
+
+
+class Exchange:
+    """
+    A recorded response, with the time to the response headers and the delay before every body chunk.
+
+    Stored as one json line, chunks are decoded as latin-1 so any byte sequence survives the round trip:
+        {"k": key, "p": path, "s": status, "h": {headers}, "t": ms to headers, "c": [[ms since previous chunk, text], ...]}
+    """
+
+    def __init__(self, key: str, path: str, status: int, headers: Dict[str, str],
+                 ttfb: float = 0.0, chunks: Optional[List[Tuple[float, bytes]]] = None):
+        self.key = key
+        self.path = path
+        self.status = status
+        self.headers = Headers(headers)
+        self.ttfb = ttfb  # seconds
+        self.chunks = chunks or []  # (seconds since the previous chunk, data)
+
+    def to_json(self) -> str:
+        return json.dumps({"k": self.key, "p": self.path, "s": self.status, "h": dict(self.headers),
+                           "t": round(self.ttfb * 1000, 1),
+                           "c": [[round(delay * 1000, 1), data.decode("latin-1")] for delay, data in self.chunks]},
+                          ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, line: str) -> "Exchange":
+        data = json.loads(line)
+        return cls(data["k"], data["p"], data["s"], data["h"], data["t"] / 1000,
+                   [(delay / 1000, text.encode("latin-1")) for delay, text in data["c"]])
+
+    @property
+    def body(self) -> bytes:
+        return b"".join(data for _, data in self.chunks)
+
+
+def _open(path: str, mode: str):
+    """ recordings ending in .gz are compressed, appending adds a gzip member which readers handle transparently """
+    if path.endswith(".gz"):
+        import gzip
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def load_recording(path: str) -> List[Exchange]:
+    """ reads all exchanges of a recording file, in the order they were recorded """
+    path = os.path.expanduser(path)
+    if not os.path.isfile(path):
+        return []
+    with _open(path, "r") as f:
+        return [Exchange.from_json(line) for line in f if line.strip()]
+
+
+class Transport(abc.ABC):
+    """
+    Sends the HTTP requests of the plugins, the load balancer calls it for every attempt.
+
+    Responses must look like a requests.Response (post) or an aiohttp.ClientResponse (async_post),
+    only the attributes used by the plugin are needed.
+    """
+
+    @abc.abstractmethod
+    def post(self, api_url: str, path: str, payload: Dict, headers: Dict[str, str],
+             config: Optional[Dict] = None, timeout: Optional[Tuple[float, float]] = None) -> Any:
+        """
+        POSTs a JSON payload to api_url + path, returning as soon as the response headers arrived.
+
+        Args:
+            api_url: The server, eg. "https://api.openai.com/v1".
+            path: The API path, eg. "/chat/completions".
+            payload: The request body.
+            headers: The request headers.
+            config: Optional plugin config with connection settings.
+            timeout: (connect, read) timeout in seconds.
+        """
+
+    @abc.abstractmethod
+    async def async_post(self, api_url: str, path: str, payload: Dict, headers: Dict[str, str],
+                         config: Optional[Dict] = None, timeout: Optional[Any] = None) -> Any:
+        """ Non-blocking version of post, timeout is an aiohttp.ClientTimeout """
+
+
+class HTTPTransport(Transport):
+    """ sends requests over the pooled HTTP sessions of the connection module """
+
+    def post(self, api_url, path, payload, headers, config=None, timeout=None):
+        url = api_url + path
+        return get_session(url, config).post(url, headers=headers, stream=True,
+                                             data=json.dumps(payload), timeout=timeout)
+
+    async def async_post(self, api_url, path, payload, headers, config=None, timeout=None):
+        url = api_url + path
+        return await get_async_session(url, config).post(url, headers=headers, data=json.dumps(payload),
+                                                         timeout=timeout)
+
+
+HTTP_TRANSPORT = HTTPTransport()
+
+
+class RecordingTransport(Transport):
+    """
+    Records the responses of another transport, with the timing of every body chunk, to a file.
+
+    A response is only recorded if its body was read to the end, or up to the event finishing a
+    streamed answer, answers interrupted by the caller would replay as if the server cut them short.
+    """
+
+    def __init__(self, path: str, transport: Transport = HTTP_TRANSPORT,
+                 on_record: Optional[Callable[[Exchange], None]] = None):
+        """
+        Args:
+            path: The recording file, exchanges are appended, compressed if it ends in .gz
+            transport: Sends the requests.
+            on_record: Optional callback receiving every recorded exchange.
+        """
+        self.path = os.path.expanduser(path)
+        self.transport = transport
+        self.on_record = on_record
+        self.recorded = 0
+        self._lock = Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+    def save(self, exchange: Exchange):
+        with self._lock:
+            with _open(self.path, "a") as f:
+                f.write(exchange.to_json() + "\n")
+            self.recorded += 1
+        if self.on_record is not None:
+            self.on_record(exchange)
+
+    @staticmethod
+    def _exchange(path: str, payload: Dict, status: int, headers, start: float) -> Exchange:
+        headers = {k: v for k, v in headers.items()
+                   if k.lower() in _RECORDED_HEADERS or k.lower().startswith("x-ratelimit-")}
+        return Exchange(exchange_key(path, payload), path, status, headers, time.monotonic() - start)
+
+    def post(self, api_url, path, payload, headers, config=None, timeout=None):
+        start = time.monotonic()
+        r = self.transport.post(api_url, path, payload, headers, config, timeout)
+        return _RecordingResponse(r, self._exchange(path, payload, r.status_code, r.headers, start), self.save)
+
+    async def async_post(self, api_url, path, payload, headers, config=None, timeout=None):
+        start = time.monotonic()
+        r = await self.transport.async_post(api_url, path, payload, headers, config, timeout)
+        return _AsyncRecordingResponse(r, self._exchange(path, payload, r.status, r.headers, start), self.save)
+
+
+class _Recorder:
+    """ collects the body chunks of a response and saves the exchange once, if it is complete """
+
+    def __init__(self, response, exchange: Exchange, save: Callable[[Exchange], None]):
+        self._response = response
+        self._exchange = exchange
+        self._save = save
+        self._last = time.monotonic()
+        self._complete = False
+        self._saved = False
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def _add(self, chunk: bytes):
+        now = time.monotonic()
+        self._exchange.chunks.append((now - self._last, chunk))
+        self._last = now
+        if not self._complete and _FINAL_EVENT.search(chunk):
+            self._complete = True
+
+    def _finish(self, complete: bool = False):
+        if not self._saved and (complete or self._complete):
+            self._saved = True
+            self._save(self._exchange)
+
+    def close(self):
+        self._finish()
+        self._response.close()
+
+
+class _RecordingResponse(_Recorder):
+    """ a requests.Response recording the chunks read from it """
+
+    @property
+    def text(self) -> str:
+        text = self._response.text
+        self._exchange.chunks = [(0.0, self._response.content)]
+        self._finish(complete=True)
+        return text
+
+    def iter_content(self, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        for chunk in self._response.iter_content(chunk_size=chunk_size):
+            self._add(chunk)
+            yield chunk
+        self._finish(complete=True)
+
+
+class _AsyncRecordingResponse(_Recorder):
+    """ an aiohttp.ClientResponse recording the chunks read from it """
+
+    def __init__(self, response, exchange: Exchange, save: Callable[[Exchange], None]):
+        super().__init__(response, exchange, save)
+        self.content = self
+
+    async def text(self, *args, **kwargs) -> str:
+        self._exchange.chunks = [(0.0, await self._response.read())]
+        self._finish(complete=True)
+        return await self._response.text(*args, **kwargs)
+
+    async def iter_any(self) -> AsyncIterator[bytes]:
+        async for chunk in self._response.content.iter_any():
+            self._add(chunk)
+            yield chunk
+        self._finish(complete=True)
+
+
+class ReplayTransport(Transport):
+    """
+    Answers requests from a recording, without any network access.
+
+    Responses are replayed with their original timing divided by speed, or as fast as possible
+    with speed 0. A request recorded several times replays its recordings in turn.
+    Requests that were not recorded are answered with a 404 error, like a server not knowing the model,
+    or are sent with the fallback transport, which can be a RecordingTransport so that the recording
+    fills up as it is used.
+    """
+
+    def __init__(self, path: str, speed: float = 1.0, fallback: Optional[Transport] = None):
+        """
+        Args:
+            path: The recording file.
+            speed: Playback speed, 2 replays twice as fast as recorded, 0 skips all delays.
+            fallback: Optional transport for requests missing from the recording.
+        """
+        self.path = path
+        self.speed = speed
+        self.fallback = fallback
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._exchanges: Dict[str, List[Exchange]] = {}
+        self._turns: Dict[str, int] = {}
+        for exchange in load_recording(path):
+            self.add(exchange)
+        LOG.debug(f"replaying {sum(len(e) for e in self._exchanges.values())} recorded responses from {path}")
+
+    def add(self, exchange: Exchange):
+        with self._lock:
+            self._exchanges.setdefault(exchange.key, []).append(exchange)
+
+    def _next(self, path: str, payload: Dict) -> Optional[Exchange]:
+        key = exchange_key(path, payload)
+        with self._lock:
+            recorded = self._exchanges.get(key)
+            if not recorded:
+                self.misses += 1
+                return None
+            turn = self._turns.get(key, 0)
+            self._turns[key] = turn + 1
+            self.hits += 1
+            return recorded[turn % len(recorded)]
+
+    def _miss(self, path: str) -> Exchange:
+        # not an endpoint failure, nothing is retried or failed over
+        LOG.warning(f"no recorded response for {path} request in {self.path}")
+        error = {"error": {"message": f"request not found in recording {self.path}", "type": "replay_miss"}}
+        return Exchange("", path, 404, {"content-type": "application/json"},
+                        chunks=[(0.0, json.dumps(error).encode("utf-8"))])
+
+    def _delay(self, seconds: float) -> float:
+        return seconds / self.speed if self.speed else 0.0
+
+    def post(self, api_url, path, payload, headers, config=None, timeout=None):
+        exchange = self._next(path, payload)
+        if exchange is None:
+            if self.fallback is not None:
+                return self.fallback.post(api_url, path, payload, headers, config, timeout)
+            return ReplayResponse(self._miss(path))
+        delay = self._delay(exchange.ttfb)
+        if timeout is not None and delay > timeout[1]:
+            time.sleep(timeout[1])
+            raise ReadTimeout(f"recorded response took {delay:.3f}s, read timeout is {timeout[1]}s")
+        if delay:
+            time.sleep(delay)
+        return ReplayResponse(exchange, self._delay)
+
+    async def async_post(self, api_url, path, payload, headers, config=None, timeout=None):
+        exchange = self._next(path, payload)
+        if exchange is None:
+            if self.fallback is not None:
+                return await self.fallback.async_post(api_url, path, payload, headers, config, timeout)
+            return AsyncReplayResponse(self._miss(path))
+        delay = self._delay(exchange.ttfb)
+        if timeout is not None and timeout.total is not None and delay > timeout.total:
+            await asyncio.sleep(timeout.total)
+            raise asyncio.TimeoutError()
+        if delay:
+            await asyncio.sleep(delay)
+        return AsyncReplayResponse(exchange, self._delay)
+
+
+class ReplayResponse:
+    """ a recorded response, with the attributes of requests.Response used by the plugin """
+    raw = None  # no socket to abort, closing stops the replay
+
+    def __init__(self, exchange: Exchange, delay: Callable[[float], float] = lambda s: 0.0):
+        self.exchange = exchange
+        self.status_code = exchange.status
+        self.headers = exchange.headers
+        self._delay = delay
+        self._closed = Event()
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def content(self) -> bytes:
+        return self.exchange.body
+
+    @property
+    def text(self) -> str:
+        return self.exchange.body.decode("utf-8", "replace")
+
+    def json(self):
+        return json.loads(self.exchange.body)
+
+    def iter_content(self, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        for delay, chunk in self.exchange.chunks:
+            delay = self._delay(delay)
+            if (self._closed.wait(delay) if delay else self._closed.is_set()):
+                return
+            yield chunk
+
+    def close(self):
+        self._closed.set()
+
+
+class AsyncReplayResponse:
+    """ a recorded response, with the attributes of aiohttp.ClientResponse used by the plugin """
+
+    def __init__(self, exchange: Exchange, delay: Callable[[float], float] = lambda s: 0.0):
+        self.exchange = exchange
+        self.status = exchange.status
+        self.headers = exchange.headers
+        self.content = self
+        self._delay = delay
+        self._closed = False
+
+    @property
+    def ok(self) -> bool:
+        return self.status < 400
+
+    @property
+    def content_type(self) -> str:
+        return self.headers.get("content-type", "application/octet-stream").split(";")[0].strip()
+
+    async def read(self) -> bytes:
+        return self.exchange.body
+
+    async def text(self, encoding: str = "utf-8", errors: str = "strict") -> str:
+        return self.exchange.body.decode(encoding, errors)
+
+    async def iter_any(self) -> AsyncIterator[bytes]:
+        for delay, chunk in self.exchange.chunks:
+            delay = self._delay(delay)
+            if delay:
+                await asyncio.sleep(delay)
+            if self._closed:
+                return
+            yield chunk
+
+    def close(self):
+        self._closed = True
+
+
+# one transport per recording file, shared by every plugin instance using it
+_TRANSPORTS: Dict[Tuple, Transport] = {}
+_LOCK = Lock()
+
+
+def get_transport(config: Optional[Dict] = None) -> Transport:
+    """
+    Returns the transport described by the "transport" section of a plugin config.
+
+        "transport": {"mode": "replay", "path": "~/recordings/openai.jsonl.gz", "speed": 1.0}
+
+    mode is "record" to send requests and record the responses, "replay" to answer from the
+    recording only, or "auto" to replay recorded requests and record the others.
+    Without a "transport" section requests are sent over HTTP.
+    """
+    cfg = (config or {}).get("transport") or {}
+    mode = cfg.get("mode", "http")
+    if mode == "http":
+        return HTTP_TRANSPORT
+    if mode not in ("record", "replay", "auto"):
+        raise ValueError(f"unknown transport mode: {mode}")
+    if not cfg.get("path"):
+        raise ValueError(f"transport mode '{mode}' requires a recording 'path'")
+    path = os.path.expanduser(cfg["path"])
+    speed = cfg.get("speed", 1.0)
+    with _LOCK:
+        key = (mode, path, speed)
+        if key not in _TRANSPORTS:
+            if mode == "record":
+                _TRANSPORTS[key] = RecordingTransport(path)
+            elif mode == "replay":
+                _TRANSPORTS[key] = ReplayTransport(path, speed)
+            else:
+                replay = ReplayTransport(path, speed)
+                # new recordings are replayed from then on
+                replay.fallback = RecordingTransport(path, on_record=replay.add)
+                _TRANSPORTS[key] = replay
+        return _TRANSPORTS[key]
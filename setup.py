@@ -51,6 +51,7 @@ PERSONA_ENTRY_POINT = 'Remote Llama=ovos_solver_openai_persona:LLAMA_DEMO'
 PLUGIN_ENTRY_POINT = 'ovos-solver-openai-plugin=ovos_solver_openai_persona.engines:OpenAIChatCompletionsSolver'
 DIALOG_PLUGIN_ENTRY_POINT = 'ovos-dialog-transformer-openai-plugin=ovos_solver_openai_persona.dialog_transformers:OpenAIDialogTransformer'
 SUMMARIZER_ENTRY_POINT = 'ovos-summarizer-openai-plugin=ovos_solver_openai_persona.summarizer:OpenAISummarizer'
+WARMUP_CLI_ENTRY_POINT = 'ovos-dialog-transformer-openai-warmup=ovos_solver_openai_persona.dialog_transformers:warmup_cli'
 
 
 setup(
@@ -68,9 +69,11 @@ setup(
         'neon.plugin.solver': PLUGIN_ENTRY_POINT,
         "opm.transformer.dialog": DIALOG_PLUGIN_ENTRY_POINT,
         'opm.solver.summarization': SUMMARIZER_ENTRY_POINT,
-        "opm.plugin.persona": PERSONA_ENTRY_POINT
+        "opm.plugin.persona": PERSONA_ENTRY_POINT,
+        "console_scripts": WARMUP_CLI_ENTRY_POINT
     },
     install_requires=required("requirements.txt"),
+    extras_require={"async": ["aiohttp"]},
     long_description=long_description,
     long_description_content_type='text/markdown'
 )
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import re
+import time
+from threading import Lock
+
+import pytest
+
+from ovos_solver_openai_persona.engines import OpenAIChatCompletionsSolver
+from ovos_solver_openai_persona.transport import AsyncReplayResponse, Exchange, ReplayResponse, Transport
+
+
+class Clock:
+    """ stands in for the time module of the module under test, time only moves when a test says so """
+
+    def __init__(self, monkeypatch):
+        self.now = 1000.0
+        self._monkeypatch = monkeypatch
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def patch(self, module: str):
+        """ makes module, eg. "ovos_solver_openai_persona.cache", read this clock instead of time """
+        self._monkeypatch.setattr(f"{module}.time", self)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    return Clock(monkeypatch)
+
+
+def _event(data) -> bytes:
+    return f"data: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+class ChatServer(Transport):
+    """
+    Answers chat completion requests like the OpenAI API would, with replayed responses.
+
+    answer maps the last user message to the reply, a string for every choice,
+    or a list with a (text, finish_reason) tuple per choice.
+    """
+
+    def __init__(self):
+        self.answer = lambda query: f"You said {query}."
+        self.delay = 0.0  # seconds before the first byte
+        self.payloads = []
+        self._lock = Lock()
+
+    def _exchange(self, path, payload) -> Exchange:
+        with self._lock:
+            self.payloads.append(payload)
+        answers = self.answer(payload["messages"][-1]["content"])
+        if isinstance(answers, str):
+            answers = [(answers, "stop")] * payload.get("n", 1)
+        usage = {"prompt_tokens": sum(len(m["content"].split()) for m in payload["messages"]),
+                 "completion_tokens": sum(len(text.split()) for text, _ in answers)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        if payload.get("stream"):
+            text, finish_reason = answers[0]
+            events = [{"choices": [{"delta": {"content": t}, "finish_reason": None}]}
+                      for t in re.findall(r"\S+\s*", text)]
+            events.append({"choices": [{"delta": {}, "finish_reason": finish_reason}]})
+            if (payload.get("stream_options") or {}).get("include_usage"):
+                events.append({"choices": [], "usage": usage})
+            chunks = [(0.0, _event(e)) for e in events] + [(0.0, b"data: [DONE]\n\n")]
+            return Exchange("", path, 200, {"Content-Type": "text/event-stream"}, self.delay, chunks)
+        body = {"choices": [{"index": i, "message": {"role": "assistant", "content": text},
+                             "finish_reason": finish_reason}
+                            for i, (text, finish_reason) in enumerate(answers)],
+                "usage": usage}
+        return Exchange("", path, 200, {"Content-Type": "application/json"}, self.delay,
+                        [(0.0, json.dumps(body).encode("utf-8"))])
+
+    def post(self, api_url, path, payload, headers, config=None, timeout=None):
+        exchange = self._exchange(path, payload)
+        time.sleep(exchange.ttfb)
+        return ReplayResponse(exchange)
+
+    async def async_post(self, api_url, path, payload, headers, config=None, timeout=None):
+        exchange = self._exchange(path, payload)
+        await asyncio.sleep(exchange.ttfb)
+        return AsyncReplayResponse(exchange)
+
+
+@pytest.fixture
+def chat_server():
+    return ChatServer()
+
+
+@pytest.fixture
+def chat_solver(chat_server):
+    """ creates solvers answered by chat_server, config entries override the test defaults """
+
+    def make(**config) -> OpenAIChatCompletionsSolver:
+        solver = OpenAIChatCompletionsSolver({"key": "sk-test", "api_url": "http://chat.invalid/v1",
+                                              "system_prompt": "sys", "rate_limit": {"enabled": False},
+                                              **config})
+        solver.balancer.transport = chat_server
+        return solver
+
+    return make
@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+import pytest
+
+from ovos_solver_openai_persona.cancellation import DeadlineExceeded
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def collect(stream):
+    return [utt async for utt in stream]
+
+
+def test_async_get_spoken_answer(chat_solver):
+    solver = chat_solver()
+    assert run(solver.async_get_spoken_answer("hello")) == "You said hello."
+    assert solver.qa_pairs == [("hello", "You said hello.")]
+
+
+def test_async_continue_chat_prepends_the_system_prompt(chat_solver, chat_server):
+    solver = chat_solver()
+    answer = run(solver.async_continue_chat([{"role": "user", "content": "hi"}], session_id="s"))
+    assert answer == "You said hi."
+    assert chat_server.payloads[0]["messages"][0] == {"role": "system", "content": "sys"}
+    assert list(solver.sessions.get("s")) == [("hi", "You said hi.")]
+
+
+def test_async_stream_utterances(chat_solver, chat_server):
+    chat_server.answer = lambda query: "Hello there. How are you today?"
+    solver = chat_solver()
+    assert run(collect(solver.async_stream_utterances("hi"))) == ["Hello there.", "How are you today?"]
+    assert solver.qa_pairs == [("hi", "Hello there. How are you today?")]
+    # the history of the session is sent with the next request
+    run(collect(solver.async_stream_utterances("and then?")))
+    assert [m["content"] for m in chat_server.payloads[-1]["messages"]] == \
+           ["sys", "hi", "Hello there. How are you today?", "and then?"]
+
+
+def test_requests_run_concurrently_on_one_loop(chat_solver, chat_server):
+    chat_server.delay = 0.2
+    solver = chat_solver()
+
+    async def ask_all():
+        return await asyncio.gather(*[solver.async_get_spoken_answer(f"q{i}", session_id=f"s{i}")
+                                      for i in range(10)])
+
+    start = time.monotonic()
+    assert run(ask_all()) == [f"You said q{i}." for i in range(10)]
+    assert time.monotonic() - start < 1
+
+
+def test_async_timeout(chat_solver, chat_server):
+    chat_server.delay = 1
+    solver = chat_solver()
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        run(solver.async_get_spoken_answer("hi", timeout=0.05))
+    assert time.monotonic() - start < 0.5
+    assert solver.qa_pairs == []
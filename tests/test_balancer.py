@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from ovos_solver_openai_persona.balancer import Endpoint, EndpointError, LoadBalancer
+from ovos_solver_openai_persona.transport import AsyncReplayResponse, Exchange, ReplayResponse, Transport
+
+
+class Servers(Transport):
+    """ answers every request to an api_url with the status set for it, optionally after a delay """
+
+    def __init__(self, **statuses):
+        self.statuses = {f"http://{name}": status for name, status in statuses.items()}
+        self.delays = {}
+        self.calls = []
+        self.responses = {}
+        self.cancelled = []
+        self.release = threading.Event()
+
+    def _response(self, api_url, cls):
+        self.calls.append(api_url[len("http://"):])
+        r = cls(Exchange("", "/p", self.statuses[api_url], {}, chunks=[(0, b"ok")]))
+        self.responses[api_url] = r
+        return r
+
+    def post(self, api_url, path, payload, headers, config=None, timeout=None):
+        if api_url in self.delays:
+            self.release.wait(self.delays[api_url])
+        return self._response(api_url, ReplayResponse)
+
+    async def async_post(self, api_url, path, payload, headers, config=None, timeout=None):
+        try:
+            await asyncio.sleep(self.delays.get(api_url, 0))
+        except asyncio.CancelledError:
+            self.cancelled.append(api_url[len("http://"):])
+            raise
+        return self._response(api_url, AsyncReplayResponse)
+
+
+def balancer_for(servers, *names, **kwargs):
+    # routing by weight only, the first name is always preferred while healthy
+    endpoints = [Endpoint(f"http://{name}", "key", "m", weight=len(names) - idx) for idx, name in enumerate(names)]
+    return LoadBalancer(endpoints, routing="in_flight", transport=servers, **kwargs)
+
+
+def post(balancer):
+    with balancer.post("/chat/completions", {}) as (ep, r, chunks):
+        return ep.api_url[len("http://"):], r.status_code, b"".join(chunks)
+
+
+def test_failover_order():
+    servers = Servers(a=503, b=429, c=200)
+    balancer = balancer_for(servers, "a", "b", "c")
+    assert post(balancer) == ("c", 200, b"ok")
+    assert servers.calls == ["a", "b", "c"]
+    assert [ep.failures for ep in balancer.endpoints] == [1, 1, 0]
+    assert all(ep.in_flight == 0 for ep in balancer.endpoints)
+
+
+def test_every_endpoint_failing_raises_the_last_error():
+    servers = Servers(a=503, b=502)
+    with pytest.raises(EndpointError) as e:
+        post(balancer_for(servers, "a", "b"))
+    assert e.value.status == 502
+    assert servers.calls == ["a", "b"]
+
+
+def test_circuit_breaker_opens_and_half_opens():
+    servers = Servers(a=503, b=200)
+    balancer = balancer_for(servers, "a", "b", breaker_failures=2, breaker_cooldown=0.1)
+    a = balancer.endpoints[0]
+    for _ in range(3):
+        assert post(balancer)[0] == "b"
+    # a is skipped once its breaker opened
+    assert servers.calls == ["a", "b", "a", "b", "b"]
+    assert a.open_until > time.monotonic()
+
+    # half open, a single request probes the endpoint, a failure opens the breaker again right away
+    time.sleep(0.1)
+    servers.calls.clear()
+    assert post(balancer)[0] == "b"
+    assert post(balancer)[0] == "b"
+    assert servers.calls == ["a", "b", "b"]
+
+    # a successful probe closes the breaker
+    time.sleep(0.1)
+    servers.statuses["http://a"] = 200
+    assert post(balancer)[0] == "a"
+    assert (a.failures, a.open_until) == (0, 0)
+
+
+def test_open_breakers_fail_over_to_the_closest_to_cooling_down():
+    servers = Servers(a=200, b=200)
+    balancer = balancer_for(servers, "a", "b")
+    a, b = balancer.endpoints
+    a.open_until = time.monotonic() + 60
+    b.open_until = time.monotonic() + 30
+    assert post(balancer)[0] == "b"
+
+
+def test_hedge_releases_the_slower_request():
+    servers = Servers(a=200, b=200)
+    servers.delays["http://a"] = 1
+    balancer = balancer_for(servers, "a", "b", hedge_after=0.05)
+    start = time.monotonic()
+    assert post(balancer) == ("b", 200, b"ok")
+    assert time.monotonic() - start < 0.5
+    # the losing request is closed as soon as it answers, without blocking the caller
+    servers.release.set()
+    deadline = time.monotonic() + 1
+    while balancer.endpoints[0].in_flight:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+    assert servers.responses["http://a"]._closed.is_set()
+    assert servers.calls == ["b", "a"]
+
+
+def test_async_hedge_cancels_the_slower_request():
+    servers = Servers(a=200, b=200)
+    servers.delays["http://a"] = 1
+    balancer = balancer_for(servers, "a", "b", hedge_after=0.05)
+
+    async def request():
+        async with balancer.async_post("/chat/completions", {}) as (ep, r, chunks):
+            return ep.api_url, r.status, b"".join([c async for c in chunks])
+
+    start = time.monotonic()
+    assert asyncio.run(request()) == ("http://b", 200, b"ok")
+    assert time.monotonic() - start < 0.5
+    assert servers.cancelled == ["a"]
+    assert all(ep.in_flight == 0 for ep in balancer.endpoints)
+
+
+@pytest.mark.parametrize("status,requests", [(500, 3), (503, 3), (429, 3), (400, 1), (404, 1)])
+def test_retries_on_server_errors_only(status, requests):
+    servers = Servers(a=status)
+    balancer = balancer_for(servers, "a", retries=2, retry_backoff=0.01, breaker_failures=10)
+    if status >= 500 or status == 429:
+        with pytest.raises(EndpointError):
+            post(balancer)
+    else:
+        # client errors are the caller's to handle, the same request would fail again anywhere
+        assert post(balancer)[1] == status
+    assert len(servers.calls) == requests
@@ -0,0 +1,78 @@
+import threading
+import time
+
+from requests import ConnectionError
+
+from ovos_solver_openai_persona.batch import run_batch, run_grouped_batch
+
+
+def test_results_keep_the_order_of_items():
+    def answer(item):
+        time.sleep(0.01 * (5 - item))  # the first items finish last
+        return str(item)
+
+    results = run_batch(answer, range(5), max_workers=5)
+    assert [r.answer for r in results] == ["0", "1", "2", "3", "4"]
+    assert [r.index for r in results] == list(range(5))
+
+
+def test_failures_are_isolated():
+    def answer(item):
+        if item == 1:
+            raise ValueError("bad item")
+        return str(item)
+
+    results = run_batch(answer, range(3))
+    assert [r.ok for r in results] == [True, False, True]
+    assert isinstance(results[1].error, ValueError) and results[1].answer is None
+
+
+def test_max_workers_and_progress():
+    running, peak = [0], [0]
+    lock = threading.Lock()
+    progress = []
+
+    def answer(item):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        return str(item)
+
+    run_batch(answer, range(10), max_workers=3, progress=lambda done, total, r: progress.append((done, total)))
+    assert 1 < peak[0] <= 3
+    assert progress == [(i, 10) for i in range(1, 11)]
+
+
+def test_failed_group_is_retried_item_by_item():
+    def answer_group(group):
+        if "bad" in group:
+            raise ValueError("the whole request failed")
+        return [item.upper() for item in group]
+
+    def answer_one(item):
+        if item == "bad":
+            raise ValueError("bad item")
+        return item.upper()
+
+    results = run_grouped_batch(answer_group, ["a", "b", "bad", "c"], group_size=2, fallback=answer_one)
+    assert [r.answer for r in results] == ["A", "B", None, "C"]
+    assert not results[2].ok
+
+
+def test_solver_batch(chat_solver, chat_server):
+    def answer(query):
+        if query == "bad":
+            raise ConnectionError("connection refused")
+        return f"You said {query}."
+
+    chat_server.answer = answer
+    solver = chat_solver()
+    results = solver.get_spoken_answers(["one", "bad", "three"], max_workers=2)
+    assert [r.answer for r in results] == ["You said one.", None, "You said three."]
+    assert isinstance(results[1].error, ConnectionError)
+    # every query is answered on its own, memory is neither read nor updated
+    assert all(len(p["messages"]) == 2 for p in chat_server.payloads)
+    assert solver.qa_pairs == []
@@ -0,0 +1,87 @@
+from ovos_solver_openai_persona.cache import ResponseCache, cache_key
+
+
+def payload(query, system="sys", **kwargs):
+    return {"model": "m", "temperature": 0,
+            "messages": [{"role": "system", "content": system}, {"role": "user", "content": query}],
+            **kwargs}
+
+
+def test_key_ignores_whitespace_and_streaming():
+    assert cache_key(payload("what  is\nthe time ")) == cache_key(payload("what is the time", stream=True))
+
+
+def test_key_keeps_case_and_content():
+    assert cache_key(payload("Mark")) != cache_key(payload("mark"))
+    assert cache_key(payload("a")) != cache_key(payload("a", system="other"))
+    assert cache_key(payload("a")) != cache_key(payload("a", model="other"))
+
+
+def test_disabled_by_default():
+    assert ResponseCache.from_config({}, "http://localhost", "key") is None
+    assert isinstance(ResponseCache.from_config({"response_cache": {"enabled": True}},
+                                                "http://localhost", "key"), ResponseCache)
+
+
+def test_should_cache_by_temperature():
+    cache = ResponseCache(max_temperature=0.2)
+    assert cache.should_cache(payload("q"))
+    assert not cache.should_cache(payload("q", temperature=0.7))
+    assert not cache.should_cache({"messages": []})  # the API default is 1
+    assert ResponseCache(always=True).should_cache(payload("q", temperature=1.5))
+
+
+def test_put_get():
+    cache = ResponseCache()
+    assert cache.get(payload("q")) is None
+    cache.put(payload("q"), "answer")
+    assert cache.get(payload(" q ")) == "answer"
+    cache.clear()
+    assert cache.get(payload("q")) is None
+
+
+def test_lru_eviction():
+    cache = ResponseCache(max_entries=2)
+    cache.put(payload("a"), "A")
+    cache.put(payload("b"), "B")
+    cache.get(payload("a"))
+    cache.put(payload("c"), "C")
+    assert cache.get(payload("b")) is None
+    assert cache.get(payload("a")) == "A"
+    assert cache.get(payload("c")) == "C"
+
+
+def test_ttl(clock):
+    clock.patch("ovos_solver_openai_persona.cache")
+    cache = ResponseCache(ttl=10)
+    cache.put(payload("q"), "answer")
+    clock.now += 9
+    assert cache.get(payload("q")) == "answer"
+    clock.now += 2
+    assert cache.get(payload("q")) is None
+
+
+def test_sqlite_persistence(tmp_path):
+    path = str(tmp_path / "cache" / "responses.db")
+    ResponseCache(path=path).put(payload("q"), "answer")
+    assert ResponseCache(path=path).get(payload("q")) == "answer"
+
+
+def test_similar_queries():
+    vectors = {"what time is it": [1.0, 0.0], "what's the time": [0.99, 0.1], "weather": [0.0, 1.0]}
+    cache = ResponseCache(embedder=vectors.get)
+    cache.put(payload("what time is it"), "noon")
+    assert cache.get(payload("what's the time")) == "noon"
+    assert cache.get(payload("weather")) is None
+    # only the last user message may differ
+    assert cache.get(payload("what's the time", system="other")) is None
+
+
+def test_embedder_failure_is_a_miss():
+    def embedder(text):
+        raise ConnectionError("offline")
+
+    cache = ResponseCache(embedder=embedder)
+    cache.put(payload("q"), "answer")
+    assert cache.get(payload("q")) == "answer"
+    assert cache.get(payload("other")) is None
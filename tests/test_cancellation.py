@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+from requests import RequestException
+
+from ovos_solver_openai_persona.cancellation import CancellationToken, DeadlineExceeded, RequestCancelled, \
+    get_cancel_token
+
+
+def test_cancel():
+    token = CancellationToken()
+    assert not token.cancelled
+    assert token.remaining() is None
+    token.cancel()
+    assert token.cancelled
+    with pytest.raises(RequestCancelled):
+        token.raise_if_cancelled()
+
+
+def test_cancelled_is_a_request_exception():
+    # callers already handling requests errors handle cancellation too
+    assert issubclass(DeadlineExceeded, RequestException)
+
+
+def test_deadline():
+    token = CancellationToken(timeout=0.05)
+    assert 0 < token.remaining() <= 0.05
+    assert not token.cancelled
+    time.sleep(0.06)
+    assert token.cancelled
+    assert token.remaining() == 0
+    with pytest.raises(DeadlineExceeded):
+        token.raise_if_cancelled()
+
+
+def test_first_reason_wins():
+    token = CancellationToken()
+    token.cancel(DeadlineExceeded("late"))
+    token.cancel(RequestCancelled("barge in"))
+    assert isinstance(token.error, DeadlineExceeded)
+
+
+def test_callbacks():
+    token = CancellationToken()
+    calls = []
+    token.on_cancel(lambda: calls.append("a"))
+    unregister = token.on_cancel(lambda: calls.append("b"))
+    unregister()
+    token.cancel()
+    token.cancel()
+    assert calls == ["a"]
+    # registering on a cancelled token runs the callback right away
+    token.on_cancel(lambda: calls.append("c"))
+    assert calls == ["a", "c"]
+
+
+def test_failing_callback_does_not_stop_the_others():
+    token = CancellationToken()
+    calls = []
+    token.on_cancel(lambda: 1 / 0)
+    token.on_cancel(lambda: calls.append("ok"))
+    token.cancel()
+    assert calls == ["ok"]
+
+
+def test_watchdog_runs_callbacks_at_deadline():
+    token = CancellationToken(timeout=0.05)
+    fired = threading.Event()
+    token.on_cancel(fired.set)
+    # nobody polls the token, a blocked read must still be interrupted
+    assert fired.wait(1)
+    assert isinstance(token.error, DeadlineExceeded)
+
+
+def test_wait():
+    token = CancellationToken()
+    assert not token.wait(0.01)
+    threading.Timer(0.02, token.cancel).start()
+    assert token.wait(1)
+    assert CancellationToken(timeout=0.02).wait(1)
+
+
+def test_child_follows_parent():
+    parent = CancellationToken()
+    child = parent.child()
+    fired = threading.Event()
+    child.on_cancel(fired.set)
+    parent.cancel(RequestCancelled("stop"))
+    assert fired.is_set()
+    assert child.cancelled
+    assert str(child.error) == "stop"
+
+
+def test_child_does_not_cancel_parent():
+    parent = CancellationToken()
+    parent.child().cancel()
+    assert not parent.cancelled
+
+
+def test_child_never_outlives_parent_deadline():
+    parent = CancellationToken(timeout=1)
+    assert parent.child(timeout=10).deadline == parent.deadline
+    assert parent.child(timeout=0.5).deadline < parent.deadline
+
+
+def test_get_cancel_token():
+    assert get_cancel_token() is None
+    token = CancellationToken()
+    assert get_cancel_token(token) is token
+    assert get_cancel_token(timeout=5).deadline is not None
+    child = get_cancel_token(token, timeout=5)
+    assert child.parent is token and child.deadline is not None
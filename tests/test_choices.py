@@ -0,0 +1,60 @@
+from ovos_solver_openai_persona.choices import Choice, Completion, first, get_reranker, shortest, tts_length
+
+CANDIDATES = [("Paris is the capital of France, a city of about two million people.", "stop"),
+              ("Paris.", "length"),
+              ("It is Paris.", "stop")]
+
+
+def choices(*texts):
+    return [Choice(i, text, reason) for i, (text, reason) in enumerate(texts)]
+
+
+def test_completion_from_response():
+    response = {"choices": [{"index": 1, "message": {"content": "b"}, "finish_reason": "length"},
+                            {"index": 0, "message": {"content": None}, "finish_reason": "stop"}],
+                "usage": {"total_tokens": 3}, "model": "m"}
+    completion = Completion.from_response(response)
+    assert completion.texts == ["", "b"]
+    assert completion.choices[1].truncated
+    assert (completion.usage, completion.model) == ({"total_tokens": 3}, "m")
+
+
+def test_rerankers():
+    candidates = choices(*CANDIDATES)
+    assert first("q", candidates).text == CANDIDATES[0][0]
+    # a truncated answer is shorter but not complete
+    assert shortest("q", candidates).text == "It is Paris."
+    assert shortest("q", candidates[1:2]).text == "Paris."
+    assert tts_length(60)("q", candidates).text == CANDIDATES[0][0]
+
+
+def test_get_reranker():
+    assert get_reranker(None) is first
+    assert get_reranker("unknown") is first
+    assert get_reranker("shortest") is shortest
+    assert get_reranker("tts_length", {"tts_target_chars": 10})("q", choices(*CANDIDATES)).text == "It is Paris."
+    custom = lambda query, candidates: candidates[-1]
+    assert get_reranker(custom) is custom
+
+
+def test_solver_speaks_the_reranked_choice(chat_solver, chat_server):
+    chat_server.answer = lambda query: CANDIDATES
+    solver = chat_solver(n=3, reranker="shortest")
+    assert solver.get_spoken_answer("what is the capital of France") == "It is Paris."
+    assert chat_server.payloads[0]["n"] == 3
+    assert solver.qa_pairs == [("what is the capital of France", "It is Paris.")]
+
+
+def test_invalid_choices_are_not_picked(chat_solver, chat_server):
+    chat_server.answer = lambda query: [("___", "stop"), ("A short answer.", "stop"), ("", "stop")]
+    assert chat_solver(n=3, reranker="shortest").get_spoken_answer("hi") == "A short answer."
+
+
+def test_get_completions_returns_every_choice(chat_solver, chat_server):
+    chat_server.answer = lambda query: CANDIDATES
+    solver = chat_solver()
+    completion = solver.get_completions("what is the capital of France", n=3)
+    assert completion.texts == [text for text, _ in CANDIDATES]
+    assert completion.usage["completion_tokens"] == 17
+    # candidates are samples, they are not remembered
+    assert solver.qa_pairs == []
@@ -0,0 +1,116 @@
+import threading
+import time
+
+import pytest
+from requests import ConnectionError
+
+from ovos_solver_openai_persona.dialog_transformers import OpenAIDialogTransformer
+
+
+def pirate(query):
+    return "Arr, " + query.split(" : ", 1)[1]
+
+
+@pytest.fixture
+def make_transformer(chat_server, tmp_path):
+    chat_server.answer = pirate
+    transformers = []
+
+    def make(**config):
+        transformer = OpenAIDialogTransformer(config={
+            "key": "sk-test", "api_url": "http://chat.invalid/v1", "rate_limit": {"enabled": False},
+            "rewrite_prompt": "talk like a pirate", "rewrite_cache": {"path": str(tmp_path / "rewrites.db")},
+            **config})
+        transformer.solver.balancer.transport = chat_server
+        transformers.append(transformer)
+        return transformer
+
+    yield make
+    for transformer in transformers:
+        transformer.default_shutdown()
+
+
+def test_transform(make_transformer, chat_server):
+    transformer = make_transformer()
+    assert transformer.transform("hello there") == ("Arr, hello there", {})
+    # the rewrite cache answers the second time
+    assert transformer.transform("hello there")[0] == "Arr, hello there"
+    assert len(chat_server.payloads) == 1
+    # no prompt, nothing to rewrite
+    assert make_transformer(rewrite_prompt=None).transform("hello") == ("hello", {})
+
+
+def test_failed_rewrite_speaks_the_original(make_transformer, chat_server):
+    def fail(query):
+        raise ConnectionError("connection refused")
+
+    chat_server.answer = fail
+    assert make_transformer().transform("hello there")[0] == "hello there"
+
+
+def test_latency_budget_overrun_speaks_the_original(make_transformer, chat_server):
+    chat_server.delay = 0.3
+    transformer = make_transformer(latency_budget=50)
+    start = time.monotonic()
+    assert transformer.transform("hello there")[0] == "hello there"
+    assert time.monotonic() - start < 0.2
+    # the rewrite goes on in the background and fills the cache for the next time
+    assert transformer.submit("hello there", "talk like a pirate").result(1) == "Arr, hello there"
+    start = time.monotonic()
+    assert transformer.transform("hello there")[0] == "Arr, hello there"
+    assert time.monotonic() - start < 0.2
+    assert len(chat_server.payloads) == 1
+
+
+def test_worker_pool(make_transformer, chat_server):
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def slow_pirate(query):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        return pirate(query)
+
+    chat_server.answer = slow_pirate
+    transformer = make_transformer(rewrite_workers=2)
+    dialogs = ["one", "two", "three", "four", "one"]
+    futures = [transformer.submit(d, "talk like a pirate") for d in dialogs]
+    # a dialog queued twice is only rewritten once
+    assert futures[0] is futures[4]
+    assert [f.result(1) for f in futures] == ["Arr, one", "Arr, two", "Arr, three", "Arr, four", "Arr, one"]
+    assert len(chat_server.payloads) == 4
+    assert peak[0] <= 2
+
+
+def test_stream_transform(make_transformer, chat_server):
+    chat_server.answer = lambda query: "Ahoy! " + pirate(query)
+    transformer = make_transformer()
+    assert list(transformer.stream_transform("hello there")) == ["Ahoy!", "Arr, hello there"]
+    assert chat_server.payloads[0]["stream"]
+    # a rewrite read to the end is cached, and split the same way the next time
+    assert list(transformer.stream_transform("hello there")) == ["Ahoy!", "Arr, hello there"]
+    assert len(chat_server.payloads) == 1
+    assert list(make_transformer(rewrite_prompt=None).stream_transform("hello")) == ["hello"]
+
+
+def test_stream_transform_failure_speaks_the_original(make_transformer, chat_server):
+    def fail(query):
+        raise ConnectionError("connection refused")
+
+    chat_server.answer = fail
+    assert list(make_transformer().stream_transform("hello there")) == ["hello there"]
+
+
+def test_rewrites_are_cached_per_language(make_transformer, chat_server):
+    transformer = make_transformer()
+    assert transformer.warmup(["hello there", "hello there"], lang="pt-pt") == 1
+    assert transformer.transform("hello there", {"lang": "pt-pt"})[0] == "Arr, hello there"
+    assert len(chat_server.payloads) == 1
+    # a warm up in another language is no help
+    assert transformer.transform("hello there", {"lang": "en-us"})[0] == "Arr, hello there"
+    assert len(chat_server.payloads) == 2
+    assert transformer.warmup(["hello there"], lang="en-us") == 0
@@ -0,0 +1,132 @@
+import asyncio
+import json
+
+import pytest
+from requests import ConnectionError
+
+from ovos_solver_openai_persona.engines import OpenAIChatCompletionsSolver
+from ovos_solver_openai_persona.transport import AsyncReplayResponse, Exchange, ReplayResponse, Transport
+
+CONFIG = {"key": "sk-test", "api_url": "http://engines.invalid/v1", "system_prompt": "sys",
+          "rate_limit": {"enabled": False}, "single_flight": False}
+
+
+def event(data):
+    return f"data: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+def text_events(*texts):
+    return [event({"choices": [{"delta": {"content": t}, "finish_reason": None}]}) for t in texts]
+
+
+DONE = [event({"choices": [{"delta": {}, "finish_reason": "stop"}]}), b"data: [DONE]\n\n"]
+PARTIAL = text_events("Hello there. ", "How are you? ", "I can be in many states at")
+
+
+class Disconnect(Exception):
+    """ marks where the scripted body drops the connection """
+
+
+class _Cut:
+    def _chunks(self):
+        for _, chunk in self.exchange.chunks:
+            if chunk is Disconnect:
+                raise ConnectionError("connection dropped mid stream")
+            yield chunk
+
+
+class CutResponse(_Cut, ReplayResponse):
+    def iter_content(self, chunk_size=None):
+        return self._chunks()
+
+
+class AsyncCutResponse(_Cut, AsyncReplayResponse):
+    async def iter_any(self):
+        for chunk in self._chunks():
+            yield chunk
+
+
+class ScriptedServer(Transport):
+    """ answers every streaming request with the same body, Disconnect drops the connection """
+
+    def __init__(self, *chunks):
+        self.chunks = [(0.0, c) for c in chunks]
+        self.requests = 0
+
+    def _exchange(self, path):
+        self.requests += 1
+        return Exchange("", path, 200, {"Content-Type": "text/event-stream"}, chunks=self.chunks)
+
+    def post(self, api_url, path, payload, headers, config=None, timeout=None):
+        return CutResponse(self._exchange(path))
+
+    async def async_post(self, api_url, path, payload, headers, config=None, timeout=None):
+        return AsyncCutResponse(self._exchange(path))
+
+
+def solver_with(transport, **config):
+    solver = OpenAIChatCompletionsSolver({**CONFIG, **config})
+    solver.balancer.transport = transport
+    return solver
+
+
+def async_utterances(solver, query):
+    async def collect():
+        return [utt async for utt in solver.async_stream_utterances(query)]
+
+    return asyncio.run(collect())
+
+
+def test_complete_stream_is_spoken_and_remembered():
+    solver = solver_with(ScriptedServer(*PARTIAL[:2], *DONE))
+    assert list(solver.stream_utterances("hi")) == ["Hello there.", "How are you?"]
+    assert solver.qa_pairs == [("hi", "Hello there. How are you?")]
+
+
+@pytest.mark.parametrize("failure", [Disconnect, event({"error": {"message": "overloaded"}})],
+                         ids=["disconnect", "error event"])
+def test_stream_failing_partway_drops_the_unfinished_sentence(failure):
+    server = ScriptedServer(*PARTIAL, failure)
+    solver = solver_with(server)
+    assert list(solver.stream_utterances("hi")) == ["Hello there.", "How are you?"]
+    assert async_utterances(solver, "hi") == ["Hello there.", "How are you?"]
+    # a failed answer is not remembered, and text already spoken is not requested again
+    assert solver.qa_pairs == []
+    assert server.requests == 2
+
+
+def test_shared_stream_failing_partway():
+    solver = solver_with(ScriptedServer(*PARTIAL, Disconnect), single_flight=True)
+    assert list(solver.stream_utterances("hi")) == ["Hello there.", "How are you?"]
+    assert solver.qa_pairs == []
+
+
+def test_stream_failing_before_any_text_is_retried():
+    class FailOnce(ScriptedServer):
+        def post(self, *args, **kwargs):
+            r = super().post(*args, **kwargs)
+            if self.requests == 1:
+                r.exchange = Exchange("", "", 200, {"Content-Type": "text/event-stream"},
+                                      chunks=[(0.0, event({"error": {"message": "overloaded"}}))])
+            return r
+
+    server = FailOnce(*PARTIAL[:2], *DONE)
+    solver = solver_with(server, rate_limit={"enabled": True, "retries": 1})
+    assert list(solver.stream_utterances("hi")) == ["Hello there.", "How are you?"]
+    assert server.requests == 2
+
+
+def test_prefetched_stream_failing_partway():
+    solver = solver_with(ScriptedServer(*PARTIAL, Disconnect))
+    assert solver.prefetch("what time is it")
+    assert list(solver.stream_utterances("what time is it")) == ["Hello there.", "How are you?"]
+    assert solver.prefetcher.stats.hits == 1
+    assert solver.qa_pairs == []
+
+
+def test_reading_qa_pairs_does_not_create_a_session():
+    solver = solver_with(ScriptedServer())
+    assert solver.qa_pairs == []
+    assert len(solver.sessions) == 0
+    solver.qa_pairs = [("q", "a")]
+    assert solver.qa_pairs == [("q", "a")]
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(HERE, "..", "benchmarks"))
+
+import bench_import  # noqa: E402
+
+
+# timings are left to bench_import.py, they are too noisy to fail a test run on
+@pytest.mark.parametrize("name,target", sorted(bench_import.entry_points().items()))
+def test_no_forbidden_imports(name, target):
+    modules = bench_import.load_once(target)["modules"]
+    assert bench_import.forbidden_imports(name, modules) == []
@@ -0,0 +1,148 @@
+from ovos_solver_openai_persona.memory import ChatMemory, SessionMemory, estimate_tokens, get_tokenizer
+
+
+def words(text):
+    return len(text.split())
+
+
+def history(*pairs, system="sys"):
+    messages = [{"role": "system", "content": system}]
+    for q, a in pairs:
+        messages += [{"role": "user", "content": q}, {"role": "assistant", "content": a}]
+    return messages
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 1
+    assert estimate_tokens("a" * 40) == 11
+
+
+def test_unknown_tokenizer_falls_back_to_estimate():
+    assert get_tokenizer() is estimate_tokens
+    assert get_tokenizer("whatever") is estimate_tokens
+
+
+def test_keeps_last_exchanges_in_order():
+    mem = ChatMemory(max_utts=2)
+    for i in range(3):
+        mem.append(f"q{i}", f"a{i}")
+    assert list(mem) == [("q1", "a1"), ("q2", "a2")]
+    assert mem.get_chat_history("sys") == history(("q1", "a1"), ("q2", "a2"))
+
+
+def test_disabled_memory():
+    mem = ChatMemory(max_utts=0)
+    mem.append("q", "a")
+    assert len(mem) == 0
+    assert mem.get_chat_history("sys") == history()
+
+
+def test_token_budget():
+    mem = ChatMemory(max_utts=10, max_tokens=5, tokenizer=words)
+    mem.append("one two", "three")
+    mem.append("four", "five")
+    assert mem.tokens == 5
+    mem.append("six", "seven")
+    assert list(mem) == [("four", "five"), ("six", "seven")]
+    assert mem.tokens == 4
+
+
+def test_exchange_over_token_budget_is_dropped():
+    mem = ChatMemory(max_utts=10, max_tokens=3, tokenizer=words)
+    mem.append("a b", "c d")
+    assert len(mem) == 0
+    assert mem.tokens == 0
+
+
+def test_evict_batch():
+    mem = ChatMemory(max_utts=3, evict_batch=2)
+    for i in range(4):
+        mem.append(f"q{i}", f"a{i}")
+    assert list(mem) == [("q2", "a2"), ("q3", "a3")]
+
+
+def test_history_follows_appends_and_evictions():
+    mem = ChatMemory(max_utts=2)
+    mem.append("q0", "a0")
+    assert mem.get_chat_history("sys") == history(("q0", "a0"))
+    mem.append("q1", "a1")
+    assert mem.get_chat_history("sys") == history(("q0", "a0"), ("q1", "a1"))
+    mem.append("q2", "a2")
+    assert mem.get_chat_history("sys") == history(("q1", "a1"), ("q2", "a2"))
+    assert mem.get_chat_history("other") == history(("q1", "a1"), ("q2", "a2"), system="other")
+    mem.clear()
+    assert mem.get_chat_history("sys") == history()
+
+
+def test_history_is_a_copy():
+    mem = ChatMemory()
+    mem.append("q", "a")
+    messages = mem.get_chat_history("sys")
+    # solvers translate messages in place
+    messages[1]["content"] = "translated"
+    messages.append({"role": "user", "content": "next"})
+    assert mem.get_chat_history("sys") == history(("q", "a"))
+
+
+def test_sessions_do_not_mix():
+    mem = SessionMemory()
+    mem.append("a", "qa", "aa")
+    mem.append("b", "qb", "ab")
+    assert mem.get_chat_history("a", "sys") == history(("qa", "aa"))
+    assert mem.get_chat_history("b", "sys") == history(("qb", "ab"))
+    assert mem.get_chat_history("unknown", "sys") == history()
+    assert "unknown" not in mem
+
+
+def test_max_sessions_evicts_least_recently_used():
+    mem = SessionMemory(max_sessions=2)
+    mem.append("a", "q", "a")
+    mem.append("b", "q", "a")
+    mem.get_chat_history("a", "sys")  # a is used again, b is now the oldest
+    mem.append("c", "q", "a")
+    assert "a" in mem and "c" in mem and "b" not in mem
+
+
+def test_session_ttl(clock):
+    clock.patch("ovos_solver_openai_persona.memory")
+    mem = SessionMemory(session_ttl=10)
+    mem.append("a", "q", "a")
+    clock.now += 5
+    mem.append("b", "q", "a")
+    clock.now += 7
+    mem.get_chat_history("b", "sys")
+    assert "a" not in mem and "b" in mem
+    assert mem.tokens == estimate_tokens("q") + estimate_tokens("a")
+
+
+def test_total_token_budget():
+    mem = SessionMemory(max_tokens=10, max_total_tokens=5, tokenizer=words)
+    mem.append("a", "one two", "three")
+    mem.append("b", "four", "five")
+    assert mem.tokens == 5
+    mem.append("c", "six", "seven")
+    assert "a" not in mem
+    assert mem.tokens == 4
+    # the session being written to is never evicted
+    mem.append("c", "a b c d", "e f")
+    assert len(mem) == 1
+    assert mem.tokens == 8
+
+
+def test_clear():
+    mem = SessionMemory()
+    mem.append("a", "q", "a")
+    mem.append("b", "q", "a")
+    mem.clear("a")
+    assert len(mem) == 1
+    mem.clear()
+    assert len(mem) == 0
+    assert mem.tokens == 0
+
+
+def test_qa_pairs_does_not_create_the_session():
+    mem = SessionMemory()
+    assert mem.qa_pairs("a") == []
+    assert "a" not in mem
+    mem.append("a", "q", "a")
+    assert mem.qa_pairs("a") == [("q", "a")]
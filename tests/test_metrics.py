@@ -0,0 +1,96 @@
+import json
+import urllib.request
+
+import pytest
+from requests import ConnectionError
+
+from ovos_solver_openai_persona.metrics import Histogram, MetricsRegistry, RequestMetrics, add_metrics_hook, \
+    remove_metrics_hook, serve_metrics, start_request
+
+
+@pytest.fixture
+def recorded():
+    """ the metrics of every request finished during the test """
+    finished = []
+    add_metrics_hook(finished.append)
+    yield finished
+    remove_metrics_hook(finished.append)
+
+
+def test_no_hooks_no_metrics():
+    assert start_request("solver") is None
+
+
+def test_request_metrics(chat_solver, recorded):
+    solver = chat_solver()
+    assert solver.get_spoken_answer("what time is it") == "You said what time is it."
+    assert len(recorded) == 1
+    m = recorded[0]
+    assert (m.solver, m.endpoint, m.stream, m.error) == ("OpenAIChatCompletionsSolver", "http://chat.invalid/v1",
+                                                         False, None)
+    assert (m.prompt_tokens, m.completion_tokens) == (5, 6)
+    assert 0 <= m.connect <= m.first_byte <= m.duration
+
+
+def test_stream_metrics(chat_solver, recorded):
+    solver = chat_solver(stream_usage=True)
+    assert list(solver.stream_utterances("hi")) == ["You said hi."]
+    m = recorded[0]
+    assert m.stream and m.chunks == 3
+    assert (m.prompt_tokens, m.completion_tokens) == (2, 3)
+    assert m.first_byte <= m.first_token <= m.duration
+
+
+def test_failed_request_metrics(chat_solver, chat_server, recorded):
+    def fail(query):
+        raise ConnectionError("connection refused")
+
+    chat_server.answer = fail
+    with pytest.raises(ConnectionError):
+        chat_solver().get_spoken_answer("hi")
+    assert recorded[0].error == "ConnectionError"
+
+
+def test_tokens_per_second():
+    m = RequestMetrics("s")
+    m.first_byte, m.duration, m.completion_tokens = 0.5, 1.5, 20
+    assert m.tokens_per_second == 20
+
+
+def test_histogram_quantiles():
+    hist = Histogram([0.1, 1, 10])
+    assert hist.quantile(0.5) is None
+    for value in (0.05, 0.5, 0.5, 5, 50):
+        hist.observe(value)
+    assert (hist.quantile(0.2), hist.quantile(0.5), hist.quantile(0.8), hist.quantile(1)) == (0.1, 1, 10, float("inf"))
+
+
+def finished(solver, duration, **kwargs):
+    m = RequestMetrics(solver)
+    for k, v in kwargs.items():
+        setattr(m, k, v)
+    m.duration = duration
+    return m
+
+
+def test_registry_and_exporter():
+    registry = MetricsRegistry()
+    registry(finished("chat", 0.3, prompt_tokens=10, completion_tokens=5))
+    registry(finished("chat", 2, error="ReadTimeout"))
+    registry(finished("chat", 0.0, cache_hit=True))
+    data = registry.to_json()["chat"]
+    assert (data["requests_total"], data["errors_total"], data["cache_hits_total"]) == (3, 1, 1)
+    assert (data["prompt_tokens_total"], data["completion_tokens_total"]) == (10, 5)
+    # cache hits do not count as fast requests
+    assert data["duration_seconds"]["count"] == 2
+
+    server = serve_metrics(0, registry)
+    try:
+        url = f"http://127.0.0.1:{server.server_port}"
+        text = urllib.request.urlopen(f"{url}/metrics").read().decode()
+        assert 'ovos_openai_requests_total{solver="chat"} 3' in text
+        assert 'ovos_openai_duration_seconds_bucket{solver="chat",le="+Inf"} 2' in text
+        assert json.loads(urllib.request.urlopen(f"{url}/metrics.json").read()) == registry.to_json()
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,98 @@
+import threading
+
+from ovos_solver_openai_persona.prefetch import SpeculativePrefetcher, normalize_transcript
+
+HISTORY = [{"role": "system", "content": "sys"}]
+
+
+def messages(query):
+    return HISTORY + [{"role": "user", "content": query}]
+
+
+class Streams:
+    """ stream factory answering with the query, until released or cancelled """
+
+    def __init__(self):
+        self.started = []
+        self.release = threading.Event()
+
+    def __call__(self, msgs, token):
+        self.started.append(token)
+        return self.generate(msgs[-1]["content"], token)
+
+    def generate(self, query, token):
+        yield "answer to "
+        for _ in range(100):  # the background thread ends with the test
+            if self.release.is_set() or token.wait(0.01):
+                break
+        if not token.cancelled:
+            yield query
+
+
+def test_normalize_transcript():
+    assert normalize_transcript("Um, what's the TIME?") == ["what's", "the", "time"]
+
+
+def test_matching_final_transcript_is_promoted():
+    prefetcher, streams = SpeculativePrefetcher(), Streams()
+    assert prefetcher.start("s", "what time", messages("what time"), streams)
+    assert prefetcher.start("s", "what time is it", messages("what time is it"), streams)
+    # the recognizer repeating itself does not restart the request
+    assert prefetcher.start("s", "What time is it?", messages("What time is it?"), streams)
+    assert len(streams.started) == 2 and streams.started[0].cancelled
+    speculation = prefetcher.claim("s", "uh what time is it", messages("uh what time is it"))
+    assert speculation is not None
+    streams.release.set()
+    assert "".join(speculation.stream()) == "answer to what time is it"
+    assert prefetcher.stats.as_dict()["hits"] == 1
+    assert prefetcher.stats.discarded == 1
+
+
+def test_short_transcripts_are_ignored():
+    prefetcher, streams = SpeculativePrefetcher(min_words=2), Streams()
+    assert not prefetcher.start("s", "um what", messages("um what"), streams)
+    assert not streams.started
+
+
+def test_different_query_or_history_is_a_miss():
+    prefetcher, streams = SpeculativePrefetcher(), Streams()
+    prefetcher.start("s", "what time is it", messages("what time is it"), streams)
+    assert prefetcher.claim("s", "what day is it", messages("what day is it")) is None
+    prefetcher.start("s", "what time is it", messages("what time is it"), streams)
+    changed = [{"role": "system", "content": "other"}, {"role": "user", "content": "what time is it"}]
+    assert prefetcher.claim("s", "what time is it", changed) is None
+    assert all(token.cancelled for token in streams.started)
+    assert prefetcher.stats.misses == 2
+    assert prefetcher.claim("unknown", "what time is it", messages("what time is it")) is None
+
+
+def test_similarity():
+    prefetcher = SpeculativePrefetcher(similarity=0.8)
+    assert prefetcher.matches("what is the time in lisbon", "what is the time in lisbon now")
+    assert not prefetcher.matches("what is the time", "play some music")
+    assert not SpeculativePrefetcher().matches("what is the time in lisbon", "what is the time in lisbon now")
+
+
+def test_expired_speculations(clock):
+    clock.patch("ovos_solver_openai_persona.prefetch")
+    prefetcher, streams = SpeculativePrefetcher(ttl=30), Streams()
+    prefetcher.start("a", "what time is it", messages("what time is it"), streams)
+    clock.now += 31
+    # an expired speculation is never promoted
+    assert prefetcher.claim("a", "what time is it", messages("what time is it")) is None
+    prefetcher.start("b", "what time is it", messages("what time is it"), streams)
+    clock.now += 31
+    # sessions that never send a final transcript are dropped by the next request
+    prefetcher.start("c", "what time is it", messages("what time is it"), streams)
+    assert streams.started[1].cancelled and not streams.started[2].cancelled
+
+
+def test_max_entries_drops_the_oldest():
+    prefetcher, streams = SpeculativePrefetcher(max_entries=2), Streams()
+    prefetcher.start("a", "what time is it", messages("what time is it"), streams)
+    prefetcher.start("b", "what time is it", messages("what time is it"), streams)
+    prefetcher.start("a", "what day is it", messages("what day is it"), streams)  # a is now the newest
+    prefetcher.start("c", "what time is it", messages("what time is it"), streams)
+    assert [t.cancelled for t in streams.started] == [True, True, False, False]
+    assert prefetcher.claim("a", "what day is it", messages("what day is it")) is not None
+    assert prefetcher.stats.discarded == 2
@@ -0,0 +1,247 @@
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+from requests import ConnectionError
+
+from ovos_solver_openai_persona.balancer import Endpoint, EndpointError, LoadBalancer
+from ovos_solver_openai_persona.cancellation import CancellationToken, DeadlineExceeded, RequestCancelled
+from ovos_solver_openai_persona.ratelimit import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, RateLimiter, \
+    TokenBucket, estimate_request_tokens, get_limiter, parse_duration, parse_retry_after
+from ovos_solver_openai_persona.engines import OpenAIChatCompletionsSolver
+from ovos_solver_openai_persona.transport import Exchange, ReplayResponse, Transport
+
+
+@pytest.mark.parametrize("value,seconds", [("1s", 1), ("6m0s", 360), ("20ms", 0.02), ("1h2m", 3720),
+                                           ("0.5", 0.5), ("", None), ("soon", None)])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == seconds
+
+
+def test_parse_retry_after():
+    assert parse_retry_after({"retry-after-ms": "250", "retry-after": "9"}) == 0.25
+    assert parse_retry_after({"retry-after": "2"}) == 2
+    assert parse_retry_after({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0
+    assert parse_retry_after({"retry-after": "garbage"}) is None
+    assert parse_retry_after({}) is None
+
+
+def test_estimate_request_tokens():
+    payload = {"messages": [{"role": "user", "content": "a" * 40}], "max_tokens": 100}
+    assert estimate_request_tokens(payload) == 111
+    assert estimate_request_tokens({"prompt": ["a", "b"], "max_tokens": 10}) == 21
+    assert estimate_request_tokens({}) == 1
+
+
+def test_bucket_unlimited():
+    bucket = TokenBucket()
+    bucket.take(1000)
+    assert bucket.delay(1000, time.monotonic()) == 0
+
+
+def test_bucket_refill():
+    bucket = TokenBucket(60)  # one per second
+    now = bucket.updated
+    bucket.take(60)
+    assert bucket.delay(1, now) == pytest.approx(1)
+    assert bucket.delay(1, now + 0.5) == pytest.approx(0.5)
+    assert bucket.delay(1, now + 1) == 0
+    # a request larger than the bucket waits for a full bucket, not forever
+    assert bucket.delay(1000, now + 1) == pytest.approx(59)
+
+
+def test_bucket_learns_from_headers():
+    bucket = TokenBucket()
+    bucket.sync(limit=600, remaining=0, reset=1, now=bucket.updated)
+    assert bucket.capacity == 600
+    # the server refills in 1s, faster than 600 per minute
+    assert bucket.delay(600, bucket.updated) == pytest.approx(1)
+
+
+def test_configured_bucket_is_a_cap():
+    bucket = TokenBucket(60)
+    bucket.sync(limit=6000, remaining=10, reset=None, now=bucket.updated)
+    assert bucket.capacity == 60
+    assert bucket.level == 10
+    bucket.sync(limit=6000, remaining=5000, reset=None, now=bucket.updated)
+    assert bucket.level == 10
+
+
+def test_acquire_without_limits_does_not_wait():
+    limiter = RateLimiter()
+    start = time.monotonic()
+    for _ in range(100):
+        limiter.acquire(tokens=1000)
+    assert time.monotonic() - start < 0.1
+
+
+def test_requests_per_minute():
+    limiter = RateLimiter(requests_per_minute=600)  # one every 0.1s once the burst is spent
+    limiter.requests.level = 0
+    start = time.monotonic()
+    limiter.acquire()
+    limiter.acquire()
+    assert 0.15 < time.monotonic() - start < 1
+
+
+def test_update_from_headers():
+    limiter = RateLimiter()
+    limiter.update({"x-ratelimit-limit-requests": "60", "x-ratelimit-remaining-requests": "0",
+                    "x-ratelimit-reset-requests": "1s",
+                    "x-ratelimit-limit-tokens": "1000", "x-ratelimit-remaining-tokens": "1000"})
+    assert limiter.requests.capacity == 60
+    # the server bucket is full again in 1s, so the next request slot frees up in 1/60s
+    assert limiter._delay(10) == pytest.approx(1 / 60, abs=0.005)
+
+
+def test_backoff_grows_and_resets():
+    limiter = RateLimiter(backoff_base=1, backoff_max=4)
+    pauses = []
+    for _ in range(4):
+        before = time.monotonic()
+        limiter.paused_until = 0
+        limiter.throttled()
+        pauses.append(limiter.paused_until - before)
+    assert 0.5 <= pauses[0] <= 1.01
+    assert 1 <= pauses[1] <= 2.01
+    assert 2 <= pauses[3] <= 4.01
+    limiter.succeeded()
+    assert limiter.failures == 0
+
+
+def test_retry_after_pauses_everyone():
+    limiter = RateLimiter()
+    limiter.throttled(retry_after=0.1)
+    start = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - start >= 0.09
+
+
+def test_priority_order():
+    limiter = RateLimiter()
+    limiter.throttled(retry_after=0.2)
+    order = []
+
+    def request(name, priority):
+        limiter.acquire(priority=priority)
+        order.append(name)
+
+    background = threading.Thread(target=request, args=("background", PRIORITY_BACKGROUND))
+    background.start()
+    time.sleep(0.05)
+    interactive = threading.Thread(target=request, args=("interactive", PRIORITY_INTERACTIVE))
+    interactive.start()
+    background.join(1)
+    interactive.join(1)
+    assert order == ["interactive", "background"]
+
+
+def test_wait_past_deadline_fails_fast():
+    limiter = RateLimiter()
+    limiter.throttled(retry_after=10)
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        limiter.acquire(cancel=CancellationToken(timeout=1))
+    assert time.monotonic() - start < 0.5
+
+
+def test_cancel_while_waiting():
+    limiter = RateLimiter()
+    limiter.throttled(retry_after=10)
+    token = CancellationToken()
+    threading.Timer(0.05, token.cancel).start()
+    with pytest.raises(RequestCancelled):
+        limiter.acquire(cancel=token)
+    assert not limiter._waiters
+
+
+def test_async_acquire():
+    limiter = RateLimiter()
+    limiter.throttled(retry_after=0.1)
+    start = time.monotonic()
+    asyncio.run(limiter.async_acquire())
+    assert time.monotonic() - start >= 0.09
+    assert not limiter._waiters
+
+
+def test_get_limiter_is_shared_per_account():
+    a = get_limiter("http://test-shared/v1/", "key")
+    assert get_limiter("http://test-shared/v1", "key") is a
+    assert get_limiter("http://test-shared/v1", "other") is not a
+    assert get_limiter("http://test-shared/v1", "key", {"rate_limit": {"enabled": False}}) is None
+
+
+class StatusServer(Transport):
+    """ answers every request with the same status and headers """
+
+    def __init__(self, status, headers=None):
+        self.status = status
+        self.headers = headers or {}
+        self.requests = 0
+
+    def post(self, api_url, path, payload, headers, config=None, timeout=None):
+        self.requests += 1
+        return ReplayResponse(Exchange("", path, self.status, self.headers, chunks=[(0, b"{}")]))
+
+    async def async_post(self, api_url, path, payload, headers, config=None, timeout=None):
+        raise NotImplementedError
+
+
+def unused_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_unreachable_endpoint_fails_fast():
+    # default config, no request_timeout
+    solver = OpenAIChatCompletionsSolver({"key": "sk-test", "api_url": f"http://127.0.0.1:{unused_port()}/v1"})
+    durations = []
+    for _ in range(5):
+        start = time.monotonic()
+        with pytest.raises(ConnectionError):
+            solver.get_spoken_answer("hi")
+        durations.append(time.monotonic() - start)
+    assert list(solver.stream_utterances("hi")) == []
+    # one round of short backoffs, then the open circuit breaker stops the retries
+    assert durations[0] < 2
+    assert max(durations[1:]) < 0.5
+    assert solver.balancer.endpoints[0].limiter.paused_until == 0
+
+
+def test_server_errors_do_not_pause_the_account():
+    balancer = LoadBalancer([Endpoint("http://test-5xx/v1", "key", "m")], retries=2, retry_backoff=0.01,
+                            transport=StatusServer(503))
+    balancer.endpoints[0].limiter = limiter = RateLimiter()
+    with pytest.raises(EndpointError):
+        with balancer.post("/chat/completions", {}):
+            pass
+    assert balancer.transport.requests == 3
+    assert limiter.paused_until == 0
+
+
+def test_throttling_pauses_the_account():
+    limiter = RateLimiter()
+    balancer = LoadBalancer([Endpoint("http://test-429/v1", "key", "m")], retries=0,
+                            transport=StatusServer(429))
+    balancer.endpoints[0].limiter = limiter
+    with pytest.raises(EndpointError):
+        with balancer.post("/chat/completions", {}):
+            pass
+    assert limiter.paused_until > time.monotonic()
+
+
+def test_retry_wait_is_capped():
+    limiter = RateLimiter()
+    balancer = LoadBalancer([Endpoint("http://test-retry-after/v1", "key", "m")], retries=2, max_retry_wait=1,
+                            transport=StatusServer(503, {"Retry-After": "60"}))
+    balancer.endpoints[0].limiter = limiter
+    start = time.monotonic()
+    with pytest.raises(EndpointError):
+        with balancer.post("/chat/completions", {}):
+            pass
+    # the server asked for a minute, longer than the retry budget, give up instead of waiting
+    assert time.monotonic() - start < 0.5
+    assert balancer.transport.requests == 1
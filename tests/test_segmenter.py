@@ -0,0 +1,88 @@
+import json
+import os
+import re
+
+import pytest
+
+from ovos_solver_openai_persona.segmenter import SentenceSegmenter
+from ovos_solver_openai_persona.sse import SSEDecoder, parse_chat_chunk
+
+HERE = os.path.dirname(__file__)
+STREAMS = os.path.join(HERE, "..", "benchmarks", "streams")
+
+with open(os.path.join(HERE, "segmenter_corpus.json")) as f:
+    CORPUS = json.load(f)
+
+
+def segment(chunks, **kwargs):
+    seg = SentenceSegmenter(**kwargs)
+    utts = []
+    for chunk in chunks:
+        utts += seg.feed(chunk)
+    return utts + seg.flush()
+
+
+def load_tokens(name):
+    decoder = SSEDecoder()
+    with open(os.path.join(STREAMS, name), "rb") as f:
+        events = decoder.feed(f.read()) + decoder.flush()
+    tokens = []
+    for event in events:
+        text, done = parse_chat_chunk(event.data)
+        if text:
+            tokens.append(text)
+        if done:
+            break
+    return tokens
+
+
+def first_utterance_token(tokens, **kwargs):
+    """ index of the token that completed the first utterance """
+    seg = SentenceSegmenter(**kwargs)
+    for idx, token in enumerate(tokens):
+        if seg.feed(token):
+            return idx
+    return len(tokens)
+
+
+@pytest.mark.parametrize("case", CORPUS, ids=[c["text"][:30] for c in CORPUS])
+def test_corpus_llm_tokens(case):
+    case = dict(case)
+    text, expected = case.pop("text"), case.pop("expected")
+    # LLM-like tokens, punctuation split from words
+    tokens = re.findall(r"\s?\w+|[^\w\s]+|\s+", text)
+    assert segment(tokens, **case) == expected
+
+
+@pytest.mark.parametrize("step", [1, 3, 7, None])
+@pytest.mark.parametrize("case", CORPUS, ids=[c["text"][:30] for c in CORPUS])
+def test_corpus_chunk_boundaries(case, step):
+    case = dict(case)
+    text, expected = case.pop("text"), case.pop("expected")
+    step = step or len(text)
+    # small uneven chunks to exercise chunk boundaries, boundaries need lookahead here
+    chunks = [text[i:i + step] for i in range(0, len(text), step)]
+    assert segment(chunks, **{**case, "eager": False}) == expected
+
+
+@pytest.mark.parametrize("name", sorted(os.listdir(STREAMS)))
+def test_clause_split_speaks_sooner(name):
+    tokens = load_tokens(name)
+    sentence = first_utterance_token(tokens)
+    clause = first_utterance_token(tokens, comma_split_after=40)
+    assert clause < sentence / 2
+    # the rest of the answer is unchanged
+    assert " ".join(segment(tokens, comma_split_after=40)) == " ".join(segment(tokens))
+
+
+def test_late_closers_after_eager_split():
+    seg = SentenceSegmenter()
+    assert seg.feed('He said "stop.') == ['He said "stop.']
+    # the closing quote belongs to the utterance already returned
+    assert seg.feed('" Then') == []
+    assert seg.flush() == ["Then"]
+    # after a space the next utterance starts, even with a quote or an ellipsis
+    assert seg.feed("He left.") == ["He left."]
+    assert seg.feed(' "Stop!" she said. ') == ['"Stop!"', "she said."]
+    assert seg.feed("Wait.") == ["Wait."]
+    assert seg.feed(" ...and then it ended.") == ["...and then it ended."]
@@ -0,0 +1,175 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ovos_solver_openai_persona.cancellation import CancellationToken, DeadlineExceeded, RequestCancelled
+from ovos_solver_openai_persona.singleflight import SingleFlight, flight_key
+
+
+def wait_for(condition, timeout=1):
+    """ waits for the other threads to reach a point of the test """
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_flight_key():
+    assert flight_key({"a": 1, "b": 2}) == flight_key({"b": 2, "a": 1})
+    assert flight_key({"q": "x", "temperature": 0}) != flight_key({"q": "x", "temperature": 1})
+
+
+def test_concurrent_calls_share_one_request():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def func():
+        calls.append(1)
+        release.wait(1)
+        return "answer"
+
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(flight.do, "k", func) for _ in range(4)]
+        wait_for(lambda: flight.requests + flight.shared == 4)
+        release.set()
+        assert [f.result() for f in futures] == ["answer"] * 4
+    assert len(calls) == 1
+    assert (flight.requests, flight.shared) == (1, 3)
+
+
+def test_sequential_calls_are_not_shared():
+    flight = SingleFlight()
+    assert flight.do("k", lambda: 1) == 1
+    assert flight.do("k", lambda: 2) == 2
+    assert flight.requests == 2
+
+
+def test_error_is_shared():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def func():
+        release.wait(1)
+        raise ValueError("boom")
+
+    with ThreadPoolExecutor(2) as pool:
+        futures = [pool.submit(flight.do, "k", func) for _ in range(2)]
+        wait_for(lambda: flight.requests + flight.shared == 2)
+        release.set()
+        for f in futures:
+            with pytest.raises(ValueError):
+                f.result()
+    assert flight.requests == 1
+
+
+def test_waiters_retry_when_the_leader_is_cancelled():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def cancelled():
+        release.wait(1)
+        raise DeadlineExceeded("leader deadline")
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flight.do, "k", cancelled)
+        wait_for(lambda: flight.requests)
+        waiter = pool.submit(flight.do, "k", lambda: "own answer")
+        wait_for(lambda: flight.shared)
+        release.set()
+        with pytest.raises(DeadlineExceeded):
+            leader.result()
+        assert waiter.result() == "own answer"
+    assert flight.requests == 2
+
+
+def test_waiter_cancel():
+    flight = SingleFlight()
+    release = threading.Event()
+    token = CancellationToken()
+    with ThreadPoolExecutor(1) as pool:
+        leader = pool.submit(flight.do, "k", lambda: release.wait(1))
+        wait_for(lambda: flight.requests)
+        threading.Timer(0.05, token.cancel).start()
+        with pytest.raises(RequestCancelled):
+            flight.do("k", lambda: "unused", cancel=token)
+        release.set()
+        assert leader.result()
+
+
+class Source:
+    """ a streaming request whose chunks are released one by one """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.released = threading.Semaphore(0)
+        self.token = None
+        self.closed = False
+
+    def __call__(self, token):
+        self.token = token
+        return self.generate()
+
+    def generate(self):
+        try:
+            for chunk in self.chunks:
+                self.released.acquire(timeout=1)
+                yield chunk
+        finally:
+            self.closed = True
+
+
+def test_stream_fan_out():
+    flight = SingleFlight()
+    source = Source(["a", "b", "c"])
+    first = flight.stream("k", source)
+    source.released.release()
+    assert next(first) == "a"
+    second = flight.stream("k", source)
+    # a late consumer gets the stream from the start
+    assert next(second) == "a"
+    for _ in range(2):
+        source.released.release()
+    assert list(first) == ["b", "c"]
+    assert list(second) == ["b", "c"]
+    assert (flight.requests, flight.shared) == (1, 1)
+    assert not source.token.cancelled
+    # the stream is over, the next caller sends a new request
+    other = Source(["d"])
+    other.released.release()
+    assert list(flight.stream("k", other)) == ["d"]
+    assert flight.requests == 2
+
+
+def test_stream_cancelled_when_last_consumer_leaves():
+    flight = SingleFlight()
+    source = Source(["a", "b"])
+    first = flight.stream("k", source)
+    second = flight.stream("k", source)
+    source.released.release()
+    assert next(first) == "a"
+    assert next(second) == "a"
+    first.close()
+    assert not source.token.cancelled
+    second.close()
+    assert source.token.cancelled
+    assert source.closed
+
+
+def test_stream_consumer_cancel_keeps_others_going():
+    flight = SingleFlight()
+    source = Source(["a", "b"])
+    token = CancellationToken()
+    first = flight.stream("k", source, cancel=token)
+    second = flight.stream("k", source)
+    source.released.release()
+    assert next(first) == "a"
+    assert next(second) == "a"
+    token.cancel()
+    assert list(first) == []
+    source.released.release()
+    assert list(second) == ["b"]
+    assert flight.requests == 1
+    assert not source.token.cancelled
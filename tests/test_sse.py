@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from ovos_solver_openai_persona.sse import SSEDecoder, SSEEvent, StreamError, parse_chat_chunk
+
+
+def decode(chunks):
+    decoder = SSEDecoder()
+    events = []
+    for chunk in chunks:
+        events += decoder.feed(chunk)
+    return events + decoder.flush()
+
+
+def chat_chunk(content, finish_reason=None):
+    return json.dumps({"choices": [{"index": 0, "delta": {"content": content},
+                                    "finish_reason": finish_reason}]})
+
+
+def test_single_event():
+    assert decode([b"data: hello\n\n"]) == [SSEEvent("hello")]
+
+
+def test_multiline_data_and_fields():
+    stream = b"event: update\nid: 7\nretry: 300\ndata: a\ndata:b\n\n"
+    assert decode([stream]) == [SSEEvent("a\nb", "update", "7", 300)]
+
+
+def test_comments_and_unknown_fields_are_ignored():
+    assert decode([b": keep-alive\nfoo: bar\ndata: x\n\n"]) == [SSEEvent("x")]
+
+
+def test_event_type_resets_id_persists():
+    events = decode([b"event: a\nid: 1\ndata: x\n\ndata: y\n\n"])
+    assert events == [SSEEvent("x", "a", "1"), SSEEvent("y", "message", "1")]
+
+
+def test_invalid_id_and_retry_are_ignored():
+    decoder = SSEDecoder()
+    assert decoder.feed(b"id: a\0b\nretry: soon\ndata: x\n\n") == [SSEEvent("x")]
+    assert decoder.last_event_id is None
+
+
+@pytest.mark.parametrize("newline", [b"\n", b"\r\n", b"\r"])
+def test_line_endings(newline):
+    stream = newline.join([b"data: a", b"", b"data: b", b"", b""])
+    assert decode([stream]) == [SSEEvent("a"), SSEEvent("b")]
+
+
+def test_crlf_split_across_chunks():
+    assert decode([b"data: a\r", b"\n\r", b"\n"]) == [SSEEvent("a")]
+
+
+@pytest.mark.parametrize("step", [1, 2, 5])
+def test_arbitrary_chunk_boundaries(step):
+    stream = "data: olá 👋\n\nevent: x\ndata: second\n\n".encode("utf-8")
+    chunks = [stream[i:i + step] for i in range(0, len(stream), step)]
+    assert decode(chunks) == [SSEEvent("olá 👋"), SSEEvent("second", "x")]
+
+
+def test_flush_dispatches_unterminated_event():
+    decoder = SSEDecoder()
+    assert decoder.feed(b"data: partial") == []
+    assert decoder.flush() == [SSEEvent("partial")]
+
+
+def test_parse_content():
+    assert parse_chat_chunk(chat_chunk('say "hi"\n')) == ('say "hi"\n', False)
+
+
+def test_parse_content_with_spaces_after_colons():
+    data = '{"choices": [{"delta": {"content": "hi"}, "finish_reason": null}]}'
+    assert parse_chat_chunk(data) == ("hi", False)
+
+
+def test_parse_done():
+    assert parse_chat_chunk("[DONE]") == (None, True)
+
+
+def test_parse_finish_reason_with_content():
+    assert parse_chat_chunk(chat_chunk("end.", "stop")) == ("end.", True)
+
+
+def test_parse_role_only_and_usage_chunks():
+    assert parse_chat_chunk(json.dumps({"choices": [{"delta": {"role": "assistant"},
+                                                     "finish_reason": None}]})) == (None, False)
+    assert parse_chat_chunk(json.dumps({"choices": [], "usage": {"total_tokens": 3}})) == (None, False)
+
+
+def test_parse_content_that_looks_like_a_key():
+    # the fast path must not be fooled by the text itself
+    assert parse_chat_chunk(chat_chunk('"content":"x"')) == ('"content":"x"', False)
+
+
+@pytest.mark.parametrize("error", [{"message": "overloaded"}, "overloaded"])
+def test_parse_error(error):
+    with pytest.raises(StreamError, match="overloaded"):
+        parse_chat_chunk(json.dumps({"error": error}))
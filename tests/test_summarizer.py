@@ -0,0 +1,91 @@
+from threading import Lock
+
+from ovos_solver_openai_persona.summarizer import OpenAISummarizer, split_document
+
+
+def words(text):
+    return len(text.split())
+
+
+def paragraphs(n, size=10):
+    return "\n".join(" ".join(f"p{i}w{j}" for j in range(size)) for i in range(n))
+
+
+class FakeLLM:
+    """ answers with the first line of the content, records every prompt """
+
+    def __init__(self):
+        self.prompts = []
+        self.lock = Lock()
+
+    def get_spoken_answer(self, prompt, lang=None):
+        with self.lock:
+            self.prompts.append(prompt)
+        return "summary of " + prompt.split("---------------------\n")[1].split()[0]
+
+
+def test_short_document_is_one_chunk():
+    assert list(split_document("hello world", max_tokens=10, tokenizer=words)) == ["hello world"]
+    assert list(split_document("", max_tokens=10, tokenizer=words)) == []
+
+
+def test_chunks_respect_budget_and_paragraphs():
+    chunks = list(split_document(paragraphs(10), max_tokens=25, overlap=0, tokenizer=words))
+    assert len(chunks) == 5
+    for chunk in chunks:
+        assert words(chunk) <= 25
+        assert all(words(p) == 10 for p in chunk.split("\n"))
+    # every paragraph appears exactly once and in order
+    assert "\n".join(chunks) == paragraphs(10)
+
+
+def test_overlap_repeats_trailing_paragraphs():
+    chunks = list(split_document(paragraphs(6), max_tokens=30, overlap=10, tokenizer=words))
+    for before, after in zip(chunks, chunks[1:]):
+        assert after.split("\n")[0] == before.split("\n")[-1]
+    assert chunks[-1].endswith("p5w9")
+
+
+def test_long_paragraph_is_split_at_words():
+    text = " ".join(f"w{i}" for i in range(100))
+    chunks = list(split_document(text, max_tokens=20, overlap=0, tokenizer=words))
+    assert all(words(c) <= 20 for c in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+
+def test_is_lazy():
+    chunks = split_document(paragraphs(10_000), max_tokens=25, tokenizer=words)
+    assert next(chunks).startswith("p0w0")
+
+
+def test_tldr_short_document_single_request():
+    solver = OpenAISummarizer({"chunk_tokens": 100})
+    solver._llm = FakeLLM()
+    assert solver.get_tldr("short text") == "summary of short"
+    assert len(solver._llm.prompts) == 1
+
+
+def test_tldr_map_reduce():
+    solver = OpenAISummarizer({"chunk_tokens": 60, "chunk_overlap": 0, "reduce_fan_in": 2})
+    solver._llm = FakeLLM()
+    solver._tokenizer = words
+    assert solver.get_tldr(paragraphs(12)) == "summary of summary"
+    maps = [p for p in solver._llm.prompts if p.startswith(solver.map_template.split("{")[0])]
+    assert len(maps) == 2
+    partial = list(solver.stream_partial_summaries(paragraphs(12)))
+    assert partial == ["summary of p0w0", "summary of p6w0"]
+
+
+def test_stream_tldr(chat_server):
+    chat_server.answer = lambda query: "It is short. Very short."
+    solver = OpenAISummarizer({"key": "sk-test", "api_url": "http://chat.invalid/v1",
+                               "rate_limit": {"enabled": False}, "chunk_tokens": 60, "chunk_overlap": 0})
+    solver.llm.balancer.transport = chat_server
+    solver._tokenizer = words
+    assert list(solver.stream_tldr("short text")) == ["It is short.", "Very short."]
+    assert [p.get("stream", False) for p in chat_server.payloads] == [True]
+    # long documents are summarized chunk by chunk, only the final summary is streamed
+    assert list(solver.stream_tldr(paragraphs(12))) == ["It is short.", "Very short."]
+    assert [p.get("stream", False) for p in chat_server.payloads[1:]] == [False, False, True]
+    # memory is disabled, the summaries do not leak into each other
+    assert all(len(p["messages"]) == 2 for p in chat_server.payloads)
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import time
+
+import pytest
+from requests import ReadTimeout
+
+from ovos_solver_openai_persona.engines import OpenAIChatCompletionsSolver
+from ovos_solver_openai_persona.transport import Exchange, Headers, RecordingTransport, ReplayResponse, \
+    ReplayTransport, Transport, exchange_key, get_transport, load_recording
+
+PAYLOAD = {"model": "m", "messages": [{"role": "user", "content": "hi"}]}
+
+
+def sse(*texts):
+    events = [json.dumps({"choices": [{"delta": {"content": t}, "finish_reason": None}]}) for t in texts]
+    events.append(json.dumps({"choices": [{"delta": {}, "finish_reason": "stop"}]}))
+    return [(0.01, f"data: {e}\n\n".encode("utf-8")) for e in events] + [(0.0, b"data: [DONE]\n\n")]
+
+
+class FakeServer(Transport):
+    """ answers every request, streamed or not, with the same text """
+
+    def __init__(self, *texts):
+        self.texts = texts
+        self.requests = 0
+
+    def _exchange(self, path, payload):
+        self.requests += 1
+        if payload.get("stream"):
+            return Exchange("", path, 200, {"Content-Type": "text/event-stream"}, chunks=sse(*self.texts))
+        body = {"choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(self.texts)},
+                             "finish_reason": "stop"}]}
+        return Exchange("", path, 200, {"Content-Type": "application/json"},
+                        chunks=[(0.0, json.dumps(body).encode("utf-8"))])
+
+    def post(self, api_url, path, payload, headers, config=None, timeout=None):
+        return ReplayResponse(self._exchange(path, payload))
+
+    async def async_post(self, api_url, path, payload, headers, config=None, timeout=None):
+        raise NotImplementedError
+
+
+def test_transport_is_abstract():
+    with pytest.raises(TypeError):
+        Transport()
+
+
+def test_exchange_key_ignores_server_and_user():
+    assert exchange_key("/chat/completions", PAYLOAD) == exchange_key("/chat/completions", {**PAYLOAD, "user": "x"})
+    assert exchange_key("/chat/completions", PAYLOAD) != exchange_key("/completions", PAYLOAD)
+
+
+def test_headers_are_case_insensitive():
+    headers = Headers({"Content-Type": "text/plain"})
+    assert headers["content-type"] == headers.get("CONTENT-TYPE") == "text/plain"
+    assert "Content-type" in headers
+
+
+def test_exchange_round_trip():
+    binary = bytes(range(256))
+    exchange = Exchange("k", "/p", 200, {"Retry-After": "1"}, 0.25, [(0.1, binary), (0.002, "olá".encode())])
+    copy = Exchange.from_json(exchange.to_json())
+    assert (copy.key, copy.path, copy.status, copy.headers, copy.ttfb) == ("k", "/p", 200, {"retry-after": "1"}, 0.25)
+    assert copy.chunks == exchange.chunks
+
+
+@pytest.mark.parametrize("name", ["rec.jsonl", "rec.jsonl.gz"])
+def test_record_and_load(tmp_path, name):
+    path = str(tmp_path / "sub" / name)
+    recorder = RecordingTransport(path, FakeServer("Hello", " there."))
+    for _ in range(2):
+        r = recorder.post("http://x", "/chat/completions", {**PAYLOAD, "stream": True}, {})
+        assert b"".join(r.iter_content()).endswith(b"[DONE]\n\n")
+        r.close()
+    assert recorder.recorded == 2
+    exchanges = load_recording(path)
+    assert len(exchanges) == 2
+    assert exchanges[0].headers == {"content-type": "text/event-stream"}
+    assert exchanges[0].key == exchange_key("/chat/completions", {**PAYLOAD, "stream": True})
+
+
+def test_interrupted_stream_is_not_recorded(tmp_path):
+    recorder = RecordingTransport(str(tmp_path / "rec.jsonl"), FakeServer("Hello", " there."))
+    r = recorder.post("http://x", "/chat/completions", {**PAYLOAD, "stream": True}, {})
+    next(r.iter_content())
+    r.close()
+    assert recorder.recorded == 0
+
+
+def test_text_body_is_recorded(tmp_path):
+    recorder = RecordingTransport(str(tmp_path / "rec.jsonl"), FakeServer("Hello"))
+    r = recorder.post("http://x", "/chat/completions", PAYLOAD, {})
+    assert "Hello" in r.text
+    assert recorder.recorded == 1
+
+
+def replay_from(tmp_path, *exchanges, **kwargs):
+    path = tmp_path / "rec.jsonl"
+    path.write_text("".join(e.to_json() + "\n" for e in exchanges))
+    return ReplayTransport(str(path), **kwargs)
+
+
+def test_replay_turns_and_misses(tmp_path):
+    key = exchange_key("/p", PAYLOAD)
+    replay = replay_from(tmp_path, Exchange(key, "/p", 200, {}, chunks=[(0, b"one")]),
+                         Exchange(key, "/p", 200, {}, chunks=[(0, b"two")]), speed=0)
+    bodies = [replay.post("http://x", "/p", PAYLOAD, {}).content for _ in range(3)]
+    assert bodies == [b"one", b"two", b"one"]
+    miss = replay.post("http://x", "/p", {"other": 1}, {})
+    assert miss.status_code == 404
+    assert miss.json()["error"]["type"] == "replay_miss"
+    assert (replay.hits, replay.misses) == (3, 1)
+
+
+def test_replay_fallback(tmp_path):
+    server = FakeServer("live")
+    replay = replay_from(tmp_path, fallback=server)
+    assert b"live" in replay.post("http://x", "/p", PAYLOAD, {}).content
+    assert server.requests == 1
+
+
+def test_replay_timing(tmp_path):
+    key = exchange_key("/p", PAYLOAD)
+    replay = replay_from(tmp_path, Exchange(key, "/p", 200, {}, 0.05, [(0.05, b"a"), (0.05, b"b")]), speed=2)
+    start = time.monotonic()
+    r = replay.post("http://x", "/p", PAYLOAD, {})
+    assert 0.02 < time.monotonic() - start < 0.1
+    assert list(r.iter_content()) == [b"a", b"b"]
+    assert 0.07 < time.monotonic() - start < 0.2
+    # closing stops the replay
+    r = replay.post("http://x", "/p", PAYLOAD, {})
+    r.close()
+    assert list(r.iter_content()) == []
+
+
+def test_replay_read_timeout(tmp_path):
+    key = exchange_key("/p", PAYLOAD)
+    replay = replay_from(tmp_path, Exchange(key, "/p", 200, {}, 1.0, [(0, b"late")]))
+    with pytest.raises(ReadTimeout):
+        replay.post("http://x", "/p", PAYLOAD, {}, timeout=(1, 0.01))
+
+
+def test_async_replay(tmp_path):
+    key = exchange_key("/p", PAYLOAD)
+    replay = replay_from(tmp_path, Exchange(key, "/p", 200, {"Content-Type": "text/plain; charset=utf-8"},
+                                            chunks=[(0, b"a"), (0, b"b")]), speed=0)
+
+    async def read():
+        r = await replay.async_post("http://x", "/p", PAYLOAD, {})
+        assert r.content_type == "text/plain"
+        return [chunk async for chunk in r.content.iter_any()]
+
+    assert asyncio.run(read()) == [b"a", b"b"]
+
+
+def test_get_transport(tmp_path):
+    assert get_transport({}) is get_transport(None)
+    config = {"transport": {"mode": "replay", "path": str(tmp_path / "rec.jsonl")}}
+    assert isinstance(get_transport(config), ReplayTransport)
+    assert get_transport(config) is get_transport(config)
+    auto = get_transport({"transport": {"mode": "auto", "path": str(tmp_path / "auto.jsonl")}})
+    assert isinstance(auto.fallback, RecordingTransport)
+    with pytest.raises(ValueError):
+        get_transport({"transport": {"mode": "replay"}})
+    with pytest.raises(ValueError):
+        get_transport({"transport": {"mode": "ftp", "path": "x"}})
+
+
+def test_solver_replays_recorded_answers(tmp_path):
+    path = str(tmp_path / "chat.jsonl")
+    config = {"key": "sk-test", "api_url": "http://recorded.invalid/v1", "enable_memory": False,
+              "rate_limit": {"enabled": False}}
+    live = OpenAIChatCompletionsSolver(config)
+    live.balancer.transport = RecordingTransport(path, FakeServer("Hello there. ", "How are you?"))
+    expected = (live.get_spoken_answer("hi"), list(live.stream_utterances("hi")))
+    assert expected == ("Hello there. How are you?", ["Hello there.", "How are you?"])
+
+    # no network, the api url does not even resolve
+    replayed = OpenAIChatCompletionsSolver({**config, "transport": {"mode": "replay", "path": path, "speed": 0}})
+    assert (replayed.get_spoken_answer("hi"), list(replayed.stream_utterances("hi"))) == expected
+    assert replayed.balancer.transport.hits == 2